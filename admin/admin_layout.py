@@ -0,0 +1,62 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from html_index import Comment, Element, HtmlIndex, Splicer
+
+# Structural helpers shared by the admin layout scripts. They replace the
+# DOTALL regexes (`<!-- Mobile Menu Button -->.*?</button>`, the sidebar
+# `<!-- Sidebar -->...<aside ...>.*?</aside>` patterns) with lookups in an
+# HtmlIndex, so an edit always covers whole elements.
+
+
+def is_comment(node, text):
+    return isinstance(node, Comment) and node.text.strip() == text
+
+
+def remove_menu_buttons(content):
+    # Every "Mobile Menu Button" comment followed by the #adminMobileMenuBtn button
+    index = HtmlIndex(content)
+    splicer = Splicer(index)
+    for button in index.find('button', id='adminMobileMenuBtn'):
+        previous = index.previous_sibling(button)
+        if is_comment(previous, 'Mobile Menu Button'):
+            splicer.replace_siblings(previous, button, '')
+    return splicer.apply()
+
+
+def is_sidebar_prefix(node):
+    # Leftovers of earlier runs that belong to the sidebar block
+    if is_comment(node, 'Sidebar') or is_comment(node, 'Sidebar Overlay'):
+        return True
+    return isinstance(node, Element) and node.tag == 'div' and node.id == 'adminOverlay'
+
+
+def sidebar_blocks(index):
+    # (first node, aside) for every sidebar, including the comments and
+    # overlays stacked right before it
+    blocks = []
+    for aside in index.find('aside'):
+        if aside.id != 'adminSidebar' and not aside.attrs.get('class', '').startswith('w-full md:w-64'):
+            continue
+        first = aside
+        previous = index.previous_sibling(first)
+        while previous is not None and is_sidebar_prefix(previous):
+            first = previous
+            previous = index.previous_sibling(first)
+        blocks.append((first, aside))
+    return blocks
+
+
+def replace_sidebars(content, new_block):
+    index = HtmlIndex(content)
+    splicer = Splicer(index)
+    for first, aside in sidebar_blocks(index):
+        splicer.replace_siblings(first, aside, new_block)
+    return splicer.apply()
+
+
+def first_sidebar_nav(content):
+    index = HtmlIndex(content)
+    nav = index.first('nav', attrs={'class': 'space-y-1'})
+    return None if nav is None else index.source(nav)
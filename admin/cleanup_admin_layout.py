@@ -1,8 +1,10 @@
 import os
 import re
-import glob
+import sys
 
-html_files = glob.glob('*.html')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from admin_layout import first_sidebar_nav, remove_menu_buttons, replace_sidebars
+from rewrite_engine import FunctionRule, RuleSet, main
 
 overlay = '<div id="adminOverlay" class="fixed inset-0 bg-black/50 z-[55] hidden"></div>'
 nav_button = """
@@ -12,21 +14,18 @@ nav_button = """
                 </button>
 """
 
-def clean_and_fix_file(file):
-    with open(file, 'r', encoding='utf-8') as f:
-        content = f.read()
+def clean_and_fix_file(content, page):
+    original = content
 
     # 1. Navbar: Clean and Insert Button
     # Remove ALL existing variants to be safe
-    content = re.sub(r'<!-- Mobile Menu Button -->.*?id="adminMobileMenuBtn".*?</button>', '', content, flags=re.DOTALL)
+    content = remove_menu_buttons(content)
     nav_pattern = r'(<div class="flex items-center gap-4">)(\s+<a href="dashboard.html")'
     content = re.sub(nav_pattern, r'\1' + nav_button + r'\2', content)
 
     # 2. Sidebar: Clean and Apply correct responsive structure
-    nav_match = re.search(r'<nav class="space-y-1">.*?</nav>', content, re.DOTALL)
-    if not nav_match: return
-
-    current_nav = nav_match.group(0)
+    current_nav = first_sidebar_nav(content)
+    if not current_nav: return original
     
     new_aside_block = f"""<!-- Sidebar -->
         <!-- Sidebar Overlay -->
@@ -40,19 +39,17 @@ def clean_and_fix_file(file):
             </div>
         </aside>"""
 
-    # VERY AGGRESSIVE search for anything that looks like our sidebar block
-    # Matches from <!-- Sidebar --> to </aside> including duplicate overlays
-    aggressive_sidebar_regex = re.compile(r'(<!-- Sidebar -->\s+)?(<!-- Sidebar Overlay -->.*?</div>\s+)?(<!-- Sidebar -->\s+)?(<!-- Sidebar Overlay -->.*?</div>\s+)?(<!-- Sidebar -->\s+)?(<aside id="adminSidebar"|<aside class="w-full md:w-64).*?</aside>', re.DOTALL)
-    
-    new_content = aggressive_sidebar_regex.sub(new_aside_block, content)
+    # Sidebar block: the aside plus any sidebar comments and overlays stacked before it
+    new_content = replace_sidebars(content, new_aside_block)
+
+    # The navbar changes are only kept when the sidebar itself changed
+    if new_content == content:
+        return original
+    return new_content
 
-    if new_content != content:
-        with open(file, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        print(f"Cleaned {file}")
 
-for file in html_files:
-    if file in ['diagnostic_logo.html', '404.html']: continue
-    clean_and_fix_file(file)
+RULES = RuleSet('cleanup_admin_layout', [FunctionRule(clean_and_fix_file)],
+                pages=['admin/*.html'], exclude=['diagnostic_logo.html', '404.html'])
 
-print("Cleanup complete!")
+if __name__ == '__main__':
+    main([RULES], 'Remove duplicated admin sidebar wrappers and menu buttons.')
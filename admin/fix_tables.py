@@ -1,45 +1,33 @@
 import os
-import re
-import glob
+import sys
 
-html_files = glob.glob('*.html')
-
-def fix_table_responsiveness(file):
-    with open(file, 'r', encoding='utf-8') as f:
-        content = f.read()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from rewrite_engine import RegexRule, Replace, RuleSet, main
 
+RULES = RuleSet('fix_tables', [
     # 1. Clean up the corrupted headers:
     # <table class="min-w-[800px] w-full text-left border-collapse">
     # <th class="whitespace-nowrap"ead>
-    
+
     # We first fix the `ead>` corruption which happened to `<thead>`
-    content = content.replace('<th class="whitespace-nowrap"ead>', '<thead>')
-    
+    Replace('<th class="whitespace-nowrap"ead>', '<thead>'),
+
     # We remove duplicate class attributes that were injected, e.g. <th class="whitespace-nowrap" class="...">
     # and consolidate them.
     # We'll just carefully remove `<th class="whitespace-nowrap"` and clean up duplicate classes.
-    
+
     # Let's revert the messy `th` modifications. The easiest way is to remove `<th class="whitespace-nowrap"` 
     # and `class="whitespace-nowrap ` if they were added incorrectly.
-    content = content.replace('<th class="whitespace-nowrap" class="whitespace-nowrap', '<th class="whitespace-nowrap')
-    content = content.replace('<th class="whitespace-nowrap"\n                                    class="', '<th class="whitespace-nowrap ')
-    content = content.replace('<th class="whitespace-nowrap"\nclass="', '<th class="whitespace-nowrap ')
-    
+    Replace('<th class="whitespace-nowrap" class="whitespace-nowrap', '<th class="whitespace-nowrap'),
+    Replace('<th class="whitespace-nowrap"\n                                    class="', '<th class="whitespace-nowrap '),
+    Replace('<th class="whitespace-nowrap"\nclass="', '<th class="whitespace-nowrap '),
+
     # Clean up double classes like `class="whitespace-nowrap" class="p-4..."` 
-    content = re.sub(r'<th class="whitespace-nowrap"\s+class="([^"]+)"', r'<th class="\1 whitespace-nowrap"', content)
+    RegexRule(r'<th class="whitespace-nowrap"\s+class="([^"]+)"', r'<th class="\1 whitespace-nowrap"'),
 
     # Clean up cases where `whitespace-nowrap` was added twice
-    content = content.replace('whitespace-nowrap whitespace-nowrap', 'whitespace-nowrap')
-
-    if content != content: # dummy check because replacing strings directly updates content
-        pass
-        
-    with open(file, 'w', encoding='utf-8') as f:
-        f.write(content)
-    print(f"Fixed tables in {file}")
-
-for file in html_files:
-    if file in ['diagnostic_logo.html', '404.html']: continue
-    fix_table_responsiveness(file)
+    Replace('whitespace-nowrap whitespace-nowrap', 'whitespace-nowrap'),
+], pages=['admin/*.html'], exclude=['diagnostic_logo.html', '404.html'])
 
-print("Table fix complete!")
+if __name__ == '__main__':
+    main([RULES], 'Repair the table headers damaged by improve_tables_responsive.py.')
@@ -1,49 +1,46 @@
 import os
-import re
-import glob
+import sys
 
-html_files = glob.glob('*.html')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import FunctionRule, RuleSet, main
 
-def enhance_table_responsiveness(file):
-    with open(file, 'r', encoding='utf-8') as f:
-        content = f.read()
+# Works on the parsed tags rather than on `<th...>` regexes: the old
+# `<th(\s*(?!class=)[^>]*)>` pattern also matched `<thead>` and `<th class=...>`,
+# which produced the `<th class="whitespace-nowrap"ead>` and duplicated class
+# attributes that fix_tables.py had to repair.
+
+
+def enhance_table_responsiveness(content, page):
+    index = HtmlIndex(content)
+    splicer = Splicer(index)
 
     # 1. Update <table> tags
     # We want to change <table class="w-full text-left..."> to include min-w-[800px] or min-w-[600px]
     # To be safe, we'll look for `<table class="` and add `min-w-[800px] ` if not present
-    
-    def repl_table(match):
-        classes = match.group(1)
-        if 'min-w-' not in classes:
-            classes = 'min-w-[800px] ' + classes
-        return f'<table class="{classes}"'
-    
+
     # We need to make sure we don't break non-data tables, but in this admin context, 
     # all tables are data tables taking full width inside an overflow container.
-    new_content = re.sub(r'<table class="([^"]*)"', repl_table, content)
+    for table in index.find('table'):
+        classes = table.attrs.get('class')
+        if classes is not None and 'min-w-' not in classes:
+            splicer.set_attr(table, 'class', 'min-w-[800px] ' + classes)
 
     # 2. Update <th> tags
     # Add whitespace-nowrap to all <th> to prevent header stacking
-    def repl_th(match):
-        classes = match.group(1) or ""
-        if 'whitespace-nowrap' not in classes:
-            classes = 'whitespace-nowrap ' + classes
-        return f'<th class="{classes}"'
-    
     # Handle cases where th has class="" or no class
-    # Replace <th class="...">
-    new_content = re.sub(r'<th class="([^"]*)"', repl_th, new_content)
-    
-    # Handle <th ...> without class attribute
-    new_content = re.sub(r'<th(\s*(?!class=)[^>]*)>', r'<th class="whitespace-nowrap"\1>', new_content)
-
-    if new_content != content:
-        with open(file, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        print(f"Enhanced tables in {file}")
-
-for file in html_files:
-    if file in ['diagnostic_logo.html', '404.html']: continue
-    enhance_table_responsiveness(file)
-
-print("Table responsiveness enhancement complete!")
+    for th in index.find('th'):
+        classes = th.attrs.get('class')
+        if classes is None:
+            splicer.set_attr(th, 'class', 'whitespace-nowrap')
+        elif 'whitespace-nowrap' not in classes:
+            splicer.set_attr(th, 'class', 'whitespace-nowrap ' + classes)
+
+    return splicer.apply()
+
+
+RULES = RuleSet('improve_tables_responsive', [FunctionRule(enhance_table_responsiveness, anchors=['<table', '<th'])],
+                pages=['admin/*.html'], exclude=['diagnostic_logo.html', '404.html'])
+
+if __name__ == '__main__':
+    main([RULES], 'Make admin tables scroll horizontally instead of stacking headers.')
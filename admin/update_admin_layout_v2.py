@@ -1,8 +1,10 @@
 import os
 import re
-import glob
+import sys
 
-html_files = glob.glob('*.html')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from admin_layout import first_sidebar_nav, remove_menu_buttons, replace_sidebars
+from rewrite_engine import FunctionRule, RuleSet, main
 
 overlay = '<div id="adminOverlay" class="fixed inset-0 bg-black/50 z-[55] hidden"></div>'
 nav_button = """
@@ -12,25 +14,22 @@ nav_button = """
                 </button>
 """
 
-def fix_file(file):
-    with open(file, 'r', encoding='utf-8') as f:
-        content = f.read()
+def fix_file(content, page):
+    original = content
 
     # 1. Navbar: Reset and Insert Button
     # Remove existing button if any
-    content = re.sub(r'<!-- Mobile Menu Button -->.*?id="adminMobileMenuBtn".*?</button>', '', content, flags=re.DOTALL)
+    content = remove_menu_buttons(content)
     # Insert Button before the logo link
     nav_pattern = r'(<div class="flex items-center gap-4">)(\s+<a href="dashboard.html")'
     content = re.sub(nav_pattern, r'\1' + nav_button + r'\2', content)
 
     # 2. Sidebar: Reset and Apply correct responsive structure
     # Extract nav content
-    nav_match = re.search(r'<nav class="space-y-1">.*?</nav>', content, re.DOTALL)
-    if not nav_match:
-        print(f"Skipping {file} - Nav not found")
-        return
-
-    current_nav = nav_match.group(0)
+    current_nav = first_sidebar_nav(content)
+    if not current_nav:
+        page.warn("Nav not found")
+        return original
     
     # New refined aside block
     new_aside_block = f"""<!-- Sidebar -->
@@ -45,20 +44,17 @@ def fix_file(file):
             </div>
         </aside>"""
 
-    # Comprehensive sidebar search pattern (handles original and previously modified)
-    sidebar_regex = re.compile(r'(<!-- Sidebar -->\s+)?(<!-- Sidebar Overlay -->.*?</div>\s+)?(<aside id="adminSidebar"|<aside class="w-full md:w-64).*?</aside>', re.DOTALL)
-    
-    new_content = sidebar_regex.sub(new_aside_block, content)
+    # Sidebar block: the aside plus any sidebar comments and overlays stacked before it
+    new_content = replace_sidebars(content, new_aside_block)
+
+    # The navbar changes are only kept when the sidebar itself changed
+    if new_content == content:
+        return original
+    return new_content
 
-    if new_content != content:
-        with open(file, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        print(f"Fixed {file}")
-    else:
-        print(f"No changes for {file}")
 
-for file in html_files:
-    if file in ['diagnostic_logo.html', '404.html']: continue
-    fix_file(file)
+RULES = RuleSet('update_admin_layout_v2', [FunctionRule(fix_file)],
+                pages=['admin/*.html'], exclude=['diagnostic_logo.html', '404.html'])
 
-print("Batch update complete!")
+if __name__ == '__main__':
+    main([RULES], 'Rebuild the responsive admin sidebar and mobile menu button.')
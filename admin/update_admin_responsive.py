@@ -1,8 +1,9 @@
 import os
 import re
-import glob
+import sys
 
-html_files = glob.glob('*.html')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from rewrite_engine import FunctionRule, RuleSet, main
 
 # 1. Navbar Mobile Button Template
 nav_button = """
@@ -20,17 +21,11 @@ nav_button = """
 
 overlay = '<div id="adminOverlay" class="fixed inset-0 bg-black/50 z-[55] hidden"></div>'
 
-for file in html_files:
-    if file in ['diagnostic_logo.html', '404.html']:
-        continue
-    
-    with open(file, 'r', encoding='utf-8') as f:
-        content = f.read()
-
+def make_responsive(content, page):
     # Skip if already updated
     if 'id="adminMobileMenuBtn"' in content:
-        print(f"Skipping {file} - Already responsive")
-        continue
+        page.warn("Already responsive")
+        return content
 
     # Insert Navbar Button
     # Look for the first flex items-center gap-4 in the nav
@@ -65,14 +60,11 @@ for file in html_files:
     # </aside>
     # We replaced 2 opening tags with 2 opening tags. So closing tags should be fine if we keep the structure.
 
-    if content != content: # This is a dummy check, content changed in re.sub
-        with open(file, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"Updated {file}")
-    else:
-        # Re-save because content WAS modified by re.sub (unless re.sub didn't find matches)
-        with open(file, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"Processed {file}")
+    return content
+
+
+RULES = RuleSet('update_admin_responsive', [FunctionRule(make_responsive)],
+                pages=['admin/*.html'], exclude=['diagnostic_logo.html', '404.html'])
 
-print("Done!")
+if __name__ == '__main__':
+    main([RULES], 'Add the mobile menu button and off-canvas sidebar to admin pages.')
@@ -1,8 +1,10 @@
 import os
 import re
-import glob
+import sys
 
-html_files = glob.glob('*.html')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import FunctionRule, RuleSet, main
 
 new_sidebar_template = """<nav class="space-y-1">
                     <a href="dashboard.html" class="sidebar-link"><iconify-icon icon="solar:home-smile-bold" width="20"></iconify-icon>Vue d'ensemble</a>
@@ -25,21 +27,15 @@ new_sidebar_template = """<nav class="space-y-1">
                     </div>
                 </nav>"""
 
-nav_regex = re.compile(r'<nav class="space-y-1">.*?</nav>', re.DOTALL)
-
-for file in html_files:
-    if file in ['diagnostic_logo.html', '404.html']:
-        continue
-    
-    with open(file, 'r', encoding='utf-8') as f:
-        content = f.read()
-        
-    if '<nav class="space-y-1">' not in content:
-        print(f"Skipping {file} - Sidebar not found")
-        continue
+def update_sidebar(content, page):
+    index = HtmlIndex(content)
+    navs = index.find('nav', attrs={'class': 'space-y-1'})
+    if not navs:
+        page.warn("Sidebar not found")
+        return content
 
     # Prepare active link in the template
-    # `file` is e.g. 'dashboard.html'
+    # `page.name` is e.g. 'dashboard.html'
     # we want to find `href="dashboard.html" class="sidebar-link"` and add `active`
     
     # We'll regex replace just the class for the matching href
@@ -53,17 +49,20 @@ for file in html_files:
     def add_active(match):
         href = match.group(1)
         classes = match.group(2)
-        if href == file:
+        if href == page.name:
             classes = classes + " active"
         return f'href="{href}" class="{classes}"'
     
     modified_sidebar = re.sub(r'href="([^"]+)" class="([^"]+sidebar-link[^"]*)"', add_active, clean_template)
 
-    new_content = nav_regex.sub(modified_sidebar, content)
-    
-    if new_content != content:
-        with open(file, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        print(f"Updated {file}")
-    else:
-        print(f"No changes needed for {file}")
+    splicer = Splicer(index)
+    for nav in navs:
+        splicer.replace(nav, modified_sidebar)
+    return splicer.apply()
+
+
+RULES = RuleSet('update_sidebar', [FunctionRule(update_sidebar)],
+                pages=['admin/*.html'], exclude=['diagnostic_logo.html', '404.html'])
+
+if __name__ == '__main__':
+    main([RULES], 'Rewrite the admin sidebar from the shared template.')
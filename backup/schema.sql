@@ -66,6 +66,27 @@ CREATE TABLE IF NOT EXISTS public.activities (
     time TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- ADMIN REPORTS TABLES
+-- Written by scripts/build_rollups.py --publish (with the owner's connection,
+-- which RLS does not restrict) and read by js/reports.js on the admin pages
+CREATE TABLE IF NOT EXISTS public.report_stats (
+    name TEXT PRIMARY KEY,
+    body JSONB,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS public.report_customers (
+    email TEXT PRIMARY KEY,
+    name TEXT,
+    phone TEXT,
+    orders INTEGER DEFAULT 0,
+    spent NUMERIC DEFAULT 0,
+    first_week DATE,
+    last_week DATE
+);
+
+CREATE INDEX IF NOT EXISTS report_customers_spent ON public.report_customers (spent DESC, email);
+
 -- 6. RLS (Row Level Security) Policies
 -- First, drop the old insecure policies if they exist (for safe re-running of the script)
 DROP POLICY IF EXISTS "Enable all for anon" ON public.users;
@@ -80,6 +101,8 @@ ALTER TABLE public.products ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.orders ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.promos ENABLE ROW LEVEL SECURITY;
 ALTER TABLE public.activities ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.report_stats ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.report_customers ENABLE ROW LEVEL SECURITY;
 
 -- Note on Admin Emails: Adjust these directly in the SQL or via Supabase UI later
 -- In a real app we'd have a 'roles' table or use app_metadata.
@@ -189,3 +212,16 @@ WITH CHECK (auth.uid() IS NOT NULL);
 CREATE POLICY "Admins can delete activities" 
 ON public.activities FOR ALL 
 USING (auth.uid() IS NOT NULL AND auth.jwt()->>'email' IN ('benimakiese1234@gmail.com'));
+
+---------------------------------------------------------
+-- POLICIES FOR 'report_stats' AND 'report_customers' TABLES
+---------------------------------------------------------
+-- Only Admins can read the reports (customer names, emails and phones);
+-- nobody writes them through the API
+CREATE POLICY "Admins can view report stats" 
+ON public.report_stats FOR SELECT 
+USING (auth.uid() IS NOT NULL AND auth.jwt()->>'email' IN ('benimakiese1234@gmail.com'));
+
+CREATE POLICY "Admins can view report customers" 
+ON public.report_customers FOR SELECT 
+USING (auth.uid() IS NOT NULL AND auth.jwt()->>'email' IN ('benimakiese1234@gmail.com'));
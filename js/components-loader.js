@@ -3,6 +3,7 @@
 /**
  * Header HTML inlined to avoid CORS issues with file:// protocol.
  * When served via HTTP, fetch is used instead.
+ * Generated from components/ by scripts/build_partials.py - edit the components, not these strings.
  */
 const HEADER_HTML = `<!-- NewKet Header Component -->
 <header class="main-header fixed top-0 left-0 right-0 z-50 bg-white border-b border-gray-100 shadow-sm">
@@ -120,7 +121,7 @@ const HEADER_HTML = `<!-- NewKet Header Component -->
                     class="nav-link px-3 py-1.5 text-sm font-medium text-gray-600 hover:text-gray-900 whitespace-nowrap rounded-lg hover:bg-gray-50 transition-colors">Art
                     de vivre</a>
                 <a href="catalog.html"
-                    class="nav-link px-3 py-1.5 text-sm font-medium text-gray-900 hover:text-black whitespace-nowrap rounded-lg hover:bg-100 transition-colors flex items-center gap-1">
+                    class="nav-link px-3 py-1.5 text-sm font-medium text-gray-900 hover:text-black whitespace-nowrap rounded-lg hover:bg-gray-100 transition-colors flex items-center gap-1">
                     <iconify-icon icon="solar:fire-bold" width="14"></iconify-icon>Promos
                 </a>
             </nav>
@@ -202,46 +203,91 @@ const FOOTER_HTML = `<!-- NewKet Footer Component -->
 <footer class="bg-gray-900 text-white mt-16 pt-16 pb-8 border-t border-white/5">
     <div class="max-w-7xl mx-auto px-4 sm:px-6">
         <div class="grid grid-cols-1 lg:grid-cols-10 gap-12 mb-16">
+            <!-- Brand Section -->
             <div class="lg:col-span-4 space-y-6">
                 <div class="flex items-center gap-3">
                     <span class="text-xl font-bold tracking-tight">NEWKET</span>
                 </div>
                 <p class="text-gray-400 text-sm leading-relaxed max-w-sm">
-                    L'excellence de la marketplace moderne. Découvrez une sélection rigoureuse d'articles de luxe et profitez d'une expérience shopping sans compromis.
+                    L'excellence de la marketplace moderne. Découvrez une sélection rigoureuse d'articles de luxe et
+                    profitez d'une expérience shopping sans compromis.
                 </p>
                 <div class="flex items-center gap-4">
-                    <a href="#" class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300"><iconify-icon icon="line-md:instagram" width="20"></iconify-icon></a>
-                    <a href="#" class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300"><iconify-icon icon="line-md:facebook" width="20"></iconify-icon></a>
-                    <a href="#" class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300"><iconify-icon icon="line-md:twitter-x" width="20"></iconify-icon></a>
+                    <a href="#"
+                        class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300">
+                        <iconify-icon icon="line-md:instagram" width="20"></iconify-icon>
+                    </a>
+                    <a href="#"
+                        class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300">
+                        <iconify-icon icon="line-md:facebook" width="20"></iconify-icon>
+                    </a>
+                    <a href="#"
+                        class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300">
+                        <iconify-icon icon="line-md:twitter-x" width="20"></iconify-icon>
+                    </a>
+                    <a href="#"
+                        class="w-10 h-10 rounded-full border border-white/10 flex items-center justify-center hover:bg-white hover:text-black transition-all duration-300">
+                        <iconify-icon icon="line-md:linkedin" width="20"></iconify-icon>
+                    </a>
                 </div>
             </div>
+
+            <!-- Account & Support -->
             <div class="lg:col-span-2 space-y-6">
                 <h4 class="text-sm font-bold uppercase tracking-widest text-white/90">Services</h4>
                 <ul class="space-y-4">
-                    <li><a href="customer-dashboard.html" class="text-gray-400 hover:text-white text-sm transition-colors">Mon Compte</a></li>
-                    <li><a href="customer-dashboard.html" class="text-gray-400 hover:text-white text-sm transition-colors">Suivi de Commande</a></li>
-                    <li><a href="about.html" class="text-gray-400 hover:text-white text-sm transition-colors">Aide & FAQ</a></li>
-                    <li><a href="publish.html" class="text-gray-400 hover:text-white text-sm transition-colors publish-btn">Vendre un article</a></li>
+                    <li><a href="customer-dashboard.html"
+                            class="text-gray-400 hover:text-white text-sm transition-colors">Mon Compte</a></li>
+                    <li><a href="customer-dashboard.html"
+                            class="text-gray-400 hover:text-white text-sm transition-colors">Suivi de Commande</a></li>
+                    <li><a href="about.html" class="text-gray-400 hover:text-white text-sm transition-colors">Aide &
+                            FAQ</a></li>
+                    <li><a href="publish.html"
+                            class="text-gray-400 hover:text-white text-sm transition-colors publish-btn">Vendre un
+                            article</a></li>
                 </ul>
             </div>
+
+            <!-- Newsletter -->
             <div class="lg:col-span-4 space-y-6">
                 <h4 class="text-sm font-bold uppercase tracking-widest text-white/90">Inspiration & Offres</h4>
-                <p class="text-gray-400 text-sm">Inscrivez-vous pour recevoir nos sélections exclusives et avant-premières.</p>
-                <form class="relative group" onsubmit="event.preventDefault(); alert('Merci pour votre inscription !');"> 
-                    <input type="email" placeholder="Votre email" class="w-full bg-white/5 border border-white/10 rounded-xl px-4 py-3 text-sm focus:outline-none focus:border-white/30 transition-all">
-                    <button type="submit" class="absolute right-2 top-2 bg-white text-black text-xs font-bold uppercase px-4 py-1.5 rounded-lg hover:bg-gray-200 transition-colors">S'inscrire</button>
+                <p class="text-gray-400 text-sm">Inscrivez-vous pour recevoir nos sélections exclusives et
+                    avant-premières.</p>
+                <form class="relative group"
+                    onsubmit="event.preventDefault(); alert('Merci pour votre inscription !');">
+                    <input type="email" placeholder="Votre email"
+                        class="w-full bg-white/5 border border-white/10 rounded-xl px-4 py-3 text-sm focus:outline-none focus:border-white/30 transition-all">
+                    <button type="submit"
+                        class="absolute right-2 top-2 bg-white text-black text-xs font-bold uppercase px-4 py-1.5 rounded-lg hover:bg-gray-200 transition-colors">
+                        S'inscrire
+                    </button>
                 </form>
+                <div class="flex items-center gap-4 pt-2">
+                    <iconify-icon icon="logos:visa" width="35"></iconify-icon>
+                    <iconify-icon icon="logos:mastercard" width="35"></iconify-icon>
+                    <iconify-icon icon="simple-icons:airtel" width="35" class="text-red-500"></iconify-icon>
+                </div>
             </div>
         </div>
+
+        <!-- Footer Bottom -->
         <div class="pt-8 border-t border-white/5 flex flex-col md:flex-row justify-between items-center gap-6">
-            <p class="text-gray-500 text-[10px] font-bold uppercase tracking-[0.2em]">© 2026 NEWKET — Expérience Luxe</p>
+            <div class="flex flex-col items-center md:items-start gap-1">
+                <p class="text-gray-500 text-[10px] font-bold uppercase tracking-[0.2em]">© 2026 NEWKET — Expérience
+                    Luxe</p>
+                <p class="text-gray-600 text-[9px] uppercase tracking-wider">Tous droits réservés</p>
+            </div>
             <div class="flex gap-8">
-                <a href="privacy.html" class="text-gray-500 hover:text-white text-[10px] font-bold uppercase tracking-widest transition-colors">Confidentialité</a>
-                <a href="terms.html" class="text-gray-500 hover:text-white text-[10px] font-bold uppercase tracking-widest transition-colors">Conditions</a>
+                <a href="privacy.html"
+                    class="text-gray-500 hover:text-white text-[10px] font-bold uppercase tracking-widest transition-colors">Confidentialité</a>
+                <a href="terms.html"
+                    class="text-gray-500 hover:text-white text-[10px] font-bold uppercase tracking-widest transition-colors">Conditions</a>
             </div>
             <div class="flex items-center gap-2">
-                <span class="text-gray-500 text-[10px] uppercase tracking-widest font-semibold italic">Designed by</span>
-                <span class="text-white text-[11px] font-black tracking-tighter hover:text-red-500 transition-colors cursor-pointer">SITYZEN</span>
+                <span class="text-gray-500 text-[10px] uppercase tracking-widest font-semibold italic">Designed
+                    by</span>
+                <span
+                    class="text-white text-[11px] font-black tracking-tighter hover:text-red-500 transition-colors cursor-pointer">SITYZEN</span>
             </div>
         </div>
     </div>
@@ -283,6 +329,9 @@ const ComponentLoader = {
         const element = document.getElementById(elementId);
         if (!element) return;
 
+        // Already expanded at build time by scripts/build_partials.py
+        if (element.hasAttribute('data-prerendered')) return;
+
         try {
             // Adjust path based on current directory depth
             const adjustedPath = this.getAdjustedPath(path);
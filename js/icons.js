@@ -0,0 +1,65 @@
+/* newket EMarket icons */
+
+// Renders <iconify-icon> from the local sprite built by scripts/build_icons.py,
+// instead of the iconify-icon script of code.iconify.design and its API calls.
+// Static tags already contain their <svg>; this handles the ones created by
+// templates or changed with setAttribute('icon', ...). The sprite URL and the
+// aspect ratio of the icons that are not square come from
+// <meta name="icon-sprite" content="..." data-ratios="logos:visa 3.09,...">.
+(function () {
+    if (!window.customElements || customElements.get('iconify-icon')) return;
+
+    const meta = document.querySelector('meta[name="icon-sprite"]');
+    const sprite = meta ? meta.getAttribute('content') : '';
+    const ratios = {};
+    ((meta && meta.getAttribute('data-ratios')) || '').split(',').forEach(entry => {
+        const [name, ratio] = entry.trim().split(' ');
+        if (name) ratios[name] = parseFloat(ratio);
+    });
+
+    // '20' * ratio, '1.5em' * ratio; null for 'auto' and the like
+    function scaled(value, ratio) {
+        const match = /^(\d*\.?\d+)([a-z%]*)$/.exec(String(value).trim());
+        return match ? +(parseFloat(match[1]) * ratio).toFixed(3) + match[2] : null;
+    }
+
+    // Same rules as svg_size() in scripts/build_icons.py
+    function size(element, name) {
+        const ratio = ratios[name] || 1;
+        let width = element.getAttribute('width');
+        let height = element.getAttribute('height');
+        if (width && !height) height = scaled(width, 1 / ratio);
+        else if (height && !width) width = scaled(height, ratio);
+        if (!width || !height) {
+            width = +ratio.toFixed(3) + 'em';
+            height = '1em';
+        }
+        return [width, height];
+    }
+
+    class IconifyIcon extends HTMLElement {
+        static get observedAttributes() {
+            return ['icon', 'width', 'height'];
+        }
+
+        connectedCallback() {
+            this.render();
+        }
+
+        attributeChangedCallback() {
+            if (this.isConnected) this.render();
+        }
+
+        render() {
+            const name = this.getAttribute('icon') || '';
+            if (!name || !sprite) return;
+            const [width, height] = size(this, name);
+            const html = `<svg width="${width}" height="${height}" aria-hidden="true">` +
+                `<use href="${sprite}#${name.replace(':', '--')}"></use></svg>`;
+            // Pre-rendered tags are left as they are
+            if (this.innerHTML !== html) this.innerHTML = html;
+        }
+    }
+
+    customElements.define('iconify-icon', IconifyIcon);
+})();
@@ -16,6 +16,7 @@ const App = {
         if (window.AuthManager) initPromises.push(AuthManager.init());
         if (window.ProductManager) initPromises.push(ProductManager.init());
         if (window.OrderManager) initPromises.push(OrderManager.init());
+        if (window.ReportsManager) initPromises.push(ReportsManager.init());
 
         await Promise.all(initPromises);
 
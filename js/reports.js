@@ -0,0 +1,108 @@
+/* newket EMarket Reports */
+
+// Order statistics precomputed by scripts/build_rollups.py, instead of
+// aggregating every order in the browser. The job publishes them to the
+// report_stats and report_customers tables, which only the admins may read:
+// the stats hold the figures of each timeframe, the customers are only
+// loaded for the clients export. Until they exist (or for a supplier, whose
+// figures only cover their own products) the pages fall back on OrderManager,
+// as they do for the day and week when the stats are not from today.
+const ReportsManager = {
+    stats: null,
+    // Rows per request, within the API's max rows
+    pageSize: 1000,
+    // Timeframes that stale stats would leave behind a day or more
+    liveTimeframes: ['day', 'week'],
+
+    async init() {
+        if (!window.supabaseClient) return;
+        try {
+            const { data, error } = await window.supabaseClient
+                .from('report_stats')
+                .select('body')
+                .eq('name', 'stats')
+                .maybeSingle();
+            if (error) throw error;
+            this.stats = data ? data.body : null;
+        } catch (err) {
+            console.warn('[NewKet] Reports unavailable:', err.message);
+        }
+    },
+
+    available() {
+        return !!this.stats && localStorage.getItem('newketRole') !== 'supplier';
+    },
+
+    // Whether the stats end today (UTC days, like the job)
+    isCurrent() {
+        return !!this.stats && this.stats.day === new Date().toISOString().slice(0, 10);
+    },
+
+    // Same shape as OrderManager.getAdvancedStats(), or null
+    getAdvancedStats(timeframe = 'all') {
+        if (!this.available()) return null;
+        if (this.liveTimeframes.includes(timeframe) && !this.isCurrent()) return null;
+        const t = this.stats.timeframes[timeframe] || this.stats.timeframes.all;
+        const products = window.ProductManager ? ProductManager.getProducts() : [];
+        const byId = {};
+        products.forEach(p => { byId[p.id] = p; });
+
+        return {
+            totalOrders: t.orders,
+            totalSales: t.revenue,
+            commissionTotal: t.revenue * 0.05,
+            netSales: t.revenue * 0.95,
+            totalCustomers: t.customers,
+            deadStockCount: products.filter(p => !t.products[p.id]).length,
+            categorySales: t.categories,
+            topProducts: t.top_products.map(([id, name, category, image, salesCount]) =>
+                ({ id, name, category, image, ...(byId[id] || {}), salesCount })),
+            snapshot: this.stats.watermark
+        };
+    },
+
+    // Same shape as OrderManager.getProfitStats(), or null
+    getProfitStats() {
+        const stats = this.getAdvancedStats('all');
+        if (!stats) return null;
+        const withdrawals = (window.OrderManager && OrderManager.withdrawals) || [];
+        return {
+            totalGross: stats.totalSales,
+            totalCommission: stats.commissionTotal,
+            totalNet: stats.commissionTotal,
+            commissionPercent: 5,
+            payouts: withdrawals.filter(w => w.status === 'Approuvé').map(w => ({
+                id: w.id,
+                date: w.created_at,
+                amount: w.amount,
+                status: w.status,
+                supplier_email: w.supplier_email
+            })),
+            pendingPayout: withdrawals.filter(w => w.status === 'En attente').reduce((sum, w) => sum + w.amount, 0)
+        };
+    },
+
+    // [{ name, email, phone, orderCount, totalSpent }], biggest spenders first, or null
+    async getClients() {
+        if (!this.available() || !window.supabaseClient) return null;
+        const clients = [];
+        for (let from = 0; ; from += this.pageSize) {
+            const { data, error } = await window.supabaseClient
+                .from('report_customers')
+                .select('name, email, phone, orders, spent')
+                .order('spent', { ascending: false })
+                .order('email')
+                .range(from, from + this.pageSize - 1);
+            if (error) {
+                console.warn('[NewKet] Report customers unavailable:', error.message);
+                return null;
+            }
+            data.forEach(c => clients.push({
+                name: c.name, email: c.email, phone: c.phone, orderCount: c.orders, totalSpent: Number(c.spent)
+            }));
+            if (data.length < this.pageSize) return clients;
+        }
+    }
+};
+
+window.ReportsManager = ReportsManager;
@@ -1,6 +1,208 @@
 /* newket EMarket Search Manager */
 
+// Accent-insensitive lowercase, the same fold as scripts/build_search_index.py
+function foldSearchText(text) {
+    return String(text || '').toLowerCase().normalize('NFD').replace(/\p{Mn}/gu, '')
+        .replace(/œ/g, 'oe').replace(/æ/g, 'ae').replace(/ß/g, 'ss');
+}
+
+function searchWords(text) {
+    return foldSearchText(text).match(/[\p{L}\p{N}]+/gu) || [];
+}
+
+function lowerBound(array, value, from = 0) {
+    let lo = from, hi = array.length;
+    while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (array[mid] < value) lo = mid + 1; else hi = mid;
+    }
+    return lo;
+}
+
+// Ascending product numbers of several sorted posting lists, merged lazily
+class PostingStream {
+    constructor(lists) {
+        this.heap = lists.filter(list => list.length).map(list => ({ list, pos: 0 }));
+        for (let i = (this.heap.length >> 1) - 1; i >= 0; i--) this.sift(i);
+    }
+
+    sift(i) {
+        const heap = this.heap;
+        for (;;) {
+            let smallest = i;
+            const l = 2 * i + 1, r = l + 1;
+            if (l < heap.length && heap[l].list[heap[l].pos] < heap[smallest].list[heap[smallest].pos]) smallest = l;
+            if (r < heap.length && heap[r].list[heap[r].pos] < heap[smallest].list[heap[smallest].pos]) smallest = r;
+            if (smallest === i) return;
+            [heap[i], heap[smallest]] = [heap[smallest], heap[i]];
+            i = smallest;
+        }
+    }
+
+    // Smallest value >= target, or -1 when the stream is exhausted
+    seek(target) {
+        const heap = this.heap;
+        while (heap.length) {
+            const top = heap[0];
+            if (top.list[top.pos] >= target) return top.list[top.pos];
+            top.pos = lowerBound(top.list, target, top.pos);
+            if (top.pos === top.list.length) {
+                heap[0] = heap[heap.length - 1];
+                heap.pop();
+            }
+            if (heap.length) this.sift(0);
+        }
+        return -1;
+    }
+}
+
+// Static index built by scripts/build_search_index.py, downloaded piece by piece
+const SearchIndex = {
+    // Next to the js/ directory, whether this file is loaded from js/ or from a bundle in js/dist/
+    base: (() => {
+        const src = document.currentScript ? document.currentScript.src : window.location.href;
+        const js = src.lastIndexOf('/js/');
+        return new URL(js === -1 ? 'search-index/' : src.slice(0, js + 1) + 'search-index/', window.location.href).href;
+    })(),
+    meta: null,
+    metaPromise: null,
+    files: new Map(),
+
+    load() {
+        if (!this.metaPromise) {
+            this.metaPromise = fetch(this.base + 'meta.json', { cache: 'no-cache' })
+                .then(response => response.ok ? response.json() : null)
+                .then(meta => (this.meta = meta))
+                .catch(() => null);
+        }
+        return this.metaPromise;
+    },
+
+    file(name) {
+        if (!this.files.has(name)) {
+            this.files.set(name, fetch(this.base + name).then(response => {
+                if (!response.ok) throw new Error(`${name}: ${response.status}`);
+                return response.json();
+            }));
+        }
+        return this.files.get(name);
+    },
+
+    async shard(key) {
+        const name = this.meta.shards[key];
+        if (!name) return null;
+        const shard = await this.file(name);
+        // Posting lists are delta-encoded on disk and decoded on first use
+        if (!shard.lists) shard.lists = new Array(shard.postings.length);
+        return shard;
+    },
+
+    postings(shard, i) {
+        if (!shard.lists[i]) {
+            const deltas = shard.postings[i];
+            const list = new Int32Array(deltas.length);
+            let value = 0;
+            for (let j = 0; j < deltas.length; j++) list[j] = value += deltas[j];
+            shard.lists[i] = list;
+        }
+        return shard.lists[i];
+    },
+
+    // Products whose words start with every query word, newest first;
+    // null when there is no index to search
+    async search(query, limit) {
+        const meta = await this.load();
+        if (!meta) return null;
+        const words = [...new Set(searchWords(query))].filter(w => w.length >= meta.shard_prefix);
+        if (!words.length) return [];
+
+        const streams = [];
+        for (const word of words) {
+            const shard = await this.shard(word.slice(0, meta.shard_prefix));
+            if (!shard) return [];
+            const from = lowerBound(shard.terms, word);
+            const to = lowerBound(shard.terms, word + '\uffff', from);
+            if (from === to) return [];
+            const lists = [];
+            for (let i = from; i < to; i++) lists.push(this.postings(shard, i));
+            streams.push(new PostingStream(lists));
+        }
+
+        // Products in every stream, in ascending order
+        const found = [];
+        let candidate = 0;
+        while (found.length < limit) {
+            let agreed = true;
+            for (const stream of streams) {
+                const next = stream.seek(candidate);
+                if (next === -1) return this.docs(found);
+                if (next !== candidate) {
+                    candidate = next;
+                    agreed = false;
+                }
+            }
+            if (agreed) found.push(candidate++);
+        }
+        return this.docs(found);
+    },
+
+    async docs(ordinals) {
+        const perChunk = this.meta.docs_per_chunk;
+        const chunks = await Promise.all(ordinals.map(n => this.file(this.meta.docs[Math.floor(n / perChunk)])));
+        return ordinals.map((n, i) => {
+            const [id, name, category, price, image] = chunks[i][n % perChunk];
+            return { id, name, category, price, image };
+        });
+    }
+};
+
 const SearchManager = {
+    // Folded name and category of the loaded products, computed once each
+    foldedProducts: new WeakMap(),
+    suggestionRequest: 0,
+
+    foldedText(product) {
+        let text = this.foldedProducts.get(product);
+        if (text === undefined) {
+            text = foldSearchText(`${product.name || ''} ${product.category || ''}`);
+            this.foldedProducts.set(product, text);
+        }
+        return text;
+    },
+
+    // Loaded products (newer than the index, or all of them without one)
+    matchLoadedProducts(query, limit, exclude) {
+        const words = searchWords(query);
+        const products = window.ProductManager ? ProductManager.getProducts() : [];
+        const found = [];
+        for (const p of products) {
+            if (exclude.has(p.id)) continue;
+            const text = this.foldedText(p);
+            if (words.every(w => text.includes(w))) {
+                found.push(p);
+                if (found.length === limit) break;
+            }
+        }
+        return found;
+    },
+
+    async findSuggestions(query, limit) {
+        let indexed = null;
+        try {
+            indexed = await SearchIndex.search(query, limit);
+        } catch (err) {
+            console.warn('[NewKet] Search index unavailable:', err);
+        }
+        if (indexed === null) {
+            return this.matchLoadedProducts(query, limit, new Set());
+        }
+        // Products added since the index was built come first
+        const known = new Set(indexed.map(p => p.id));
+        const recent = this.matchLoadedProducts(query, limit, known)
+            .filter(p => !SearchIndex.meta.snapshot || !p.created_at || p.created_at > SearchIndex.meta.snapshot);
+        return recent.concat(indexed).slice(0, limit);
+    },
+
     init() {
         const searchInputs = document.querySelectorAll('.search-input, #searchInput, #mobileSearchInput');
         const suggestionsContainer = document.getElementById('searchSuggestions');
@@ -9,6 +211,10 @@ const SearchManager = {
             const container = suggestionsContainer;
             if (!container) return;
 
+            // init() runs again once components are loaded; bind each input once
+            if (input.dataset.searchBound) return;
+            input.dataset.searchBound = 'true';
+
             input.addEventListener('input', (e) => {
                 const query = e.target.value.trim().toLowerCase();
                 this.updateSuggestions(query, container);
@@ -20,24 +226,25 @@ const SearchManager = {
             });
 
             input.addEventListener('focus', (e) => {
+                // The index is only downloaded once someone starts searching
+                SearchIndex.load();
                 const query = e.target.value.trim().toLowerCase();
                 if (query.length >= 2) container.classList.remove('hidden');
             });
         });
     },
 
-    updateSuggestions(query, container) {
+    async updateSuggestions(query, container) {
         if (!container) return;
+        const request = ++this.suggestionRequest;
         if (query.length < 2) {
             container.classList.add('hidden');
             return;
         }
 
-        const products = window.ProductManager ? ProductManager.getProducts() : [];
-        const filtered = products.filter(p =>
-            p.name.toLowerCase().includes(query) ||
-            p.category.toLowerCase().includes(query)
-        ).slice(0, 6);
+        const filtered = await this.findSuggestions(query, 6);
+        // A later keystroke already answered
+        if (request !== this.suggestionRequest) return;
 
         if (filtered.length === 0) {
             container.innerHTML = `
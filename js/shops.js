@@ -0,0 +1,196 @@
+/* newket Shops Directory */
+
+// shops.html (and shops-2.html, shops-3.html...) can be pre-rendered by
+// scripts/create_shops.py from a data snapshot: the grid then carries the
+// snapshot time and each card the seller's fields at that time. Instead of
+// loading every seller again, the page only asks for the sellers it shows
+// (and, on the first page, the ones who joined since the snapshot) and
+// re-renders the cards that changed. Without pre-rendered cards the sellers
+// are loaded as before.
+
+const SHOP_ROLES = ['vendor', 'supplier', 'fournisseur'];
+const SHOP_FIELDS = 'id,name,email,role,date_joined,avatar';
+
+let allSellers = [];
+let prerenderedGrid = null;
+let searchTimer = null;
+
+function escapeShopHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+}
+
+// Same fields as scripts/create_shops.py writes in data-rev
+function shopRevision(seller) {
+    return JSON.stringify([seller.name || '', seller.email || '', seller.avatar || '', seller.date_joined || '']);
+}
+
+function renderShopCard(seller) {
+    const name = seller.name || 'Boutique sans nom';
+    const avatar = seller.avatar || ('https://ui-avatars.com/api/?name=' + encodeURIComponent(seller.name || 'Vendor') + '&background=f3f4f6&color=000&bold=true');
+    const dateJoined = seller.date_joined ? new Date(seller.date_joined).toLocaleDateString('fr-FR', { month: 'long', year: 'numeric' }) : 'récemment';
+
+    return `
+                        <a href="shop.html?email=${encodeURIComponent(seller.email || '')}" class="shop-card group bg-white rounded-[2.5rem] p-8 border border-gray-100 flex flex-col items-center text-center gap-6 relative overflow-hidden" data-seller-id="${escapeShopHtml(seller.id)}" data-rev="${escapeShopHtml(shopRevision(seller))}">
+                            <div class="absolute top-6 left-6">
+                                 <span class="px-2 py-1 bg-black text-white text-[8px] font-black uppercase tracking-widest rounded-full opacity-0 group-hover:opacity-100 transition-opacity">Premium</span>
+                            </div>
+
+                            <div class="w-24 h-24 rounded-full bg-gray-50 overflow-hidden border-4 border-white shadow-lg group-hover:scale-105 transition-transform duration-500">
+                                <img src="${escapeShopHtml(avatar)}" alt="${escapeShopHtml(name)}" class="w-full h-full object-cover" loading="lazy" onerror="this.src='https://ui-avatars.com/api/?name=${encodeURIComponent(seller.name || 'V')}'">
+                            </div>
+
+                            <div class="space-y-2">
+                                <h3 class="text-xl font-black text-gray-900 group-hover:text-black transition-colors leading-tight">${escapeShopHtml(name)}</h3>
+                                <p class="text-[10px] text-gray-400 font-bold uppercase tracking-[0.2em]">Partenaire Certifié</p>
+                            </div>
+
+                            <div class="pt-6 border-t border-gray-50 w-full flex items-center justify-between">
+                                <span class="text-[10px] text-gray-400 font-bold uppercase tracking-widest">Depuis ${escapeShopHtml(dateJoined)}</span>
+                                <div class="w-8 h-8 rounded-full bg-black text-white flex items-center justify-center translate-x-4 opacity-0 group-hover:translate-x-0 group-hover:opacity-100 transition-all duration-500">
+                                    <iconify-icon icon="solar:arrow-right-linear" width="16"></iconify-icon>
+                                </div>
+                            </div>
+                        </a>
+                    `;
+}
+
+function showShops(sellers) {
+    const grid = document.getElementById('shopsGrid');
+    const noShops = document.getElementById('noShopsMsg');
+    if (sellers.length === 0) {
+        grid.innerHTML = '';
+        noShops.classList.remove('hidden');
+        return;
+    }
+    noShops.classList.add('hidden');
+    grid.innerHTML = sellers.map(renderShopCard).join('');
+}
+
+function setPaginationVisible(visible) {
+    const pagination = document.getElementById('shopsPagination');
+    if (pagination) pagination.classList.toggle('hidden', !visible);
+}
+
+// Pre-rendered page: fetch only what the snapshot may have got wrong
+async function refreshPrerenderedShops() {
+    const grid = document.getElementById('shopsGrid');
+    const cards = [...grid.querySelectorAll('[data-seller-id]')];
+    const ids = cards.map(card => card.dataset.sellerId);
+
+    const [current, newer] = await Promise.all([
+        ids.length ? window.SupabaseAdapter.fetchWithFilters('users', {
+            select: SHOP_FIELDS,
+            in: [['id', ids]]
+        }) : [],
+        grid.dataset.page === '1' ? window.SupabaseAdapter.fetchWithFilters('users', {
+            select: SHOP_FIELDS,
+            in: [['role', SHOP_ROLES]],
+            gte: [['date_joined', grid.dataset.snapshot]],
+            order: ['date_joined', { ascending: false }]
+        }) : []
+    ]);
+
+    const byId = new Map((current || []).map(seller => [String(seller.id), seller]));
+    let changed = 0;
+    cards.forEach(card => {
+        const seller = byId.get(card.dataset.sellerId);
+        if (!seller || !SHOP_ROLES.includes(seller.role)) {
+            card.remove();
+            changed++;
+        } else if (card.dataset.rev !== shopRevision(seller)) {
+            card.outerHTML = renderShopCard(seller).trim();
+            changed++;
+        }
+    });
+
+    const shown = new Set(ids);
+    const added = (newer || []).filter(seller => !shown.has(String(seller.id)));
+    if (added.length) {
+        grid.insertAdjacentHTML('afterbegin', added.map(renderShopCard).join(''));
+        changed += added.length;
+    }
+    if (changed) {
+        console.log(`[NewKet Shops] ${changed} card(s) refreshed since the snapshot of ${grid.dataset.snapshot}`);
+    }
+    prerenderedGrid = grid.innerHTML;
+}
+
+async function loadShops() {
+    const grid = document.getElementById('shopsGrid');
+    const noShops = document.getElementById('noShopsMsg');
+    const searchInput = document.getElementById('shopSearchInput');
+    const query = searchInput.value.trim().toLowerCase();
+
+    try {
+        if (!window.SupabaseAdapter) {
+            console.error('SupabaseAdapter not loaded');
+            if (!grid.dataset.snapshot) {
+                grid.innerHTML = '';
+                noShops.classList.remove('hidden');
+            }
+            return;
+        }
+
+        if (grid.dataset.snapshot) {
+            if (!query) {
+                setPaginationVisible(true);
+                if (prerenderedGrid === null) {
+                    await refreshPrerenderedShops();
+                } else {
+                    grid.innerHTML = prerenderedGrid;
+                }
+                noShops.classList.toggle('hidden', grid.children.length > 0);
+                return;
+            }
+            // The pages only hold a slice of the sellers: search them all
+            setPaginationVisible(false);
+            const pattern = `%${query.replace(/[%,()]/g, ' ')}%`;
+            const sellers = await window.SupabaseAdapter.fetchWithFilters('users', {
+                select: SHOP_FIELDS,
+                in: [['role', SHOP_ROLES]],
+                or: `name.ilike.${pattern},email.ilike.${pattern}`,
+                order: ['date_joined', { ascending: false }],
+                limit: 100
+            });
+            showShops(sellers || []);
+            return;
+        }
+
+        if (allSellers.length === 0) {
+            const sellers = await window.SupabaseAdapter.fetchWithFilters('users', {
+                in: [['role', SHOP_ROLES]],
+                order: ['date_joined', { ascending: false }],
+                limit: 100
+            });
+            allSellers = sellers || [];
+        }
+
+        showShops(query ? allSellers.filter(s =>
+            (s.name || '').toLowerCase().includes(query) ||
+            (s.email || '').toLowerCase().includes(query)
+        ) : allSellers);
+
+    } catch (err) {
+        console.error('Erreur chargement boutiques:', err);
+        if (!grid.dataset.snapshot) {
+            grid.innerHTML = '';
+            noShops.classList.remove('hidden');
+        }
+    }
+}
+
+document.addEventListener('DOMContentLoaded', () => {
+    const searchInput = document.getElementById('shopSearchInput');
+    searchInput.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadShops, 250);
+    });
+
+    if (window.newketInitialized) {
+        loadShops();
+    } else {
+        window.addEventListener('newketInitialized', loadShops);
+    }
+});
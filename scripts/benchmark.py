@@ -0,0 +1,256 @@
+import argparse
+import json
+import math
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from html_index import Element, HtmlIndex
+from rewrite_engine import ROOT, SKIP_DIRS, FunctionRule, Pipeline, run
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Benchmark of the rewrite rule sets on a synthetic site.
+# The tree is a copy of the site plus generated pages built from the real
+# templates: the <section>s of index.html or the <main> of
+# admin/dashboard.html are repeated `scale` times to make bigger pages.
+# Every registered rule set then runs (dry run, so each sees the same input)
+# in its own process, which gives its peak RSS; the report also has the wall
+# time, the bytes each rule scanned and, for every regex the rule sets use,
+# the time per match pass and how it grows with the page size (an exponent
+# well above 1 means backtracking across the document).
+#
+# The JSON report can be compared with one from another commit:
+#   python scripts/benchmark.py --out new.json --compare old.json
+
+# (template, directory of the generated pages, tag of the repeated blocks)
+TEMPLATES = [
+    ('index.html', '', 'section'),
+    ('admin/dashboard.html', 'admin', 'main'),
+]
+COPY_SKIP = SKIP_DIRS + ('dist', 'backup')
+SUPERLINEAR = 1.5
+# Size factor between the two pages each regex is timed on
+GROWTH_SCALE = 8
+MIN_TIMING = 0.05
+
+
+def scale_page(html, tag, scale):
+    # Repeats the run of sibling `tag` blocks `scale` times
+    index = HtmlIndex(html)
+    first = index.first(tag)
+    if first is None or scale == 1:
+        return html
+    blocks = [c for c in first.parent.children if isinstance(c, Element) and c.tag == tag]
+    start, end = blocks[0].start, blocks[-1].end
+    return html[:start] + '\n'.join([html[start:end]] * scale) + html[end:]
+
+
+def generate_tree(root, out, pages, admin_pages, scale):
+    shutil.copytree(root, out, ignore=shutil.ignore_patterns(*COPY_SKIP), dirs_exist_ok=True)
+    for (template, directory, tag), count in zip(TEMPLATES, (pages, admin_pages)):
+        with open(os.path.join(root, template), 'r', encoding='utf-8') as f:
+            html = scale_page(f.read(), tag, scale)
+        for i in range(count):
+            page = re.sub(r'<title>', f'<title>Bench {i:04d} ', html, count=1)
+            with open(os.path.join(out, directory, f'bench-{i:04d}.html'), 'w', encoding='utf-8') as f:
+                f.write(page)
+
+
+def registry():
+    import site_fixes
+    return site_fixes.REGISTRY
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_worker(name, root, out_path):
+    ruleset = next(r for r in registry() if r.name == name)
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    report = run(Pipeline([ruleset]), root, dry_run=True, profile=True)
+    wall = time.perf_counter() - start
+    pages = report.updated + report.unchanged
+    rules = {label.split(':', 1)[1]: {'seconds': t['seconds'], 'calls': t['pages'], 'matches': t['matches'],
+                                      'bytes_scanned': t['bytes_scanned']}
+             for label, t in report.rule_profile().items()}
+    result = {
+        'wall_s': wall,
+        'peak_rss_kb': peak_rss_kb(),
+        'baseline_rss_kb': baseline,
+        'pages': len(pages),
+        'bytes_read': sum(os.path.getsize(os.path.join(root, p)) for p in pages),
+        'bytes_scanned': sum(rule['bytes_scanned'] for rule in rules.values()),
+        'rules': rules,
+    }
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f)
+
+
+def run_transform(name, root):
+    with tempfile.NamedTemporaryFile('r', suffix='.json', delete=False) as f:
+        out_path = f.name
+    try:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', name, root, out_path],
+                       check=True, stdout=subprocess.DEVNULL)
+        with open(out_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    finally:
+        os.remove(out_path)
+
+
+def ruleset_regexes(ruleset):
+    # Compiled patterns held by the rules, or by the modules of function rules
+    found = {}
+    for rule in ruleset.rules:
+        for value in vars(rule).values():
+            if isinstance(value, re.Pattern):
+                found[f'{ruleset.name}:{rule.name}'] = value
+        if isinstance(rule, FunctionRule):
+            module = sys.modules[rule.func.__module__]
+            for attr, value in vars(module).items():
+                if isinstance(value, re.Pattern):
+                    found[f'{ruleset.name}:{module.__name__}.{attr}'] = value
+    return found
+
+
+def time_scan(regex, text):
+    # Seconds per full finditer() pass over `text`
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        for _ in regex.finditer(text):
+            pass
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= MIN_TIMING:
+            return elapsed / runs
+
+
+def regex_hotspots(root, rulesets, scale):
+    texts = []
+    for template, directory, tag in TEMPLATES:
+        with open(os.path.join(root, template), 'r', encoding='utf-8') as f:
+            html = f.read()
+        texts.append((template, scale_page(html, tag, scale), scale_page(html, tag, scale * GROWTH_SCALE)))
+
+    hotspots = []
+    for ruleset in rulesets:
+        for label, regex in ruleset_regexes(ruleset).items():
+            for template, small, large in texts:
+                t_small = time_scan(regex, small)
+                t_large = time_scan(regex, large)
+                # Exponent of time against page size: 1 is linear
+                growth = math.log(t_large / t_small) / math.log(len(large) / len(small)) if t_small > 0 else 0.0
+                hotspots.append({
+                    'regex': label,
+                    'template': template,
+                    'pattern': regex.pattern[:120],
+                    'seconds_per_pass': t_large,
+                    'ns_per_byte': t_large * 1e9 / len(large),
+                    'growth_exponent': round(growth, 2),
+                    'superlinear': growth > SUPERLINEAR,
+                })
+    hotspots.sort(key=lambda h: h['seconds_per_pass'], reverse=True)
+    return hotspots
+
+
+def git_commit(root):
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(root, pages, admin_pages, scale, names=None):
+    rulesets = [r for r in registry() if names is None or r.name in names]
+    report = {
+        'meta': {
+            'commit': git_commit(root),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pages': pages,
+            'admin_pages': admin_pages,
+            'scale': scale,
+        },
+        'transforms': {},
+    }
+    with tempfile.TemporaryDirectory() as tree:
+        generate_tree(root, tree, pages, admin_pages, scale)
+        for ruleset in rulesets:
+            print(f"Running {ruleset.name}...", file=sys.stderr)
+            report['transforms'][ruleset.name] = run_transform(ruleset.name, tree)
+    report['regex_hotspots'] = regex_hotspots(root, rulesets, scale)
+    return report
+
+
+def print_report(report):
+    print(f"{'transform':<28} {'pages':>6} {'wall s':>8} {'peak MB':>8} {'MB scanned':>11}")
+    for name, t in report['transforms'].items():
+        peak = f"{t['peak_rss_kb'] / 1024:.1f}" if t['peak_rss_kb'] else '-'
+        print(f"{name:<28} {t['pages']:>6} {t['wall_s']:>8.3f} {peak:>8} {t['bytes_scanned'] / 1e6:>11.1f}")
+    print(f"\nSlowest regexes (pages at {GROWTH_SCALE}x the scale):")
+    for h in report['regex_hotspots'][:10]:
+        flag = '  SUPERLINEAR' if h['superlinear'] else ''
+        print(f"  {h['seconds_per_pass'] * 1e3:8.2f} ms  x^{h['growth_exponent']:<5} {h['regex']} "
+              f"on {h['template']}{flag}")
+
+
+def compare(old, new, threshold):
+    # Returns the transforms whose wall time grew by more than `threshold`
+    if old['meta'].get('pages') != new['meta']['pages'] or old['meta'].get('scale') != new['meta']['scale']:
+        print("Warning: the reports were made with different tree sizes")
+    regressions = []
+    print(f"\n{'transform':<28} {'old s':>8} {'new s':>8} {'ratio':>7}")
+    for name, t in new['transforms'].items():
+        if name not in old['transforms']:
+            continue
+        before = old['transforms'][name]['wall_s']
+        ratio = t['wall_s'] / before if before else float('inf')
+        flag = '  REGRESSION' if ratio > threshold else ''
+        print(f"{name:<28} {before:>8.3f} {t['wall_s']:>8.3f} {ratio:>6.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '--worker':
+        run_worker(*sys.argv[2:])
+        raise SystemExit(0)
+
+    parser = argparse.ArgumentParser(description='Benchmark the rewrite rule sets on a synthetic site.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--pages', type=int, default=200, help='generated pages from index.html')
+    parser.add_argument('--admin-pages', type=int, default=50, help='generated pages from admin/dashboard.html')
+    parser.add_argument('--scale', type=int, default=1, help='repeat the content blocks of each page N times')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='rule sets to run (default: all registered)')
+    parser.add_argument('--out', help='write the JSON report to this file')
+    parser.add_argument('--compare', metavar='REPORT', help='JSON report of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='wall time ratio reported as a regression (default: 1.2)')
+    args = parser.parse_args()
+
+    report = benchmark(args.root, args.pages, args.admin_pages, args.scale, args.only)
+    print_report(report)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            if compare(json.load(f), report, args.threshold):
+                raise SystemExit(1)
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+
+# Streaming block splice: replaces every `start ... end` block of a file
+# while reading it in fixed-size chunks, so memory use does not depend on
+# the page size. Markers are found even when they straddle two chunks, the
+# output goes to a temp file next to the page and is renamed over it only
+# when a block actually changed.
+#
+# The body of the block being removed is spilled to a second temp file: if
+# the end marker never shows up, it is copied back unchanged, like
+# BlockSwap does in memory.
+
+CHUNK_SIZE = 1 << 16
+
+
+class _Block:
+    # Holds the current block on disk and checks it against the replacement
+    def __init__(self, directory, replacement):
+        self.spill = tempfile.TemporaryFile('w+', encoding='utf-8', dir=directory)
+        self.replacement = replacement
+        self.pos = 0
+        self.same = True
+
+    def write(self, text):
+        self.spill.write(text)
+        if self.same:
+            expected = self.replacement[self.pos:self.pos + len(text)]
+            self.same = expected == text
+        self.pos += len(text)
+
+    def unchanged(self):
+        return self.same and self.pos == len(self.replacement)
+
+    def copy_to(self, out):
+        self.spill.seek(0)
+        for chunk in iter(lambda: self.spill.read(CHUNK_SIZE), ''):
+            out.write(chunk)
+
+    def close(self):
+        self.spill.close()
+
+
+def splice_stream(src, out, start, end, replacement='', count=0, directory=None, chunk_size=CHUNK_SIZE):
+    # Returns (blocks swapped, blocks whose content actually changed)
+    buf = ''
+    block = None
+    swapped = changed = 0
+    eof = False
+    while not eof:
+        chunk = src.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+        while True:
+            if block is None:
+                idx = -1 if count and swapped >= count else buf.find(start)
+                if idx == -1:
+                    # Keep a possible partial marker for the next chunk
+                    keep = 0 if eof else min(len(buf), len(start) - 1)
+                    out.write(buf[:len(buf) - keep])
+                    buf = buf[len(buf) - keep:]
+                    break
+                out.write(buf[:idx])
+                buf = buf[idx + len(start):]
+                block = _Block(directory, replacement)
+                block.write(start)
+            else:
+                idx = buf.find(end)
+                if idx == -1:
+                    if eof:
+                        # Unterminated block: put it back as it was
+                        block.copy_to(out)
+                        block.close()
+                        block = None
+                        out.write(buf)
+                        buf = ''
+                        break
+                    keep = min(len(buf), len(end) - 1)
+                    block.write(buf[:len(buf) - keep])
+                    buf = buf[len(buf) - keep:]
+                    break
+                block.write(buf[:idx + len(end)])
+                buf = buf[idx + len(end):]
+                out.write(replacement)
+                swapped += 1
+                if not block.unchanged():
+                    changed += 1
+                block.close()
+                block = None
+    return swapped, changed
+
+
+def splice_file(path, start, end, replacement='', count=0, dry_run=False, chunk_size=CHUNK_SIZE):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.splice-', suffix='.tmp', dir=directory)
+    try:
+        with open(path, 'r', encoding='utf-8') as src, \
+                os.fdopen(fd, 'w', encoding='utf-8') as out:
+            swapped, changed = splice_stream(src, out, start, end, replacement, count, directory, chunk_size)
+        if changed and not dry_run:
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        return changed
+    finally:
+        if tmp_path:
+            os.remove(tmp_path)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+import subprocess
+import tempfile
+
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import Pipeline, Rule, RuleSet, build_parser, page_matches, run_from_args
+
+# Purged Tailwind build.
+# The Play CDN (cdn.tailwindcss.com) compiles the CSS in the browser on every
+# page load, and css/tailwind.css is one build shared by every page. Each
+# page group now gets its own minified build, generated by the tailwindcss
+# CLI of node_modules from tailwind.config.js with the content narrowed to
+# the files the group's markup can come from: its pages, the components,
+# the HTML strings of js/ (components-loader.js fallbacks, rendered cards...)
+# and the templates of the rewrite scripts.
+#
+# Files are named css/tailwind.<group>.<hash>.css so they can be cached
+# forever; css/tailwind-builds.json maps each group to its current file and
+# the TailwindStylesheet rule points the pages at it, replacing the CDN
+# script (and its inline tailwind.config) or the previous stylesheet link.
+
+CSS_DIR = 'css'
+BUILDS_NAME = 'tailwind-builds.json'
+INPUT = 'src/input.css'
+CONFIG = 'tailwind.config.js'
+
+SHARED_CONTENT = ['components/*.html', 'js/**/*.js', 'scripts/*.py', 'admin/*.py']
+
+# (group, pages, extra content files); a page belongs to the first group it matches
+GROUPS = [
+    ('admin', ['admin/*.html'], SHARED_CONTENT),
+    ('site', ['*.html'], SHARED_CONTENT),
+]
+
+cdn_prefix = 'https://cdn.tailwindcss.com'
+stylesheet_regex = re.compile(r'(?:\.\./)*css/tailwind(?:\.[\w-]+\.[0-9a-f]+)?\.css')
+
+
+def tailwind_command(root):
+    # The CLI installed by `npm install` (package.json devDependencies)
+    found = shutil.which('tailwindcss', path=os.path.join(root, 'node_modules', '.bin'))
+    if found is None:
+        raise SystemExit("tailwindcss not found in node_modules: run npm install first")
+    return [found]
+
+
+def build_group(root, command, group, patterns, workdir):
+    root_url = root.replace(os.sep, '/')
+    config_path = os.path.join(workdir, f'tailwind.{group}.config.js')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        f.write(f"module.exports = Object.assign({{}}, require({json.dumps(os.path.join(root, CONFIG))}), "
+                f"{{content: {json.dumps([f'{root_url}/{p}' for p in patterns])}}});\n")
+    out_path = os.path.join(workdir, f'tailwind.{group}.css')
+    subprocess.run(command + ['-c', config_path, '-i', os.path.join(root, INPUT), '-o', out_path, '--minify'],
+                   cwd=root, check=True, stdout=subprocess.DEVNULL)
+    with open(out_path, 'rb') as f:
+        return f.read()
+
+
+def build_stylesheets(root):
+    command = tailwind_command(root)
+    builds = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for group, pages, content in GROUPS:
+            css = build_group(root, command, group, pages + content, workdir)
+            filename = f'tailwind.{group}.{hashlib.sha256(css).hexdigest()[:10]}.css'
+            path = os.path.join(root, CSS_DIR, filename)
+            if not os.path.exists(path):
+                with open(path, 'wb') as f:
+                    f.write(css)
+            # Older builds of the group are no longer referenced
+            for old in os.listdir(os.path.join(root, CSS_DIR)):
+                if old != filename and re.fullmatch(rf'tailwind\.{group}\.[0-9a-f]+\.css', old):
+                    os.remove(os.path.join(root, CSS_DIR, old))
+            builds[group] = filename
+            print(f"{CSS_DIR}/{filename}: {len(css)} bytes")
+
+    with open(os.path.join(root, CSS_DIR, BUILDS_NAME), 'w', encoding='utf-8') as f:
+        json.dump(builds, f, indent=1, sort_keys=True)
+    return builds
+
+
+def page_group(relpath):
+    for group, pages, content in GROUPS:
+        if any(page_matches(relpath, pattern) for pattern in pages):
+            return group
+    return None
+
+
+def is_tailwind_config(index, element):
+    return element.tag == 'script' and 'src' not in element.attrs \
+        and index.inner(element).strip().startswith('tailwind.config')
+
+
+class TailwindStylesheet(Rule):
+    def __init__(self, name='tailwind_stylesheet', pages=None):
+        super().__init__(name, pages)
+        self.builds = {}
+
+    def prepare(self, root):
+        path = os.path.join(root, CSS_DIR, BUILDS_NAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.builds = json.load(f)
+
+    def inputs(self):
+        return [f'{CSS_DIR}/{BUILDS_NAME}']
+
+    def apply(self, content, page):
+        filename = self.builds.get(page_group(page.relpath))
+        if filename is None:
+            return content
+        page_dir = posixpath.dirname(page.relpath) or '.'
+        href = posixpath.relpath(f'{CSS_DIR}/{filename}', page_dir)
+
+        index = HtmlIndex(content)
+        splicer = Splicer(index)
+        for script in index.find('script'):
+            if script.attrs.get('src', '').startswith(cdn_prefix):
+                splicer.replace(script, f'<link rel="stylesheet" href="{href}">')
+                page.hit('cdn_script')
+            elif is_tailwind_config(index, script):
+                # Only read by the CDN script; theme settings live in tailwind.config.js
+                splicer.remove(script)
+                page.hit('inline_config')
+        for link in index.find('link', attrs={'rel': 'stylesheet'}):
+            current = link.attrs.get('href', '')
+            if stylesheet_regex.fullmatch(current) and current != href:
+                splicer.set_attr(link, 'href', href)
+                page.hit('stylesheet_link')
+        return splicer.apply()
+
+    def describe(self):
+        return super().describe() + [self.builds, GROUPS]
+
+
+RULES = RuleSet('build_css', [TailwindStylesheet()],
+                pages=[pattern for group, pages, content in GROUPS for pattern in pages])
+
+if __name__ == '__main__':
+    parser = build_parser('Build one purged Tailwind stylesheet per page group and link the pages to it.')
+    parser.add_argument('--skip-build', action='store_true',
+                        help='only relink the pages to the builds listed in tailwind-builds.json')
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        build_stylesheets(args.root)
+    run_from_args(Pipeline([RULES]), args)
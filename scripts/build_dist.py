@@ -0,0 +1,178 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import html_index
+import html_minify
+from rewrite_engine import ROOT, find_pages, source_hash
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Output stage, run after the rewrite scripts.
+# Copies the published files of the site into dist/, with the HTML pages
+# minified (see html_minify.py), and writes a .gz and a .br sibling of every
+# text file at maximum compression so the static server can send the
+# precompressed bytes as they are. Files are processed in a process pool;
+# a file whose output is newer than its source is not redone, unless the
+# tools changed since the last build: dist/.build-stamp records a hash of
+# this script (the published lists included), of the minifier and of whether brotli
+# is available, and a different one rebuilds everything. Files of dist/
+# whose source is no longer published are removed.
+#
+# .br needs the brotli package (pip install brotli); without it only the
+# .gz files are written.
+
+# Files served by the site, relative to the root
+PUBLISHED = [
+    '*.html', 'admin/*.html', 'components/*.html',
+    'css/*.css', 'js/*.js', 'js/dist/*.js',
+    'Images/*', 'Images/optimized/*', 'icons/*.svg',
+    'manifest.json', 'sw.js',
+    'search-index/*.json',
+]
+# Published too, but written by build_product_pages.py from product.html and
+# the products table: thousands of copies of one template, kept out of the
+# site graph and of the watched files (see site_graph.py)
+GENERATED = ['products/*/*.html', 'sitemap.xml', 'sitemaps/*.xml']
+COMPRESSED_EXTENSIONS = ('.html', '.css', '.js', '.json', '.svg', '.txt', '.xml')
+STAMP_NAME = '.build-stamp'
+SIBLING_SUFFIXES = ('.gz', '.br')
+
+
+def compress(path, data):
+    # Returns the compressed sizes; a sibling that saves nothing is not kept
+    sizes = {}
+    # mtime=0 keeps the .gz identical when the content is
+    outputs = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        outputs.append(('.br', brotli.compress(data, mode=brotli.MODE_TEXT, quality=11)))
+    for suffix, compressed in outputs:
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            sizes[suffix] = len(compressed)
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return sizes
+
+
+def build_file(root, out, relpath, force=False):
+    # (relpath, source bytes, output bytes, {suffix: compressed bytes}) or None if up to date
+    src = os.path.join(root, relpath)
+    dest = os.path.join(out, relpath)
+    if not force and os.path.exists(dest) and os.stat(dest).st_mtime_ns >= os.stat(src).st_mtime_ns:
+        return None
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+
+    with open(src, 'rb') as f:
+        data = f.read()
+    source_size = len(data)
+    if relpath.endswith('.html'):
+        data = html_minify.minify(data.decode('utf-8')).encode('utf-8')
+    with open(dest, 'wb') as f:
+        f.write(data)
+    shutil.copystat(src, dest)
+
+    sizes = compress(dest, data) if relpath.endswith(COMPRESSED_EXTENSIONS) else {}
+    return relpath, source_size, len(data), sizes
+
+
+def _build_one(args):
+    return build_file(*args)
+
+
+def tools_hash():
+    parts = [source_hash(build_file), source_hash(html_minify), source_hash(html_index), str(brotli is not None)]
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+def read_stamp(out):
+    try:
+        with open(os.path.join(out, STAMP_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f).get('tools')
+    except (OSError, ValueError):
+        return None
+
+
+def write_stamp(out, tools):
+    os.makedirs(out, exist_ok=True)
+    with open(os.path.join(out, STAMP_NAME), 'w', encoding='utf-8') as f:
+        json.dump({'tools': tools}, f)
+
+
+def prune(out, relpaths):
+    # Removes the outputs (and their siblings) of files no longer published;
+    # returns how many outputs were removed
+    keep = set(relpaths)
+    removed = 0
+    for dirpath, dirnames, filenames in os.walk(out, topdown=False):
+        for filename in filenames:
+            relpath = os.path.relpath(os.path.join(dirpath, filename), out).replace(os.sep, '/')
+            if relpath == STAMP_NAME:
+                continue
+            base = relpath
+            for suffix in SIBLING_SUFFIXES:
+                if relpath.endswith(suffix) and relpath not in keep:
+                    base = relpath[:-len(suffix)]
+            if base not in keep:
+                os.remove(os.path.join(dirpath, filename))
+                removed += base == relpath
+        if dirpath != out and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return removed
+
+
+def build(root=ROOT, out=None, jobs=1, force=False):
+    # (results, published files, outputs removed)
+    out = out or os.path.join(root, 'dist')
+    relpaths = find_pages(root, PUBLISHED + GENERATED)
+    tools = tools_hash()
+    if read_stamp(out) != tools:
+        force = True
+    tasks = [(root, out, relpath, force) for relpath in relpaths]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        results = [build_file(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_build_one, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+    removed = prune(out, relpaths) if os.path.isdir(out) else 0
+    write_stamp(out, tools)
+    return [result for result in results if result], len(relpaths), removed
+
+
+def print_summary(results, total, removed=0):
+    source = minified = 0
+    compressed = {}
+    for relpath, source_size, size, sizes in results:
+        source += source_size
+        minified += size
+        for suffix, compressed_size in sizes.items():
+            compressed[suffix] = compressed.get(suffix, 0) + compressed_size
+    print(f"{len(results)} file(s) written, {total - len(results)} up to date"
+          + (f", {removed} removed (no longer published)." if removed else "."))
+    if results:
+        print(f"  sources: {source} bytes, minified: {minified} bytes")
+        for suffix, size in sorted(compressed.items()):
+            print(f"  {suffix}: {size} bytes")
+    if brotli is None:
+        print("brotli is not installed: .br files were not written (pip install brotli)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Minify the pages into dist/ and precompress them with gzip and brotli.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--out', help='output directory (default: <root>/dist)')
+    parser.add_argument('--jobs', '-j', type=int, default=0, metavar='N',
+                        help='compress in N worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='rebuild files that look up to date')
+    args = parser.parse_args()
+
+    print_summary(*build(args.root, args.out, args.jobs, args.force))
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import Pipeline, Rule, RuleSet, build_parser, find_pages, run_from_args
+
+# Local SVG sprite for the <iconify-icon> tags.
+# Every page loaded iconify-icon.min.js from code.iconify.design, which then
+# asked the Iconify API for the SVG of each icon. This collects the icon
+# names used by the site (icon="solar:..." and quoted 'prefix:name' strings
+# of the pages, components, js/ and the templates of the rewrite scripts),
+# resolves them from icon sets installed locally and writes them as
+# <symbol>s of one sprite, icons/sprite.<hash>.svg, with icons/sprite.json
+# listing the file and the box of each icon.
+#
+# The InlineIcons rule then pre-renders each static tag as
+#   <iconify-icon icon="solar:box-bold" width="20"><svg width="20" height="20" aria-hidden="true">
+#   <use href="icons/sprite.<hash>.svg#solar--box-bold"></use></svg></iconify-icon>
+# and replaces the CDN script with js/icons.js, a small element that renders
+# the tags created or changed by scripts (templates, setAttribute('icon', ...))
+# from the same sprite. The <iconify-icon> element itself stays, so
+# querySelector('iconify-icon') and the CSS classes keep working.
+#
+# Icon sets are the JSON files of the @iconify-json/<prefix> packages
+# (npm install -D @iconify-json/solar @iconify-json/line-md @iconify-json/logos
+# @iconify-json/simple-icons) or of the full @iconify/json package; --sets
+# reads <prefix>.json files from another folder. Names that only exist at
+# runtime (read from the database, say) must be listed in EXTRA_ICONS.
+#
+#   python scripts/build_icons.py
+#   python scripts/build_icons.py --sets ~/iconify-sets
+
+ICONS_DIR = 'icons'
+SPRITE_NAME = 'sprite.json'
+
+SOURCES = ['*.html', 'admin/*.html', 'components/*.html', 'js/*.js', 'scripts/*.py', 'admin/*.py']
+# Icon names the sources do not spell out
+EXTRA_ICONS = []
+
+# Where an icon set is looked for, relative to the root
+SET_PATHS = [
+    'node_modules/@iconify-json/{prefix}/icons.json',
+    'node_modules/@iconify/json/json/{prefix}.json',
+]
+
+# Defaults of the Iconify JSON format
+DEFAULT_BOX = {'left': 0, 'top': 0, 'width': 16, 'height': 16}
+
+cdn_prefix = 'https://code.iconify.design/'
+icon_part = r'[a-z0-9]+(?:[-_][a-z0-9]+)*'
+# A quoted string that is a whole icon name; whether the prefix is an icon
+# set tells it apart from a Tailwind class like "hover:underline"
+quoted_name_regex = re.compile(rf'''(['"`])({icon_part}:{icon_part})\1''')
+icon_attr_regex = re.compile(rf'''\bicon\s*=\s*(['"])({icon_part}:{icon_part})\1''')
+element_id_regex = re.compile(r'''\bid=(["'])([^"']+)\1''')
+sprite_file_regex = re.compile(r'sprite\.[0-9a-f]{8}\.svg')
+size_regex = re.compile(r'(\d*\.?\d+)([a-z%]*)')
+
+
+def symbol_id(name):
+    return name.replace(':', '--')
+
+
+def number(value):
+    return f'{value:.3f}'.rstrip('0').rstrip('.')
+
+
+def collect_names(root):
+    # (every candidate name, the names used as icon="..."), each mapped to a file using it
+    candidates = {}
+    used = {}
+    for relpath in find_pages(root, SOURCES):
+        with open(os.path.join(root, relpath), 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        for m in quoted_name_regex.finditer(text):
+            candidates.setdefault(m.group(2), relpath)
+        for m in icon_attr_regex.finditer(text):
+            used.setdefault(m.group(2), relpath)
+    for name in EXTRA_ICONS:
+        candidates.setdefault(name, 'EXTRA_ICONS')
+        used.setdefault(name, 'EXTRA_ICONS')
+    return candidates, used
+
+
+def find_set(root, prefix, extra_dirs=()):
+    paths = [os.path.join(directory, f'{prefix}.json') for directory in extra_dirs]
+    paths += [os.path.join(root, pattern.format(prefix=prefix)) for pattern in SET_PATHS]
+    for path in paths:
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+    return None
+
+
+def resolve_icon(icon_set, name):
+    # The icon data with the aliases followed and their transformations merged, or None
+    icons = icon_set.get('icons', {})
+    aliases = icon_set.get('aliases', {})
+    data = {'rotate': 0, 'hFlip': False, 'vFlip': False}
+    for _ in range(32):
+        item = icons.get(name) or aliases.get(name)
+        if item is None:
+            return None
+        for key, value in item.items():
+            if key == 'rotate':
+                data['rotate'] += value
+            elif key in ('hFlip', 'vFlip'):
+                data[key] = data[key] != value
+            elif key != 'parent':
+                data.setdefault(key, value)
+        if name in icons:
+            for key, value in DEFAULT_BOX.items():
+                data.setdefault(key, icon_set.get(key, value))
+            return data
+        name = item.get('parent')
+    return None
+
+
+def render_symbol(name, data):
+    # <symbol> of an icon, following the transformations of Iconify's iconToSVG()
+    left, top, width, height = data['left'], data['top'], data['width'], data['height']
+    body = data['body']
+    transforms = []
+    rotate = data['rotate']
+    if data['hFlip']:
+        if data['vFlip']:
+            rotate += 2
+        else:
+            transforms += [f'translate({number(width + left)} {number(-top)})', 'scale(-1 1)']
+            left = top = 0
+    elif data['vFlip']:
+        transforms += [f'translate({number(-left)} {number(height + top)})', 'scale(1 -1)']
+        left = top = 0
+    rotate %= 4
+    if rotate == 1:
+        center = number(height / 2 + top)
+        transforms.insert(0, f'rotate(90 {center} {center})')
+    elif rotate == 2:
+        transforms.insert(0, f'rotate(180 {number(width / 2 + left)} {number(height / 2 + top)})')
+    elif rotate == 3:
+        center = number(width / 2 + left)
+        transforms.insert(0, f'rotate(-90 {center} {center})')
+    if rotate % 2:
+        left, top, width, height = top, left, height, width
+    if transforms:
+        body = f'<g transform="{" ".join(transforms)}">{body}</g>'
+
+    # Gradients and masks of different icons share the sprite: keep their ids apart
+    prefix = symbol_id(name)
+    for element_id in sorted({m.group(2) for m in element_id_regex.finditer(body)}, key=len, reverse=True):
+        new_id = f'{prefix}-{element_id}'
+        body = re.sub(rf'''(\bid=["']){re.escape(element_id)}(["'])''', rf'\g<1>{new_id}\g<2>', body)
+        body = re.sub(rf'#{re.escape(element_id)}(?![\w-])', f'#{new_id}', body)
+    box = [left, top, width, height]
+    return (f'<symbol id="{prefix}" viewBox="{" ".join(number(v) for v in box)}">{body}</symbol>',
+            [width, height])
+
+
+def build_sprite(root, extra_dirs=()):
+    candidates, used = collect_names(root)
+    sets = {}
+    symbols = []
+    boxes = {}
+    unknown = []
+    for name in sorted(candidates):
+        prefix, icon = name.split(':', 1)
+        if prefix not in sets:
+            sets[prefix] = find_set(root, prefix, extra_dirs)
+        if sets[prefix] is None:
+            continue
+        data = resolve_icon(sets[prefix], icon)
+        if data is None:
+            if name in used:
+                unknown.append(name)
+            continue
+        symbol, box = render_symbol(name, data)
+        symbols.append(symbol)
+        boxes[name] = box
+
+    missing_sets = sorted({name.split(':', 1)[0] for name in used if sets.get(name.split(':', 1)[0]) is None})
+    for prefix in missing_sets:
+        names = sorted(name for name in used if name.startswith(prefix + ':'))
+        print(f"Warning: no icon set for '{prefix}' ({len(names)} icon(s), e.g. {names[0]} in {used[names[0]]}): "
+              f"npm install -D @iconify-json/{prefix}")
+    for name in unknown:
+        print(f"Warning: {name} (used in {used[name]}) is not in its icon set")
+
+    out_dir = os.path.join(root, ICONS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    text = ('<svg xmlns="http://www.w3.org/2000/svg">\n'
+            + ''.join(f'{symbol}\n' for symbol in symbols) + '</svg>\n')
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]
+    filename = f'sprite.{digest}.svg'
+    with open(os.path.join(out_dir, filename), 'w', encoding='utf-8') as f:
+        f.write(text)
+    for existing in os.listdir(out_dir):
+        if sprite_file_regex.fullmatch(existing) and existing != filename:
+            os.remove(os.path.join(out_dir, existing))
+
+    sprite = {'file': filename, 'icons': boxes}
+    with open(os.path.join(out_dir, SPRITE_NAME), 'w', encoding='utf-8') as f:
+        json.dump(sprite, f, indent=1, sort_keys=True)
+    print(f"{len(boxes)} icon(s) from {len([s for s in sets.values() if s])} set(s) in {ICONS_DIR}/{filename}: "
+          f"{len(text.encode('utf-8'))} bytes.")
+    return sprite
+
+
+def scaled(value, ratio):
+    # '20' -> '20' * ratio, '1.5em' -> '1.5em' * ratio; None for 'auto' and the like
+    m = size_regex.fullmatch(value.strip())
+    if m is None:
+        return None
+    return number(float(m.group(1)) * ratio) + m.group(2)
+
+
+def svg_size(attrs, box):
+    # width and height of the <svg>, as iconify-icon computes them: a missing
+    # one follows the icon's aspect ratio, and the default height is 1em
+    ratio = box[0] / box[1]
+    width = attrs.get('width')
+    height = attrs.get('height')
+    if width and not height:
+        height = scaled(width, 1 / ratio)
+    elif height and not width:
+        width = scaled(height, ratio)
+    if not width or not height:
+        width, height = f'{number(ratio)}em', '1em'
+    return width, height
+
+
+def ratios(icons):
+    # Aspect ratios of the icons that are not square, for js/icons.js
+    return ','.join(f'{name} {number(box[0] / box[1])}'
+                    for name, box in sorted(icons.items()) if box[0] != box[1])
+
+
+ICON_STYLE = ('<style data-icons>iconify-icon{display:inline-block;vertical-align:-0.125em}'
+              'iconify-icon>svg{display:block}</style>')
+
+
+class InlineIcons(Rule):
+    def __init__(self, name='inline_icons', pages=None):
+        super().__init__(name, pages)
+        self.sprite = {}
+
+    def prepare(self, root):
+        path = os.path.join(root, ICONS_DIR, SPRITE_NAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.sprite = json.load(f)
+
+    def inputs(self):
+        return [f'{ICONS_DIR}/{SPRITE_NAME}']
+
+    def apply(self, content, page):
+        if not self.sprite:
+            return content
+        icons = self.sprite['icons']
+        page_dir = posixpath.dirname(page.relpath) or '.'
+        href = posixpath.relpath(f"{ICONS_DIR}/{self.sprite['file']}", page_dir)
+
+        index = HtmlIndex(content)
+        splicer = Splicer(index)
+        missing = False
+        for element in index.find('iconify-icon'):
+            name = element.attrs.get('icon', '')
+            if '${' in name:
+                continue
+            if name not in icons:
+                page.warn(f"{name or 'an icon without a name'} is not in the sprite: the CDN script stays")
+                missing = True
+                continue
+            width, height = svg_size(element.attrs, icons[name])
+            svg = (f'<svg width="{width}" height="{height}" aria-hidden="true">'
+                   f'<use href="{href}#{symbol_id(name)}"></use></svg>')
+            if index.inner(element) != svg:
+                splicer.replace_inner(element, svg)
+                page.hit('icon')
+
+        meta = index.first('meta', attrs={'name': 'icon-sprite'})
+        if meta is not None:
+            for attr, value in (('content', href), ('data-ratios', ratios(icons))):
+                if meta.attrs.get(attr) != value:
+                    splicer.set_attr(meta, attr, value)
+                    page.hit('sprite_meta')
+        for script in index.find('script'):
+            if script.attrs.get('src', '').startswith(cdn_prefix) and not missing:
+                text = index.text
+                indent = text[text.rfind('\n', 0, script.start) + 1:script.start]
+                runtime = posixpath.relpath('js/icons.js', page_dir)
+                tags = [f'<script src="{runtime}"></script>']
+                if meta is None:
+                    tags[:0] = [f'<meta name="icon-sprite" content="{href}" data-ratios="{ratios(icons)}">',
+                                ICON_STYLE]
+                splicer.replace(script, f'\n{indent}'.join(tags))
+                page.hit('cdn_script')
+        return splicer.apply()
+
+    def describe(self):
+        return super().describe() + [self.sprite, ICON_STYLE]
+
+
+RULES = RuleSet('build_icons', [InlineIcons()], pages=['*.html', 'admin/*.html'])
+
+if __name__ == '__main__':
+    parser = build_parser('Build a local SVG sprite of the Iconify icons and render the <iconify-icon> tags from it.')
+    parser.add_argument('--skip-build', action='store_true',
+                        help='only rewrite the pages from the existing icons/sprite.json')
+    parser.add_argument('--sets', nargs='+', default=[], metavar='DIR',
+                        help='folders of <prefix>.json icon sets, read before node_modules')
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        build_sprite(args.root, [os.path.expanduser(d) for d in args.sets])
+    run_from_args(Pipeline([RULES]), args)
@@ -0,0 +1,115 @@
+import os
+import re
+
+from rewrite_engine import Rule, RuleSet, main
+
+# Build-time include of the shared components.
+# components/header.html and components/footer.html are the single source:
+# their markup is expanded into the placeholders of every page (with the
+# current page's nav links marked active, like add_active in
+# admin/update_sidebar.py) so pages ship pre-rendered markup, and the inline
+# fallback strings of js/components-loader.js are regenerated from the same
+# files. The loader leaves placeholders marked data-prerendered alone.
+#
+# Expanded blocks are wrapped in include comments so the build can run again
+# after a component changes.
+
+# (placeholder id, component, pages it is rendered on)
+# The footer is only injected on the home page by the loader.
+INCLUDES = [
+    ('header-placeholder', 'components/header.html', None),
+    ('footer-placeholder', 'components/footer.html', ['index.html']),
+]
+
+# Fallback constant in js/components-loader.js for each component
+LOADER_CONSTANTS = [
+    ('HEADER_HTML', 'components/header.html'),
+    ('FOOTER_HTML', 'components/footer.html'),
+]
+
+nav_link_regex = re.compile(r'href="([^"]+)"(\s+)class="([^"]*\bnav-link\b[^"]*)"')
+
+
+def read_component(root, component):
+    with open(os.path.join(root, component), 'r', encoding='utf-8') as f:
+        return f.read().rstrip('\n')
+
+
+def mark_active_links(html, page_name):
+    def add_active(match):
+        href, space, classes = match.groups()
+        classes = classes.replace(' active', '')
+        if href == page_name:
+            return f'href="{href}"{space}class="{classes} active" aria-current="page"'
+        return f'href="{href}"{space}class="{classes}"'
+    return nav_link_regex.sub(add_active, html)
+
+
+class IncludeComponent(Rule):
+    def __init__(self, placeholder, component, pages=None):
+        super().__init__(f'include:{component}', pages)
+        self.placeholder = placeholder
+        self.component = component
+        self.html = None
+        # Matches the empty placeholder as well as a previously expanded one
+        self.regex = re.compile(
+            r'<div id="' + re.escape(placeholder) + r'"[^>]*>'
+            r'(?:\s*<!-- include:' + re.escape(component) + r' -->.*?'
+            r'<!-- /include:' + re.escape(component) + r' -->\s*)?</div>',
+            re.DOTALL)
+
+    def prepare(self, root):
+        self.html = read_component(root, self.component)
+
+    def inputs(self):
+        return [self.component]
+
+    def apply(self, content, page):
+        block = (f'<div id="{self.placeholder}" data-prerendered>\n'
+                 f'<!-- include:{self.component} -->\n'
+                 f'{mark_active_links(self.html, page.name)}\n'
+                 f'<!-- /include:{self.component} -->\n'
+                 f'</div>')
+        return self.regex.sub(lambda m: block, content, count=1)
+
+    def describe(self):
+        return ['IncludeComponent', self.pages, self.placeholder, self.component, self.html]
+
+
+def js_template_literal(text):
+    return text.replace('\\', '\\\\').replace('`', '\\`').replace('${', '\\${')
+
+
+class LoaderFallback(Rule):
+    def __init__(self, constant, component):
+        super().__init__(f'fallback:{constant}')
+        self.constant = constant
+        self.component = component
+        self.html = None
+        self.regex = re.compile(r'(const ' + constant + r' = `)(?:[^`\\]|\\.)*(`;)', re.DOTALL)
+
+    def prepare(self, root):
+        self.html = js_template_literal(read_component(root, self.component))
+
+    def inputs(self):
+        return [self.component]
+
+    def apply(self, content, page):
+        if not self.regex.search(content):
+            page.warn(f"{self.constant} not found")
+            return content
+        return self.regex.sub(lambda m: m.group(1) + self.html + m.group(2), content, count=1)
+
+    def describe(self):
+        return ['LoaderFallback', self.constant, self.component, self.html]
+
+
+PAGES = RuleSet('build_partials',
+                [IncludeComponent(placeholder, component, pages) for placeholder, component, pages in INCLUDES])
+
+LOADER = RuleSet('build_partials_loader',
+                 [LoaderFallback(constant, component) for constant, component in LOADER_CONSTANTS],
+                 pages=['js/components-loader.js'])
+
+if __name__ == '__main__':
+    main([PAGES, LOADER], 'Pre-render the shared header/footer components into every page.')
@@ -0,0 +1,417 @@
+import argparse
+import glob
+import hashlib
+import html as html_lib
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import ROOT
+from snapshot import json_value, open_table
+
+# Static product pages and sitemap.
+# product.html is a shell: a visit loads every script, asks Supabase for the
+# product through js/supabase-adapter.js and only then paints it. This
+# pre-renders one page per product of a snapshot of the products table (see
+# snapshot.py), from product.html as it is on disk (run it after the
+# rewrite scripts), into
+#
+#   products/<shard>/<id>.html   <shard>: two hex digits of the SHA-1 of the
+#                                id, so no directory holds more than a few
+#                                hundred pages at 100k products
+#
+# Each page has a <base href="../../"> so the links, scripts and images of
+# the template resolve as from the root, its id, snapshot time and row hash
+# on <main>, and the name, images, price, badge, rating and description
+# already filled in; the page script refreshes them and loads the reviews as
+# on product.html?id=..., which is left as it was for the links of the site.
+#
+# Rows are streamed and rendered in batches by --jobs processes, with a
+# bounded number of batches in flight: only the id and hash of each row
+# stay in memory, never the table. .product-pages.json keeps the hash of
+# every row rendered (and of the template): a rerun only renders the
+# products that changed, and removes the pages of the products that are gone.
+#
+# sitemap.xml is a sitemap index pointing to sitemaps/pages-1.xml (the public
+# pages of the site) and sitemaps/products-<n>.xml (URLS_PER_SITEMAP product
+# pages each, oldest first so a chunk only changes when its products do).
+# Sitemaps need absolute URLs, hence --base-url.
+#
+#   python scripts/build_product_pages.py --snapshot products.json --base-url https://newket.example
+#   python scripts/build_product_pages.py --snapshot postgresql://localhost/newket --base-url ... --jobs 8
+
+PRODUCT_PAGE = 'product.html'
+PRODUCTS_DIR = 'products'
+MANIFEST_NAME = '.product-pages.json'
+SITEMAP_NAME = 'sitemap.xml'
+SITEMAPS_DIR = 'sitemaps'
+# Sitemaps may list 50,000 URLs
+URLS_PER_SITEMAP = 50000
+# Products per task sent to a worker
+BATCH_SIZE = 200
+PRODUCT_FIELDS = ('id', 'name', 'category', 'price', 'old_price', 'image', 'rating', 'reviews',
+                  'is_new', 'is_promo', 'stock', 'supplier_email', 'description', 'created_at')
+# Public pages listed in sitemaps/pages.xml besides the product pages
+SITE_PAGES = ['index.html', 'catalog.html', 'shops.html', 'shops-*.html', 'forum.html',
+              'about.html', 'privacy.html', 'terms.html']
+
+# Defaults of loadProduct() in product.html
+DEFAULT_RATING = 4.5
+DEFAULT_DESCRIPTION = 'Découvrez ce produit exceptionnel de notre collection.'
+DEFAULT_FEATURES = ['Qualité Premium', 'Garantie NewKet', 'Satisfaction client']
+PLACEHOLDER_IMAGE = 'https://via.placeholder.com/600'
+# CDF per USD, as in loadProduct()
+USD_RATE = 2500
+
+feature_template = '''
+                <li class="flex items-center gap-2 text-sm text-gray-700">
+                    <iconify-icon icon="solar:check-circle-bold" width="18" class="text-green-500"></iconify-icon>
+                    {feature}
+                </li>
+            '''
+thumb_template = '''<div class="cursor-pointer border-2 {border} rounded-xl p-2 bg-gray-50 hover:border-gray-900 transition-all aspect-square flex items-center justify-center overflow-hidden h-16 sm:h-20"><img src="{src}" class="w-full h-full object-contain mix-blend-multiply" alt="" onerror="this.src='https://via.placeholder.com/100'"></div>'''
+
+
+def shard(product_id):
+    return hashlib.sha1(str(product_id).encode('utf-8')).hexdigest()[:2]
+
+
+def page_name(product_id):
+    # Ids are free text: anything but letters, digits and '-' is escaped
+    return ''.join(c if c.isascii() and (c.isalnum() or c == '-') else ''.join(f'_{b:02x}' for b in c.encode('utf-8'))
+                   for c in str(product_id))
+
+
+def page_path(product_id):
+    return f'{PRODUCTS_DIR}/{shard(product_id)}/{page_name(product_id)}.html'
+
+
+def row_hash(product):
+    text = json.dumps(product, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:16]
+
+
+def format_cdf(amount):
+    # Intl.NumberFormat('fr-CD', {currency: 'CDF'}) as CurrencyManager shows it
+    return f'{round(amount):,}'.replace(',', ' ') + ' FC'
+
+
+def number(value):
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def product_images(product):
+    return [src.strip() for src in (product['image'] or '').split(',') if src.strip()]
+
+
+def structured_data(product, images, url):
+    data = {
+        '@context': 'https://schema.org',
+        '@type': 'Product',
+        'name': product['name'] or '',
+        'image': images,
+        'description': product['description'] or DEFAULT_DESCRIPTION,
+        'category': product['category'] or '',
+        'sku': str(product['id']),
+        'offers': {
+            '@type': 'Offer',
+            'price': product['price'] or 0,
+            'priceCurrency': 'CDF',
+            'availability': 'https://schema.org/' + ('InStock' if (product['stock'] or 0) > 0 else 'OutOfStock'),
+            'url': url,
+        },
+    }
+    if product['reviews']:
+        data['aggregateRating'] = {'@type': 'AggregateRating', 'ratingValue': product['rating'] or DEFAULT_RATING,
+                                   'reviewCount': product['reviews']}
+    # No '</script>' can end the block early
+    return json.dumps(data, ensure_ascii=False).replace('</', '<\\/')
+
+
+class ProductTemplate:
+    # product.html parsed once; every page is a set of edits on it
+    def __init__(self, text):
+        self.index = HtmlIndex(text)
+        index = self.index
+        self.head = index.first('head')
+        self.title = index.first('title')
+        self.main = index.first('main')
+        if self.head is None or self.main is None or index.get('product-name') is None:
+            raise SystemExit(f"{PRODUCT_PAGE} has no <head>, <main> or #product-name to render into")
+        self.description = index.first('meta', attrs={'name': 'description'})
+        self.canonical = index.first('link', attrs={'rel': 'canonical'})
+        self.by_id = {element_id: index.get(element_id) for element_id in (
+            'breadcrumb-curr', 'main-product-img', 'product-badge', 'thumbnail-gallery',
+            'product-category-tag', 'product-rating-val', 'product-reviews-count', 'product-name',
+            'product-price', 'product-old-price', 'product-description', 'product-features-list',
+            'sticky-product-img', 'sticky-product-name', 'sticky-product-price')}
+
+    def render(self, product, snapshot, base_url):
+        escape = html_lib.escape
+        splicer = Splicer(self.index)
+        element = self.by_id
+        relpath = page_path(product['id'])
+        url = f'{base_url}/{quote(relpath)}'
+        name = product['name'] or ''
+        description = product['description'] or DEFAULT_DESCRIPTION
+        images = product_images(product)
+        price = product['price'] or 0
+
+        head = (f'\n    <base href="../../">'
+                f'\n    <script type="application/ld+json">{structured_data(product, images, url)}</script>')
+        if self.description is None:
+            head += f'\n    <meta name="description" content="{escape(description[:300])}">'
+        else:
+            splicer.set_attr(self.description, 'content', escape(description[:300]))
+        if self.canonical is None:
+            head += f'\n    <link rel="canonical" href="{escape(url)}">'
+        else:
+            splicer.set_attr(self.canonical, 'href', escape(url))
+        splicer.insert_after_start_tag(self.head, head)
+        if self.title is not None:
+            splicer.replace_inner(self.title, escape(f'{name} — NewKet'))
+
+        splicer.set_attr(self.main, 'data-product-id', escape(str(product['id'])))
+        splicer.set_attr(self.main, 'data-snapshot', escape(snapshot))
+        splicer.set_attr(self.main, 'data-rev', row_hash(product))
+
+        def text(element_id, value):
+            if element[element_id] is not None:
+                splicer.replace_inner(element[element_id], escape(value))
+
+        def show(element_id, hidden):
+            if element[element_id] is not None:
+                classes = [c for c in element[element_id].classes if c != 'hidden']
+                if hidden:
+                    classes.append('hidden')
+                splicer.set_attr(element[element_id], 'class', ' '.join(classes))
+
+        for element_id in ('breadcrumb-curr', 'product-name', 'sticky-product-name'):
+            text(element_id, name)
+        text('product-category-tag', product['category'] or '')
+        text('product-rating-val', number(product['rating'] or DEFAULT_RATING))
+        text('product-reviews-count', f"({product['reviews'] or 0} avis)")
+        text('product-description', description)
+
+        for element_id in ('main-product-img', 'sticky-product-img'):
+            if element[element_id] is not None:
+                splicer.set_attr(element[element_id], 'src', escape(images[0] if images else PLACEHOLDER_IMAGE))
+        if element['main-product-img'] is not None:
+            splicer.set_attr(element['main-product-img'], 'alt', escape(name))
+        if element['thumbnail-gallery'] is not None:
+            thumbs = ''.join(thumb_template.format(border='border-gray-900' if i == 0 else 'border-gray-100',
+                                                   src=escape(src))
+                             for i, src in enumerate(images))
+            splicer.replace_inner(element['thumbnail-gallery'], thumbs)
+
+        for element_id in ('product-price', 'sticky-product-price'):
+            if element[element_id] is not None:
+                splicer.replace_inner(element[element_id], format_cdf(price))
+                splicer.set_attr(element[element_id], 'data-price-cdf', number(price))
+                splicer.set_attr(element[element_id], 'data-price-usd', str(round(price / USD_RATE)))
+        old_price = product['old_price']
+        if element['product-old-price'] is not None:
+            if old_price:
+                splicer.replace_inner(element['product-old-price'], format_cdf(old_price))
+                splicer.set_attr(element['product-old-price'], 'data-price-cdf', number(old_price))
+            show('product-old-price', not old_price)
+
+        badge = 'Nouveau' if product['is_new'] else 'Promo' if product['is_promo'] else ''
+        text('product-badge', badge)
+        show('product-badge', not badge)
+
+        if element['product-features-list'] is not None:
+            splicer.replace_inner(element['product-features-list'],
+                                  ''.join(feature_template.format(feature=escape(f)) for f in DEFAULT_FEATURES))
+        return splicer.apply()
+
+
+# Worker processes parse the template once, through the pool initializer
+_worker = {}
+
+
+def _init_worker(root, template, snapshot, base_url):
+    _worker.update(root=root, template=ProductTemplate(template), snapshot=snapshot, base_url=base_url)
+
+
+def render_batch(products):
+    root = _worker['root']
+    for product in products:
+        path = os.path.join(root, page_path(product['id']))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(_worker['template'].render(product, _worker['snapshot'], _worker['base_url']))
+    return len(products)
+
+
+class SitemapWriter:
+    # Writes URLs to numbered sitemap files, `limit` URLs per file
+    def __init__(self, root, prefix, base_url, limit=URLS_PER_SITEMAP):
+        self.root = root
+        self.prefix = prefix
+        self.base_url = base_url
+        self.limit = limit
+        self.files = []
+        self.file = None
+        self.count = 0
+
+    def add(self, relpath, lastmod=None):
+        if self.file is None or self.count == self.limit:
+            self.close()
+            filename = f'{SITEMAPS_DIR}/{self.prefix}-{len(self.files) + 1}.xml'
+            self.files.append(filename)
+            self.file = open(os.path.join(self.root, filename), 'w', encoding='utf-8')
+            self.file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+            self.count = 0
+        entry = f'<url><loc>{html_lib.escape(self.base_url + "/" + quote(relpath))}</loc>'
+        if lastmod:
+            entry += f'<lastmod>{lastmod}</lastmod>'
+        self.file.write(entry + '</url>\n')
+        self.count += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.write('</urlset>\n')
+            self.file.close()
+            self.file = None
+        return self.files
+
+
+def write_sitemap_index(root, base_url, files, lastmod):
+    entries = ''.join(f'  <sitemap><loc>{html_lib.escape(base_url + "/" + filename)}</loc>'
+                      f'<lastmod>{lastmod}</lastmod></sitemap>\n' for filename in files)
+    with open(os.path.join(root, SITEMAP_NAME), 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+                f'{entries}</sitemapindex>\n')
+
+
+def site_pages(root):
+    pages = []
+    for pattern in SITE_PAGES:
+        pages.extend(sorted(os.path.relpath(path, root).replace(os.sep, '/')
+                            for path in glob.glob(os.path.join(root, pattern))))
+    return pages
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(root, manifest):
+    path = os.path.join(root, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+
+def changed_batches(root, rows, previous, products, today, sitemap, force):
+    # Batches of the products to render; records every product seen in
+    # `products` (id -> [row hash, lastmod]) and in the sitemap
+    batch = []
+    for product in rows:
+        product_id = str(product['id'])
+        digest = row_hash(product)
+        entry = previous.get(product_id)
+        if force or entry is None or entry[0] != digest or \
+                not os.path.exists(os.path.join(root, page_path(product_id))):
+            if entry is None or entry[0] != digest:
+                entry = [digest, today]
+            batch.append(product)
+            if len(batch) == BATCH_SIZE:
+                yield batch
+                batch = []
+        products[product_id] = entry
+        sitemap.add(page_path(product_id), entry[1])
+    if batch:
+        yield batch
+
+
+def build(root, source, base_url, jobs=1, force=False):
+    base_url = base_url.rstrip('/')
+    with open(os.path.join(root, PRODUCT_PAGE), 'r', encoding='utf-8') as f:
+        template = f.read()
+    count, rows, snapshot = open_table(source, 'products', PRODUCT_FIELDS, order_by=('created_at', False))
+    snapshot = json_value(snapshot)
+    today = datetime.now(timezone.utc).date().isoformat()
+
+    manifest = load_manifest(root)
+    # Pages also depend on the template and on where they are published
+    template_key = [file_digest(os.path.join(root, PRODUCT_PAGE)), base_url]
+    if manifest.get('template') != template_key:
+        force = True
+    previous = manifest.get('products', {})
+    products = {}
+
+    os.makedirs(os.path.join(root, SITEMAPS_DIR), exist_ok=True)
+    sitemap = SitemapWriter(root, 'products', base_url)
+    batches = changed_batches(root, rows, previous, products, today, sitemap, force)
+    rendered = 0
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        _init_worker(root, template, snapshot, base_url)
+        for batch in batches:
+            rendered += render_batch(batch)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(root, template, snapshot, base_url)) as executor:
+            # A few batches per worker in flight: rows are read as fast as
+            # the pages are written, not ahead of them
+            pending = set()
+            for batch in batches:
+                pending.add(executor.submit(render_batch, batch))
+                if len(pending) >= jobs * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    rendered += sum(future.result() for future in done)
+            rendered += sum(future.result() for future in pending)
+    product_files = sitemap.close()
+
+    # Pages of the products that are gone
+    removed = 0
+    for product_id in previous.keys() - products.keys():
+        path = os.path.join(root, page_path(product_id))
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+
+    pages = SitemapWriter(root, 'pages', base_url)
+    for relpath in site_pages(root):
+        pages.add(relpath)
+    files = pages.close() + product_files
+    for path in glob.glob(os.path.join(root, SITEMAPS_DIR, '*.xml')):
+        if f'{SITEMAPS_DIR}/{os.path.basename(path)}' not in files:
+            os.remove(path)
+    write_sitemap_index(root, base_url, files, today)
+
+    save_manifest(root, {'template': template_key, 'products': products})
+    print(f"{count} product(s): {rendered} page(s) rendered, {len(products) - rendered} up to date, "
+          f"{removed} removed; {len(files)} sitemap(s), snapshot of {snapshot}.")
+    return rendered, removed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pre-render the product pages of a snapshot and write the sitemap.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--snapshot', required=True, metavar='SOURCE',
+                        help='products of a JSON export, a SQLite file or a postgresql:// URL')
+    parser.add_argument('--base-url', required=True, metavar='URL',
+                        help='address the site is published at, for the sitemaps and canonical links')
+    parser.add_argument('--jobs', '-j', type=int, default=0, metavar='N',
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='render every product, changed or not')
+    args = parser.parse_args()
+
+    build(args.root, args.snapshot, args.base_url, args.jobs, args.force)
@@ -0,0 +1,385 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+from rewrite_engine import ROOT
+from snapshot import json_value, open_table
+
+# Precomputed order statistics for the admin pages.
+# admin/dashboard.html, profits.html and rapports.html used to aggregate
+# every order they had loaded in the browser (OrderManager.getAdvancedStats,
+# the clientsMap of the clients export), so their cost grew with the orders
+# table. This job reads the orders (items included) from a snapshot (see
+# snapshot.py) and keeps their aggregates in .rollups.db, a SQLite file of
+# small tables:
+#
+#   daily_<dimension>, weekly_<dimension>   one row per day (or per week,
+#                                           from its Monday) and per key
+#
+# for the dimensions of DIMENSIONS: totals per status, customers, products
+# (from the items) and vendors (the supplier_email of the items, or of the
+# product in the products table). Runs are incremental: the highest
+# created_at seen is kept as a watermark and the next run only reads the
+# orders created since LOOKBACK_DAYS before it (from a Monday), after
+# dropping the rows of those days and weeks, so status changes and late
+# inserts of the last days are counted again. Orders created earlier than
+# that and changed since are only picked up by --rebuild.
+#
+# The reports hold customer names, emails and phone numbers (and supplier
+# emails), so they are never written to the published site. With --publish,
+# they go to two tables of the Supabase database that only the admins may
+# read (see backup/schema.sql), where js/reports.js loads them:
+#
+#   report_stats       the 'stats' row: the figures of getAdvancedStats() for
+#                      each timeframe (day, week, month, year, all) up to the
+#                      day of the run
+#   report_customers   every customer with their order count and total
+#
+# Each run also writes the stats to admin/reports/stats.json (ignored by git
+# and left out of dist/) to check them locally.
+#
+# Days are UTC days. Run it daily (after the backup of the database, for
+# instance): the pages load a few kilobytes whatever the number of orders,
+# and fall back on the orders for the day and week when the stats are not
+# from today.
+#
+#   python scripts/build_rollups.py --snapshot local.db
+#   python scripts/build_rollups.py --snapshot postgresql://localhost/newket --lookback 14 \
+#       --publish postgresql://postgres@db.<project>.supabase.co/postgres
+
+STATE_NAME = '.rollups.db'
+REPORTS_DIR = os.path.join('admin', 'reports')
+STATS_NAME = 'stats.json'
+# Days before the watermark read again on each run
+LOOKBACK_DAYS = 7
+# Orders aggregated in memory before they are added to the tables
+FLUSH_ORDERS = 5000
+TOP_PRODUCTS = 5
+ORDER_FIELDS = ('id', 'status', 'total', 'customer_name', 'customer_email', 'phone_number', 'items', 'created_at')
+PRODUCT_FIELDS = ('id', 'category', 'supplier_email')
+PERIODS = ('daily', 'weekly')
+# dimension -> (key columns, summed columns, columns keeping their latest value)
+DIMENSIONS = {
+    'totals': (('status',), ('orders', 'revenue', 'items'), ()),
+    'customers': (('email',), ('orders', 'spent'), ('name', 'phone')),
+    'products': (('product_id',), ('quantity', 'revenue'), ('name', 'category', 'image')),
+    'vendors': (('vendor',), ('orders', 'sales', 'quantity'), ()),
+}
+# Timeframes of getAdvancedStats(): days counted back from the day of the run
+# (None: every order, from the weekly tables)
+TIMEFRAMES = {'day': 1, 'week': 7, 'month': 30, 'year': 365, 'all': None}
+# Raised when what the rows hold changes, so that the rollups of earlier
+# runs are rebuilt (2: no 'inconnu' customer for the orders without email)
+LAYOUT_VERSION = 2
+UNKNOWN_CATEGORY = 'Autre'
+
+# Customers files that earlier runs wrote next to stats.json
+report_file_regex = re.compile(r'customers\.\d+\.[0-9a-f]{8}\.json')
+CUSTOMER_FIELDS = ('name', 'email', 'phone', 'orders', 'spent', 'first_week', 'last_week')
+
+
+def table_name(period, dimension):
+    return f'{period}_{dimension}'
+
+
+def create_tables(connection):
+    # True if the tables were (re)created empty: the rollups of another
+    # DIMENSIONS or LAYOUT_VERSION are dropped
+    connection.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+    layout = json.dumps([LAYOUT_VERSION, DIMENSIONS])
+    fresh = get_state(connection, 'layout') != layout
+    for period in PERIODS:
+        for dimension, (keys, sums, kept) in DIMENSIONS.items():
+            if fresh:
+                connection.execute(f"DROP TABLE IF EXISTS {table_name(period, dimension)}")
+            columns = ['period TEXT NOT NULL'] + [f'{key} TEXT NOT NULL' for key in keys] + \
+                [f'{column} REAL NOT NULL DEFAULT 0' for column in sums] + [f'{column} TEXT' for column in kept]
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {table_name(period, dimension)} "
+                               f"({', '.join(columns)}, PRIMARY KEY (period, {', '.join(keys)}))")
+    set_state(connection, 'layout', layout)
+    return fresh
+
+
+def get_state(connection, key):
+    row = connection.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def set_state(connection, key, value):
+    connection.execute("INSERT INTO state (key, value) VALUES (?, ?) "
+                       "ON CONFLICT (key) DO UPDATE SET value = excluded.value", (key, value))
+
+
+def parse_time(value):
+    # UTC datetime of a timestamp as snapshot rows give it, or None
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc)
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def number(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def order_items(order):
+    items = order['items']
+    if isinstance(items, str):
+        try:
+            items = json.loads(items)
+        except ValueError:
+            items = []
+    return [item for item in items or [] if isinstance(item, dict)]
+
+
+class Accumulator:
+    # Aggregates of the orders read since the last flush, added to the
+    # tables by flush(): orders may come in any order
+    def __init__(self, connection, catalog):
+        self.connection = connection
+        # product id -> (category, supplier_email)
+        self.catalog = catalog
+        self.buckets = {}
+        self.pending = 0
+
+    def add(self, dimension, periods, key, sums, kept=()):
+        for period, value in periods:
+            bucket = self.buckets.setdefault((period, dimension), {})
+            entry = bucket.get((value,) + key)
+            if entry is None:
+                bucket[(value,) + key] = [*sums, *kept]
+            else:
+                for i, amount in enumerate(sums):
+                    entry[i] += amount
+                entry[len(sums):] = kept
+
+    def add_order(self, order, day):
+        periods = (('daily', day.isoformat()), ('weekly', week_start(day).isoformat()))
+        items = order_items(order)
+        total = number(order['total'])
+        quantities = sum(number(item.get('quantity') or 1) for item in items)
+        self.add('totals', periods, (order['status'] or '',), (1, total, quantities))
+        if order['customer_email']:
+            # Like getAdvancedStats(), orders without an email count for no
+            # customer
+            self.add('customers', periods, (order['customer_email'],), (1, total),
+                     (order['customer_name'] or 'Client', order['phone_number'] or ''))
+        vendors = {}
+        for item in items:
+            product_id = str(item.get('id', ''))
+            category, supplier = self.catalog.get(product_id, (None, None))
+            quantity = number(item.get('quantity') or 1)
+            amount = number(item.get('price')) * quantity
+            self.add('products', periods, (product_id,), (quantity, amount),
+                     (item.get('name') or '', item.get('category') or category or UNKNOWN_CATEGORY,
+                      (item.get('image') or '').split(',')[0].strip()))
+            vendor = item.get('supplier_email') or supplier
+            if vendor:
+                sales = vendors.setdefault(vendor, [0.0, 0.0])
+                sales[0] += amount
+                sales[1] += quantity
+        for vendor, (sales, quantity) in vendors.items():
+            self.add('vendors', periods, (vendor,), (1, sales, quantity))
+        self.pending += 1
+        if self.pending >= FLUSH_ORDERS:
+            self.flush()
+
+    def flush(self):
+        for (period, dimension), bucket in self.buckets.items():
+            keys, sums, kept = DIMENSIONS[dimension]
+            columns = ('period',) + keys + sums + kept
+            updates = [f'{column} = {column} + excluded.{column}' for column in sums] + \
+                [f'{column} = excluded.{column}' for column in kept]
+            self.connection.executemany(
+                f"INSERT INTO {table_name(period, dimension)} ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT (period, {', '.join(keys)}) DO UPDATE SET {', '.join(updates)}",
+                [key + tuple(values) for key, values in bucket.items()])
+        self.buckets = {}
+        self.pending = 0
+
+
+def load_catalog(source):
+    # The products table is optional in a JSON export of the orders alone
+    try:
+        _, rows, _ = open_table(source, 'products', PRODUCT_FIELDS)
+        return {str(row['id']): (row['category'], row['supplier_email']) for row in rows}
+    except sqlite3.Error:
+        return {}
+
+
+def update(connection, source, lookback=LOOKBACK_DAYS, rebuild=False):
+    # Adds the orders created since the watermark (minus the lookback);
+    # returns (orders read, orders without created_at, first day read again)
+    if create_tables(connection):
+        rebuild = True
+    watermark = None if rebuild else parse_time(get_state(connection, 'watermark'))
+    cutoff = None
+    if watermark is not None:
+        cutoff = week_start(watermark.date() - timedelta(days=lookback))
+    for period in PERIODS:
+        for dimension in DIMENSIONS:
+            if cutoff is None:
+                connection.execute(f"DELETE FROM {table_name(period, dimension)}")
+            else:
+                connection.execute(f"DELETE FROM {table_name(period, dimension)} WHERE period >= ?",
+                                   (cutoff.isoformat(),))
+
+    accumulator = Accumulator(connection, load_catalog(source))
+    # created_at is compared as stored: a timestamp with an offset behind UTC
+    # may fall on the cutoff day in UTC with an earlier date, so the orders
+    # of the day before are read too (and skipped below if they are earlier)
+    since = ('created_at', (cutoff - timedelta(days=1)).isoformat()) if cutoff else None
+    _, rows, _ = open_table(source, 'orders', ORDER_FIELDS, order_by=('created_at', False), since=since)
+    read = undated = 0
+    for order in rows:
+        moment = parse_time(order['created_at'])
+        if moment is None:
+            undated += 1
+            continue
+        if cutoff is not None and moment.date() < cutoff:
+            # Read for its date, before the cutoff in UTC
+            continue
+        accumulator.add_order(order, moment.date())
+        if watermark is None or moment > watermark:
+            watermark = moment
+        read += 1
+    accumulator.flush()
+    if watermark is not None:
+        set_state(connection, 'watermark', json_value(watermark))
+    connection.commit()
+    return read, undated, cutoff
+
+
+def window(connection, first_day):
+    # getAdvancedStats() figures of the orders from first_day (None: all)
+    period, where, params = ('weekly', '', ()) if first_day is None else \
+        ('daily', 'WHERE period >= ?', (first_day.isoformat(),))
+
+    def query(dimension, columns, group=None):
+        sql = f"SELECT {columns} FROM {table_name(period, dimension)} {where}"
+        return connection.execute(sql + (f" GROUP BY {group}" if group else ''), params).fetchall()
+
+    status = {row[0]: [int(row[1]), row[2]] for row in
+              query('totals', 'status, SUM(orders), SUM(revenue)', 'status')}
+    orders, revenue, items = query('totals', 'SUM(orders), SUM(revenue), SUM(items)')[0]
+    customers = query('customers', 'COUNT(DISTINCT email)')[0][0]
+    products = query('products', 'product_id, SUM(quantity), SUM(revenue), name, category, image, MAX(period)',
+                     'product_id')
+    categories = {}
+    for _, _, amount, _, category, _, _ in products:
+        categories[category] = categories.get(category, 0) + amount
+    top = sorted(products, key=lambda row: (-row[1], row[0]))[:TOP_PRODUCTS]
+    vendors = {row[0]: [int(row[1]), row[2]] for row in
+               query('vendors', 'vendor, SUM(orders), SUM(sales)', 'vendor')}
+    return {
+        'from': first_day.isoformat() if first_day else None,
+        'orders': int(orders or 0),
+        'revenue': revenue or 0,
+        'items': int(items or 0),
+        'customers': customers,
+        'status': status,
+        'categories': categories,
+        'products': {row[0]: int(row[1]) for row in products},
+        'top_products': [[row[0], row[3], row[4], row[5], int(row[1])] for row in top],
+        'vendors': vendors,
+    }
+
+
+def customer_rows(connection):
+    # Rows of CUSTOMER_FIELDS, biggest spenders first. SQLite takes name and
+    # phone from the row of MAX(period): the latest ones
+    rows = connection.execute(
+        "SELECT name, email, phone, SUM(orders), SUM(spent), MIN(period), MAX(period) "
+        "FROM weekly_customers GROUP BY email ORDER BY SUM(spent) DESC, email")
+    for name, email, phone, orders, spent, first, last in rows:
+        yield name, email, phone, int(orders), spent, first, last
+
+
+def export(connection, root, today):
+    out_dir = os.path.join(root, REPORTS_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    count = connection.execute("SELECT COUNT(DISTINCT email) FROM weekly_customers").fetchone()[0]
+    stats = {
+        'watermark': get_state(connection, 'watermark'),
+        'day': today.isoformat(),
+        'timeframes': {name: window(connection, None if days is None else today - timedelta(days=days - 1))
+                       for name, days in TIMEFRAMES.items()},
+        'customers': {'count': count},
+    }
+    with open(os.path.join(out_dir, STATS_NAME), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, separators=(',', ':'))
+
+    for filename in os.listdir(out_dir):
+        if report_file_regex.fullmatch(filename):
+            os.remove(os.path.join(out_dir, filename))
+    return stats
+
+
+def publish(connection, dsn, stats):
+    # Replaces the reports of the Supabase database in one transaction:
+    # the admin pages see either the previous run or this one
+    if psycopg is None:
+        raise SystemExit("Publishing to Postgres needs psycopg: pip install psycopg")
+    with psycopg.connect(dsn) as target:
+        with target.cursor() as cursor:
+            cursor.execute("DELETE FROM public.report_customers")
+            with cursor.copy(f"COPY public.report_customers ({', '.join(CUSTOMER_FIELDS)}) FROM STDIN") as copy:
+                for row in customer_rows(connection):
+                    copy.write_row(row)
+            cursor.execute("INSERT INTO public.report_stats (name, body, updated_at) VALUES ('stats', %s, NOW()) "
+                           "ON CONFLICT (name) DO UPDATE SET body = excluded.body, updated_at = excluded.updated_at",
+                           (json.dumps(stats, ensure_ascii=False),))
+
+
+def build(root, source, lookback=LOOKBACK_DAYS, rebuild=False, today=None, publish_to=None):
+    connection = sqlite3.connect(os.path.join(root, STATE_NAME))
+    try:
+        read, undated, cutoff = update(connection, source, lookback, rebuild)
+        stats = export(connection, root, today or datetime.now(timezone.utc).date())
+        if publish_to:
+            publish(connection, publish_to, stats)
+    finally:
+        connection.close()
+    since = f"since {cutoff.isoformat()}" if cutoff else "from scratch"
+    print(f"{read} order(s) rolled up {since}" + (f", {undated} without created_at skipped" if undated else '')
+          + f"; {stats['timeframes']['all']['orders']} in total, {stats['customers']['count']} customer(s), "
+          f"watermark {stats['watermark']}.")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Update the order rollups and the statistics of the admin pages.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--snapshot', required=True, metavar='SOURCE',
+                        help='orders (and products) of a JSON export, a SQLite file or a postgresql:// URL')
+    parser.add_argument('--lookback', type=int, default=LOOKBACK_DAYS, metavar='DAYS',
+                        help=f'days before the watermark read again (default: {LOOKBACK_DAYS})')
+    parser.add_argument('--rebuild', action='store_true', help='drop the rollups and read every order again')
+    parser.add_argument('--today', type=date.fromisoformat, metavar='YYYY-MM-DD',
+                        help='day the timeframes end on (default: today, UTC)')
+    parser.add_argument('--publish', metavar='DSN',
+                        help='postgresql:// URL of the Supabase database to write the reports to')
+    args = parser.parse_args()
+
+    build(args.root, args.snapshot, args.lookback, args.rebuild, args.today, args.publish)
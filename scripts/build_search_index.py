@@ -0,0 +1,153 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+from rewrite_engine import ROOT
+from snapshot import json_value, open_table
+
+# Product search index for the search box (js/search.js).
+# The suggestions used to filter every loaded product on each keystroke,
+# lowercasing each name and category again every time. This builds a static
+# index from a snapshot of the products table (see snapshot.py) that the
+# search box downloads lazily, piece by piece:
+#
+#   search-index/meta.json          what the other files are called
+#   search-index/terms.<k>.<h>.json the words starting with the two letters <k>,
+#                                   sorted, each with the products using it
+#   search-index/docs.<n>.<h>.json  the fields the suggestions show, DOCS_PER_CHUNK
+#                                   products per file
+#
+# Words are the name and category folded to lowercase without accents
+# (é -> e, œ -> oe), the same fold js/search.js applies to the query. Every
+# query word must be the start of a word of the product. Products are
+# numbered newest first and posting lists are sorted (and delta-encoded),
+# so the first matches found are the newest and a search stops after the
+# few suggestions it shows. File names carry a content hash: everything but
+# meta.json can be cached forever.
+#
+#   python scripts/build_search_index.py --snapshot products.json
+
+INDEX_DIR = 'search-index'
+META_NAME = 'meta.json'
+DOCS_PER_CHUNK = 1000
+# Length of the word prefix that picks a terms file
+SHARD_PREFIX = 2
+PRODUCT_FIELDS = ('id', 'name', 'category', 'price', 'image', 'created_at')
+
+LIGATURES = {'œ': 'oe', 'æ': 'ae', 'ß': 'ss'}
+
+word_regex = re.compile(r'[^\W_]+')
+index_file_regex = re.compile(r'(?:terms|docs)\..+\.[0-9a-f]{8}\.json')
+
+
+def fold(text):
+    text = unicodedata.normalize('NFD', (text or '').lower())
+    text = ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+    for ligature, replacement in LIGATURES.items():
+        text = text.replace(ligature, replacement)
+    return text
+
+
+def words(text):
+    return word_regex.findall(fold(text))
+
+
+def shard_key(word):
+    return word[:SHARD_PREFIX]
+
+
+def safe_name(key):
+    return ''.join(c if c.isascii() and c.isalnum() else f'_{ord(c):x}' for c in key)
+
+
+def delta_encode(ordinals):
+    previous = 0
+    deltas = []
+    for ordinal in ordinals:
+        deltas.append(ordinal - previous)
+        previous = ordinal
+    return deltas
+
+
+def write_hashed(out_dir, prefix, data):
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()[:8]
+    filename = f'{prefix}.{digest}.json'
+    path = os.path.join(out_dir, filename)
+    if not os.path.exists(path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+    return filename, len(text.encode('utf-8'))
+
+
+def doc_entry(product):
+    image = (product['image'] or '').split(',')[0].strip()
+    return [product['id'], product['name'] or '', product['category'] or '', product['price'], image]
+
+
+def build_index(root, source):
+    out_dir = os.path.join(root, INDEX_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    count, rows, snapshot = open_table(source, 'products', PRODUCT_FIELDS, order_by=('created_at', True))
+
+    postings = {}
+    docs = []
+    chunks = []
+    total_bytes = 0
+    for ordinal, product in enumerate(rows):
+        for word in set(words(product['name']) + words(product['category'])):
+            postings.setdefault(word, []).append(ordinal)
+        docs.append(doc_entry(product))
+        if len(docs) == DOCS_PER_CHUNK:
+            filename, size = write_hashed(out_dir, f'docs.{len(chunks)}', docs)
+            chunks.append(filename)
+            total_bytes += size
+            docs = []
+    if docs:
+        filename, size = write_hashed(out_dir, f'docs.{len(chunks)}', docs)
+        chunks.append(filename)
+        total_bytes += size
+
+    shards = {}
+    for word in sorted(postings):
+        shards.setdefault(shard_key(word), []).append(word)
+    shard_files = {}
+    for key, terms in shards.items():
+        data = {'terms': terms, 'postings': [delta_encode(postings[term]) for term in terms]}
+        filename, size = write_hashed(out_dir, f'terms.{safe_name(key)}', data)
+        shard_files[key] = filename
+        total_bytes += size
+
+    meta = {
+        'count': count,
+        'snapshot': json_value(snapshot),
+        'shard_prefix': SHARD_PREFIX,
+        'docs_per_chunk': DOCS_PER_CHUNK,
+        'docs': chunks,
+        'shards': shard_files,
+    }
+    with open(os.path.join(out_dir, META_NAME), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+    # Files of earlier builds
+    used = set(chunks) | set(shard_files.values())
+    for filename in os.listdir(out_dir):
+        if index_file_regex.fullmatch(filename) and filename not in used:
+            os.remove(os.path.join(out_dir, filename))
+
+    print(f"{meta['count']} product(s), {len(postings)} word(s) in {len(shard_files)} terms file(s) "
+          f"and {len(chunks)} docs file(s): {total_bytes} bytes.")
+    return meta
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the static product search index used by the search box.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--snapshot', required=True, metavar='SOURCE',
+                        help='products of a JSON export, a SQLite file or a postgresql:// URL')
+    args = parser.parse_args()
+
+    build_index(args.root, args.snapshot)
@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+from urllib.parse import quote, unquote
+
+from html_index import HtmlIndex
+from page_manifest import file_hash
+from rewrite_engine import Rule, RuleSet, main
+
+# Service worker precache manifest.
+# sw.js used to precache a hand-written list under a cache name bumped by
+# hand. The list is now generated between the // <precache> markers of
+# sw.js: the pages below, every local file they link to (stylesheets,
+# scripts, icons, images) and the manifest icons, each with a revision
+# taken from its content. The cache name follows a version derived from all
+# the revisions, so sw.js changes whenever one file does, and the install
+# only downloads the entries whose revision changed (see sw.js).
+#
+# Run it after the other build steps: the hashes are those of the files on
+# disk when the rule set is prepared.
+
+# (URL, file) of the pages available offline
+PRECACHE_PAGES = [
+    ('/', 'index.html'),
+    ('/index.html', 'index.html'),
+    ('/catalog.html', 'catalog.html'),
+    ('/product.html', 'product.html'),
+    ('/cart.html', 'cart.html'),
+    ('/favorites.html', 'favorites.html'),
+    ('/shops.html', 'shops.html'),
+    ('/shop.html', 'shop.html'),
+]
+WEB_MANIFEST = 'manifest.json'
+
+LINK_RELS = {'stylesheet', 'icon', 'apple-touch-icon', 'manifest', 'preload', 'modulepreload'}
+
+block_regex = re.compile(r'(// <precache>[^\n]*\n(?://[^\n]*\n)*).*?(// </precache>)', re.DOTALL)
+
+
+def local_reference(page_dir, url):
+    # (URL path, file) of a link to a file of the site, or None
+    if not url or url.startswith(('data:', '#', '//')) or '://' in url or '${' in url:
+        return None
+    path, _, query = url.partition('?')
+    relpath = posixpath.normpath(posixpath.join(page_dir, unquote(path)))
+    if relpath.startswith('..'):
+        return None
+    return '/' + quote(relpath) + (f'?{query}' if query else ''), relpath
+
+
+def page_references(html, page_dir):
+    index = HtmlIndex(html)
+    urls = []
+    for link in index.find('link'):
+        if LINK_RELS & set(link.attrs.get('rel', '').lower().split()):
+            urls.append(link.attrs.get('href'))
+    for tag in ('script', 'img'):
+        urls.extend(element.attrs.get('src') for element in index.find(tag))
+    # The icon sprite (see build_icons.py), once per page
+    urls.extend(dict.fromkeys(use.attrs.get('href', '').split('#')[0] for use in index.find('use')))
+    return [ref for ref in (local_reference(page_dir, url) for url in urls) if ref]
+
+
+def precache_entries(root):
+    # [(url, file)] in a stable order, without duplicates
+    references = list(PRECACHE_PAGES) + [('/' + WEB_MANIFEST, WEB_MANIFEST)]
+    for url, relpath in PRECACHE_PAGES:
+        with open(os.path.join(root, relpath), 'r', encoding='utf-8') as f:
+            references.extend(page_references(f.read(), posixpath.dirname(relpath) or '.'))
+    with open(os.path.join(root, WEB_MANIFEST), 'r', encoding='utf-8') as f:
+        for icon in json.load(f).get('icons', []):
+            ref = local_reference('.', icon.get('src'))
+            if ref:
+                references.append(ref)
+
+    seen = set()
+    entries = []
+    for url, relpath in references:
+        if url not in seen:
+            seen.add(url)
+            entries.append((url, relpath))
+    return entries
+
+
+class PrecacheManifest(Rule):
+    def __init__(self, name='precache_manifest', pages=None):
+        super().__init__(name, pages)
+        self.entries = []
+        self.files = []
+        self.missing = []
+
+    def prepare(self, root):
+        self.entries = []
+        self.files = []
+        self.missing = []
+        for url, relpath in precache_entries(root):
+            path = os.path.join(root, relpath)
+            if os.path.isfile(path):
+                self.entries.append([url, file_hash(path)[:10]])
+                self.files.append(relpath)
+            else:
+                self.missing.append(relpath)
+
+    def inputs(self):
+        return self.files + self.missing
+
+    def render(self):
+        version = hashlib.sha256(json.dumps(self.entries).encode('utf-8')).hexdigest()[:10]
+        lines = [f"const PRECACHE_VERSION = '{version}';", 'const PRECACHE_ENTRIES = [']
+        lines.extend(f'    {json.dumps(entry)},' for entry in self.entries)
+        lines.append('];')
+        return '\n'.join(lines) + '\n'
+
+    def apply(self, content, page):
+        for relpath in self.missing:
+            page.warn(f"{relpath} is referenced by a precached page but does not exist")
+        if not block_regex.search(content):
+            page.warn("// <precache> block not found")
+            return content
+        block = self.render()
+        return block_regex.sub(lambda m: m.group(1) + block + m.group(2), content, count=1)
+
+    def describe(self):
+        return super().describe() + [self.entries, PRECACHE_PAGES]
+
+
+RULES = RuleSet('build_sw', [PrecacheManifest()], pages=['sw.js'])
+
+if __name__ == '__main__':
+    main([RULES], 'Regenerate the service worker precache list and cache version from the site files.')
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import posixpath
+import re
+
+from html_index import HtmlIndex, Splicer
+from js_minify import minify
+from rewrite_engine import Pipeline, Rule, RuleSet, build_parser, find_pages, run_from_args
+
+# Script bundling.
+# Pages load up to 14 local scripts one after the other. Every run of local
+# <script src="js/..."> tags that follow each other (only whitespace or
+# comments between them) is replaced by content-hashed, minified bundles in
+# js/dist/: the named bundles below wherever the run contains them, and one
+# bundle for the rest of the run, named after its files. Concatenating a run
+# keeps the scripts in the same order at the same place in the document.
+#
+# `defer` is then added to the trailing scripts of the page, but only when
+# the resulting execution order (parser-blocking scripts in document order,
+# then deferred ones) is the same as before; otherwise the bundles stay
+# blocking. A page whose order would change either way is left alone.
+#
+# js/dist/bundles.json maps each bundle to its file and sources, so pages
+# already pointing at bundles can be rebuilt after a source change.
+
+BUNDLE_DIR = 'js/dist'
+BUNDLES_NAME = 'bundles.json'
+PAGES = ['*.html', 'admin/*.html']
+
+# Named bundles, in the order the pages load their files
+BUNDLES = [
+    ('supabase', ['js/supabase-client.js', 'js/supabase-adapter.js']),
+    ('core', [
+        'js/auth.js', 'js/cart.js', 'js/favorites.js', 'js/currency.js',
+        'js/products.js', 'js/orders.js', 'js/managers.js', 'js/ui-helpers.js',
+        'js/ui.js', 'js/search.js', 'js/main.js', 'js/components-loader.js',
+    ]),
+]
+
+JS_TYPES = ('', 'text/javascript', 'application/javascript', 'module')
+
+comment_regex = re.compile(r'<!--.*?-->', re.DOTALL)
+bundle_file_regex = re.compile(r'js/dist/([\w-]+)\.[0-9a-f]+\.js')
+module_regex = re.compile(r'^(?:import|export)\b', re.MULTILINE)
+
+
+class Script:
+    # One executable <script> of a page
+    def __init__(self, element, kind, members, files=None):
+        self.element = element
+        self.kind = kind          # 'blocking', 'defer' or 'async'
+        self.members = members    # what it runs, for the order check
+        self.files = files        # local sources when it can be bundled
+
+    @property
+    def external(self):
+        return 'src' in self.element.attrs
+
+
+def scripts_of(index, page_dir, bundles):
+    scripts = []
+    for element in index.find('script'):
+        attrs = element.attrs
+        if attrs.get('type', '').lower() not in JS_TYPES or 'nomodule' in attrs:
+            continue
+        if 'async' in attrs:
+            kind = 'async'
+        elif 'defer' in attrs or attrs.get('type') == 'module':
+            kind = 'defer'
+        else:
+            kind = 'blocking'
+
+        src = attrs.get('src')
+        if src is None:
+            scripts.append(Script(element, kind, [('inline', element.start)]))
+            continue
+        path = posixpath.normpath(posixpath.join(page_dir, src.split('?')[0]))
+        match = bundle_file_regex.fullmatch(path)
+        files = None
+        if match and match.group(1) in bundles:
+            files = bundles[match.group(1)]['files']
+        elif path.startswith('js/') and path.endswith('.js') and not path.startswith(f'{BUNDLE_DIR}/'):
+            files = [path]
+        # Only plain classic tags are merged; async, modules, SRI... stay as they are
+        if files and (set(attrs) - {'src', 'defer', 'type'} or kind == 'async' or attrs.get('type') == 'module'):
+            files = None
+        scripts.append(Script(element, kind, list(files) if files else [('src', path)], files))
+    return scripts
+
+
+def adjacent(index, first, second):
+    if first.element.parent is not second.element.parent:
+        return False
+    between = index.text[first.element.end:second.element.start]
+    return not comment_regex.sub('', between).strip()
+
+
+def runs_of(index, scripts):
+    runs = []
+    previous = None
+    for script in scripts:
+        if script.files is not None:
+            if previous is not None and previous.files is not None and adjacent(index, previous, script):
+                runs[-1].append(script)
+            else:
+                runs.append([script])
+        previous = script
+    return runs
+
+
+def split(files):
+    # (bundle name, files) covering `files` in order
+    parts = []
+    rest = []
+    i = 0
+    while i < len(files):
+        for name, members in BUNDLES:
+            if files[i:i + len(members)] == members:
+                if rest:
+                    parts.append(('-'.join(posixpath.splitext(posixpath.basename(f))[0] for f in rest), rest))
+                    rest = []
+                parts.append((name, members))
+                i += len(members)
+                break
+        else:
+            rest.append(files[i])
+            i += 1
+    if rest:
+        parts.append(('-'.join(posixpath.splitext(posixpath.basename(f))[0] for f in rest), rest))
+    return parts
+
+
+def execution_order(plan):
+    # plan: (kind, members) in document order
+    blocking = [m for kind, members in plan if kind == 'blocking' for m in members]
+    deferred = [m for kind, members in plan if kind == 'defer' for m in members]
+    return blocking + deferred
+
+
+def load_bundles(root):
+    path = os.path.join(root, BUNDLE_DIR, BUNDLES_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_bundles(root):
+    previous = load_bundles(root)
+    wanted = {}
+    for relpath in find_pages(root, PAGES):
+        with open(os.path.join(root, relpath), 'r', encoding='utf-8') as f:
+            index = HtmlIndex(f.read())
+        scripts = scripts_of(index, posixpath.dirname(relpath) or '.', previous)
+        for script_run in runs_of(index, scripts):
+            files = [f for script in script_run for f in script.files]
+            for name, members in split(files):
+                wanted.setdefault(name, members)
+
+    os.makedirs(os.path.join(root, BUNDLE_DIR), exist_ok=True)
+    bundles = {}
+    for name, members in sorted(wanted.items()):
+        parts = []
+        for member in members:
+            path = os.path.join(root, member)
+            if not os.path.exists(path):
+                raise SystemExit(f"{member} is loaded by a page but does not exist")
+            with open(path, 'r', encoding='utf-8') as f:
+                source = f.read()
+            minified = minify(source)
+            # Concatenation would make the whole bundle strict, or break on modules
+            if minified.startswith(("'use strict'", '"use strict"')) or module_regex.search(minified):
+                raise SystemExit(f"Refusing to bundle {member}: it uses 'use strict' or import/export")
+            parts.append(minified)
+        # The ';' keeps a file ending without one from running into the next
+        content = '\n;\n'.join(parts).encode('utf-8')
+        filename = f'{name}.{hashlib.sha256(content).hexdigest()[:10]}.js'
+        path = os.path.join(root, BUNDLE_DIR, filename)
+        if not os.path.exists(path):
+            with open(path, 'wb') as f:
+                f.write(content)
+        for old in os.listdir(os.path.join(root, BUNDLE_DIR)):
+            if old != filename and re.fullmatch(re.escape(name) + r'\.[0-9a-f]+\.js', old):
+                os.remove(os.path.join(root, BUNDLE_DIR, old))
+        bundles[name] = {'file': filename, 'files': members}
+        source_bytes = sum(os.path.getsize(os.path.join(root, m)) for m in members)
+        print(f"{BUNDLE_DIR}/{filename}: {len(members)} file(s), {source_bytes} -> {len(content)} bytes")
+
+    with open(os.path.join(root, BUNDLE_DIR, BUNDLES_NAME), 'w', encoding='utf-8') as f:
+        json.dump(bundles, f, indent=1, sort_keys=True)
+    return bundles
+
+
+class BundleScripts(Rule):
+    def __init__(self, name='bundle_scripts', pages=None):
+        super().__init__(name, pages)
+        self.bundles = {}
+
+    def prepare(self, root):
+        self.bundles = load_bundles(root)
+
+    def inputs(self):
+        return [f'{BUNDLE_DIR}/{BUNDLES_NAME}']
+
+    def apply(self, content, page):
+        if not self.bundles:
+            return content
+        index = HtmlIndex(content)
+        page_dir = posixpath.dirname(page.relpath) or '.'
+        scripts = scripts_of(index, page_dir, self.bundles)
+
+        # Bundles replacing each run, or None when the run is kept as it is
+        replacements = {}
+        for script_run in runs_of(index, scripts):
+            parts = split([f for script in script_run for f in script.files])
+            stale = [name for name, members in parts if self.bundles.get(name, {}).get('files') != members]
+            kinds = {script.kind for script in script_run}
+            if stale:
+                page.warn(f"no up-to-date bundle for {', '.join(stale)}: run the build first")
+            elif len(kinds) == 1:
+                replacements[script_run[0]] = (script_run, parts, kinds.pop())
+
+        before = execution_order([(s.kind, s.members) for s in scripts])
+        plan = []    # (script or bundle name, kind, members)
+        replaced = set()
+        for script in scripts:
+            if script in replacements:
+                script_run, parts, kind = replacements[script]
+                replaced.update(script_run)
+                plan.extend((name, kind, members) for name, members in parts)
+            elif script not in replaced:
+                plan.append((script, script.kind, script.members))
+
+        # Defer the trailing external scripts, if that keeps the order
+        deferred = list(plan)
+        for i in range(len(deferred) - 1, -1, -1):
+            item, kind, members = deferred[i]
+            if kind == 'async':
+                continue
+            if isinstance(item, Script) and not item.external:
+                break
+            deferred[i] = (item, 'defer', members)
+        if execution_order([(k, m) for _, k, m in deferred]) == before:
+            plan = deferred
+        elif execution_order([(k, m) for _, k, m in plan]) != before:
+            page.warn("bundling would change the script execution order: left as is")
+            return content
+        else:
+            page.warn("inline or blocking scripts run after the bundles: kept without defer")
+        kinds = {id(item): kind for item, kind, members in plan if isinstance(item, Script)}
+        bundle_kinds = [kind for item, kind, members in plan if not isinstance(item, Script)]
+
+        splicer = Splicer(index)
+        for script in scripts:
+            if script in replacements:
+                script_run, parts, kind = replacements[script]
+                line_start = index.text.rfind('\n', 0, script.element.start) + 1
+                indent = index.text[line_start:script.element.start]
+                indent = indent if not indent.strip() else ''
+                tags = []
+                for name, members in parts:
+                    href = posixpath.relpath(f"{BUNDLE_DIR}/{self.bundles[name]['file']}", page_dir)
+                    defer = ' defer' if bundle_kinds.pop(0) == 'defer' else ''
+                    tags.append(f'<script src="{href}"{defer}></script>')
+                splicer.replace_siblings(script_run[0].element, script_run[-1].element, ('\n' + indent).join(tags))
+                page.hit(self.name)
+            elif script not in replaced and kinds[id(script)] == 'defer' and script.kind != 'defer':
+                splicer.set_attr(script.element, 'defer', None)
+        return splicer.apply()
+
+    def describe(self):
+        return super().describe() + [self.bundles, BUNDLES]
+
+
+RULES = RuleSet('bundle_js', [BundleScripts()], pages=PAGES)
+
+if __name__ == '__main__':
+    parser = build_parser('Bundle and minify the local scripts of every page into hashed, deferred bundles.')
+    parser.add_argument('--skip-build', action='store_true',
+                        help='only rewrite the pages from the existing bundles.json')
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        build_bundles(args.root)
+    run_from_args(Pipeline([RULES]), args)
@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+
+from rewrite_engine import ROOT
+from site_graph import ENTRY_POINTS, SiteGraph
+
+# Checks the references between the site files (see site_graph.py).
+# Renames and removals (remove_nav.py, remove_stripe_final.py...) can leave
+# links to pages that are gone, images nobody shows any more, or pages no
+# link leads to; build_sw.py would then precache missing files. This
+# parses every file once, checks every local target, and reports:
+#   - broken references: the file they point to does not exist
+#   - missing anchors: page.html#x where page.html has no id="x" (it may
+#     be created by a script, hence only a warning)
+#   - orphan files: images, stylesheets and scripts nothing refers to
+#   - unreachable pages: no chain of links from index.html leads to them
+# The exit status is 1 when a reference is broken.
+#
+#   python scripts/check_links.py
+#   python scripts/check_links.py --affected css/style.css   # pages to rebuild
+
+ORPHAN_PATTERNS = ['Images/*', 'Images/optimized/*', 'css/*.css', 'js/*.js', 'js/dist/*.js']
+
+
+def report(graph):
+    broken = graph.broken()
+    anchors = graph.missing_anchors()
+    orphans = [(relpath, os.path.getsize(os.path.join(graph.root, relpath)))
+               for relpath in graph.orphans(ORPHAN_PATTERNS)]
+    orphans.sort(key=lambda item: -item[1])
+    unreachable = graph.unreachable()
+    return {
+        'files': len(graph.files),
+        'references': sum(len(references) for references in graph.references.values()),
+        'broken': [{'source': r.source, 'line': r.line, 'url': r.url, 'target': r.target} for r in broken],
+        'missing_anchors': [{'source': r.source, 'line': r.line, 'url': r.url} for r in anchors],
+        'orphans': [{'file': relpath, 'bytes': size} for relpath, size in orphans],
+        'unreachable': unreachable,
+    }
+
+
+def print_report(result):
+    print(f"{result['files']} file(s), {result['references']} reference(s).")
+    if result['broken']:
+        print(f"\n{len(result['broken'])} broken reference(s):")
+        for item in result['broken']:
+            print(f"  {item['source']}:{item['line']}: {item['url']} ({item['target']} not found)")
+    if result['missing_anchors']:
+        print(f"\n{len(result['missing_anchors'])} anchor(s) not found in the target page:")
+        for item in result['missing_anchors']:
+            print(f"  {item['source']}:{item['line']}: {item['url']}")
+    if result['orphans']:
+        total = sum(item['bytes'] for item in result['orphans'])
+        print(f"\n{len(result['orphans'])} orphan file(s), {total} bytes:")
+        for item in result['orphans']:
+            print(f"  {item['file']} ({item['bytes']} bytes)")
+    if result['unreachable']:
+        print(f"\n{len(result['unreachable'])} page(s) not reachable from {' or '.join(ENTRY_POINTS)}:")
+        for relpath in result['unreachable']:
+            print(f"  {relpath}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check the links and file references of the site.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--jobs', '-j', type=int, default=0, metavar='N',
+                        help='parse in N worker processes (default: one per CPU)')
+    parser.add_argument('--json', metavar='FILE', help='also write the report as JSON')
+    parser.add_argument('--affected', nargs='+', metavar='FILE',
+                        help='only list the files that use FILE, directly or not')
+    args = parser.parse_args()
+
+    graph = SiteGraph.build(args.root, args.jobs or os.cpu_count() or 1)
+    if args.affected:
+        for relpath in sorted(graph.affected([path.replace(os.sep, '/') for path in args.affected])):
+            print(relpath)
+        raise SystemExit(0)
+
+    result = report(graph)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    raise SystemExit(1 if result['broken'] else 0)
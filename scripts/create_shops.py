@@ -1,10 +1,42 @@
+import argparse
+import glob
+import html as html_lib
+import json
 import os
 import re
+from datetime import datetime
+from urllib.parse import quote
 
-directory = r"c:\Users\tmaut\Downloads\THE PHOENIX\NOVA V2"
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import ROOT
+from snapshot import json_value, open_table
 
-with open(os.path.join(directory, 'index.html'), 'r', encoding='utf-8') as f:
-    html = f.read()
+# Shops directory.
+# --create builds shops.html from index.html (loading skeletons filled by
+# js/shops.js) and links it from the main pages' navigation.
+#
+# --snapshot pre-renders the directory from a data snapshot instead of
+# leaving every visit to query Supabase before showing a shop: the sellers
+# (users whose role is in SELLER_ROLES, newest first) are read from a
+# snapshot of the users table (see snapshot.py) and written as cards into
+# shops.html, shops-2.html, shops-3.html... (PAGE_SIZE per page, with a
+# pagination bar), one output page in memory at a time. The grid keeps the snapshot time and every card its fields, so
+# js/shops.js only refreshes the cards that changed and adds the sellers who
+# joined since.
+#
+#   python scripts/create_shops.py --snapshot users.json
+#   python scripts/create_shops.py --snapshot local.db
+#   python scripts/create_shops.py --snapshot postgresql://localhost/newket  (needs psycopg)
+
+SELLER_ROLES = ('vendor', 'supplier', 'fournisseur')
+SELLER_FIELDS = ('id', 'name', 'email', 'role', 'date_joined', 'avatar')
+PAGE_SIZE = 48
+SHOPS_PAGE = 'shops.html'
+# Page numbers shown on each side of the current one
+PAGINATION_WINDOW = 2
+
+MONTHS = ['janvier', 'février', 'mars', 'avril', 'mai', 'juin', 'juillet',
+          'août', 'septembre', 'octobre', 'novembre', 'décembre']
 
 main_content = '''
     <!-- Spacer for fixed header -->
@@ -14,6 +46,8 @@ main_content = '''
         <div class="mb-10 text-center sm:text-left">
             <h1 class="text-3xl sm:text-4xl font-black tracking-tight text-gray-900 mb-4">Parcourir les Boutiques</h1>
             <p class="text-gray-500 text-lg max-w-2xl mx-auto sm:mx-0">Découvrez nos vendeurs partenaires et leurs collections exclusives.</p>
+            <input type="text" id="shopSearchInput" placeholder="Trouver une boutique..."
+                class="mt-6 w-full max-w-xl py-3 px-4 bg-gray-50 border border-gray-100 rounded-2xl text-sm outline-none placeholder-gray-400 font-bold">
         </div>
 
         <div class="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6" id="shopsGrid">
@@ -26,100 +60,14 @@ main_content = '''
     </main>
 '''
 
-html = re.sub(
-    r'<!-- Spacer for fixed header -->.*?<!-- ========== FOOTER ========== -->',
-    main_content + '\n    <!-- ========== FOOTER ========== -->',
-    html,
-    flags=re.DOTALL
-)
-
 script_content = '''
     <style>
         .shop-card:hover { transform: translateY(-4px); box-shadow: 0 12px 40px rgba(0, 0, 0, 0.05); }
         .shop-card { transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1); }
     </style>
-    <script>
-        async function loadShops() {
-            const grid = document.getElementById('shopsGrid');
-            const noShops = document.getElementById('noShopsMsg');
-
-            try {
-                if (!window.supabase) {
-                    console.error('Supabase client not loaded');
-                    grid.innerHTML = '';
-                    noShops.classList.remove('hidden');
-                    return;
-                }
-
-                const { data: sellers, error } = await window.supabase
-                    .from('users')
-                    .select('*')
-                    .in('role', ['vendor', 'supplier'])
-                    .order('date_joined', { ascending: false });
-
-                if (error) throw error;
-
-                if (!sellers || sellers.length === 0) {
-                    grid.innerHTML = '';
-                    noShops.classList.remove('hidden');
-                    return;
-                }
-
-                grid.innerHTML = sellers.map(seller => {
-                    const avatar = seller.avatar || ('https://ui-avatars.com/api/?name=' + encodeURIComponent(seller.name || 'Vendor') + '&background=000000&color=fff');
-                    const dateJoined = seller.date_joined ? new Date(seller.date_joined).toLocaleDateString('fr-FR', { month: 'long', year: 'numeric' }) : 'récemment';
-                    
-                    return `
-                        <a href="catalog.html?supplier=${encodeURIComponent(seller.email)}" class="shop-card bg-white rounded-[2rem] p-6 border border-gray-100 flex flex-col gap-4 group">
-                            <div class="flex flex-row items-center justify-between">
-                                <div class="w-16 h-16 rounded-2xl bg-gray-50 overflow-hidden border border-gray-100 p-0.5">
-                                    <img src="${avatar}" alt="${seller.name}" class="w-full h-full object-cover rounded-xl" onerror="this.src='https://via.placeholder.com/64'">
-                                </div>
-                                <div class="w-10 h-10 rounded-full bg-gray-50 flex items-center justify-center text-gray-400 group-hover:bg-black group-hover:text-white transition-colors">
-                                    <iconify-icon icon="solar:arrow-right-up-linear" width="20"></iconify-icon>
-                                </div>
-                            </div>
-                            <div>
-                                <h3 class="text-lg font-bold text-gray-900 group-hover:text-black transition-colors mb-1 truncate" title="${seller.name || 'Boutique sans nom'}">${seller.name || 'Boutique sans nom'}</h3>
-                                <div class="flex items-center justify-between mt-3">
-                                    <span class="px-2 py-1 bg-black text-white rounded-lg text-[9px] font-bold uppercase tracking-widest">Partenaire</span>
-                                    <span class="text-xs text-gray-400 flex items-center gap-1 font-medium">
-                                        <iconify-icon icon="solar:calendar-outline"></iconify-icon>
-                                        Depuis ${dateJoined}
-                                    </span>
-                                </div>
-                            </div>
-                        </a>
-                    `;
-                }).join('');
-
-            } catch (err) {
-                console.error('Erreur chargement boutiques:', err);
-                grid.innerHTML = '';
-                noShops.classList.remove('hidden');
-                noShops.textContent = 'Erreur lors du chargement des boutiques.';
-            }
-        }
-
-        document.addEventListener('DOMContentLoaded', () => {
-            if (window.newketInitialized) {
-                loadShops();
-            } else {
-                window.addEventListener('newketInitialized', loadShops);
-            }
-        });
-    </script>
+    <script src="js/shops.js"></script>
 '''
 
-html = html.replace('</body>', script_content + '\n</body>')
-html = html.replace('<title>NewKet — Marketplace Moderne</title>', '<title>Boutiques — NewKet</title>')
-
-with open(os.path.join(directory, 'shops.html'), 'w', encoding='utf-8') as f:
-    f.write(html)
-
-print("shops.html created.")
-
-
 files_to_update = ['index.html', 'catalog.html', 'product.html', 'cart.html']
 nav_link_desktop = '<a href="shops.html" class="nav-link px-3 py-1.5 text-sm font-medium text-gray-600 hover:text-gray-900 whitespace-nowrap rounded-lg hover:bg-gray-50 transition-colors">Boutiques</a>'
 nav_link_mobile = '''<a href="shops.html"
@@ -128,19 +76,223 @@ nav_link_mobile = '''<a href="shops.html"
                         Boutiques
                     </a>'''
 
-for filename in files_to_update:
-    filepath = os.path.join(directory, filename)
-    if not os.path.exists(filepath):
-        continue
-        
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-        
-    if 'href="shops.html"' not in content:
-        content = re.sub(r'(<a href="catalog\.html"[^>]*>Toutes\s+les\s+(?:pièces|catégories)</a>)', r'\1\n                    ' + nav_link_desktop, content)
-        
-        content = re.sub(r'(<a href="catalog\.html"[^>]*>\s*<iconify-icon icon="solar:shop-linear"[^>]*></iconify-icon>\s*Toutes\s+les\s+(?:pièces|catégories)\s*</a>)', r'\1\n                    ' + nav_link_mobile, content)
-        
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(content)
-        print(f"Updated {filename}")
+card_template = '''
+            <a href="shop.html?email={email_url}" class="shop-card group bg-white rounded-[2.5rem] p-8 border border-gray-100 flex flex-col items-center text-center gap-6 relative overflow-hidden" data-seller-id="{id}" data-rev="{rev}">
+                <div class="absolute top-6 left-6">
+                    <span class="px-2 py-1 bg-black text-white text-[8px] font-black uppercase tracking-widest rounded-full opacity-0 group-hover:opacity-100 transition-opacity">Premium</span>
+                </div>
+
+                <div class="w-24 h-24 rounded-full bg-gray-50 overflow-hidden border-4 border-white shadow-lg group-hover:scale-105 transition-transform duration-500">
+                    <img src="{avatar}" alt="{name}" class="w-full h-full object-cover" loading="{loading}" onerror="this.src='https://ui-avatars.com/api/?name={fallback_name}'">
+                </div>
+
+                <div class="space-y-2">
+                    <h3 class="text-xl font-black text-gray-900 group-hover:text-black transition-colors leading-tight">{name}</h3>
+                    <p class="text-[10px] text-gray-400 font-bold uppercase tracking-[0.2em]">Partenaire Certifié</p>
+                </div>
+
+                <div class="pt-6 border-t border-gray-50 w-full flex items-center justify-between">
+                    <span class="text-[10px] text-gray-400 font-bold uppercase tracking-widest">Depuis {date_joined}</span>
+                    <div class="w-8 h-8 rounded-full bg-black text-white flex items-center justify-center translate-x-4 opacity-0 group-hover:translate-x-0 group-hover:opacity-100 transition-all duration-500">
+                        <iconify-icon icon="solar:arrow-right-linear" width="16"></iconify-icon>
+                    </div>
+                </div>
+            </a>'''
+
+PAGE_LINK_CLASS = 'min-w-10 h-10 px-3 rounded-full flex items-center justify-center text-xs font-black transition-colors'
+page_link_classes = {
+    'current': f'{PAGE_LINK_CLASS} bg-black text-white',
+    'other': f'{PAGE_LINK_CLASS} text-gray-500 hover:bg-gray-100 hover:text-black',
+}
+shops_page_regex = re.compile(r'shops-(\d+)\.html')
+
+
+def create_page(root):
+    with open(os.path.join(root, 'index.html'), 'r', encoding='utf-8') as f:
+        html = f.read()
+
+    html = re.sub(
+        r'<!-- Spacer for fixed header -->.*?<!-- ========== FOOTER ========== -->',
+        main_content + '\n    <!-- ========== FOOTER ========== -->',
+        html,
+        flags=re.DOTALL
+    )
+    html = html.replace('</body>', script_content + '\n</body>')
+    html = html.replace('<title>NewKet — Marketplace Moderne</title>', '<title>Boutiques — NewKet</title>')
+
+    with open(os.path.join(root, SHOPS_PAGE), 'w', encoding='utf-8') as f:
+        f.write(html)
+
+    print("shops.html created.")
+
+
+def add_nav_links(root):
+    for filename in files_to_update:
+        filepath = os.path.join(root, filename)
+        if not os.path.exists(filepath):
+            continue
+
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        if 'href="shops.html"' not in content:
+            content = re.sub(r'(<a href="catalog\.html"[^>]*>Toutes\s+les\s+(?:pièces|catégories)</a>)', r'\1\n                    ' + nav_link_desktop, content)
+
+            content = re.sub(r'(<a href="catalog\.html"[^>]*>\s*<iconify-icon icon="solar:shop-linear"[^>]*></iconify-icon>\s*Toutes\s+les\s+(?:pièces|catégories)\s*</a>)', r'\1\n                    ' + nav_link_mobile, content)
+
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(content)
+            print(f"Updated {filename}")
+
+
+def joined_text(value):
+    if not value:
+        return 'récemment'
+    try:
+        date = datetime.fromisoformat(str(value).replace(' ', 'T', 1))
+    except ValueError:
+        return 'récemment'
+    return f"{MONTHS[date.month - 1]} {date.year}"
+
+
+def render_card(seller, eager=False):
+    name = seller['name'] or 'Boutique sans nom'
+    avatar = seller['avatar'] or ('https://ui-avatars.com/api/?name=' + quote_component(seller['name'] or 'Vendor')
+                                  + '&background=f3f4f6&color=000&bold=true')
+    rev = json.dumps([seller['name'] or '', seller['email'] or '', seller['avatar'] or '', seller['date_joined'] or ''],
+                     ensure_ascii=False, separators=(',', ':'))
+    escape = html_lib.escape
+    return card_template.format(
+        email_url=escape(quote_component(seller['email'] or '')),
+        id=escape(str(seller['id'])),
+        rev=escape(rev),
+        avatar=escape(avatar),
+        name=escape(name),
+        fallback_name=escape(quote_component(seller['name'] or 'V')),
+        loading='eager' if eager else 'lazy',
+        date_joined=escape(joined_text(seller['date_joined'])),
+    )
+
+
+def quote_component(text):
+    # encodeURIComponent()
+    return quote(text, safe="-_.!~*'()")
+
+
+def page_filename(number):
+    return SHOPS_PAGE if number == 1 else f'shops-{number}.html'
+
+
+def render_pagination(current, total):
+    if total <= 1:
+        return '<nav id="shopsPagination" class="hidden" aria-label="Pages des boutiques"></nav>'
+    numbers = sorted({1, total} | set(range(max(1, current - PAGINATION_WINDOW),
+                                             min(total, current + PAGINATION_WINDOW) + 1)))
+    items = []
+    if current > 1:
+        items.append(f'<a href="{page_filename(current - 1)}" class="{page_link_classes["other"]}" rel="prev" '
+                     f'aria-label="Page précédente">&lsaquo;</a>')
+    previous = 0
+    for number in numbers:
+        if number > previous + 1:
+            items.append('<span class="px-1 text-gray-300 font-black">&hellip;</span>')
+        if number == current:
+            items.append(f'<span class="{page_link_classes["current"]}" aria-current="page">{number}</span>')
+        else:
+            items.append(f'<a href="{page_filename(number)}" class="{page_link_classes["other"]}">{number}</a>')
+        previous = number
+    if current < total:
+        items.append(f'<a href="{page_filename(current + 1)}" class="{page_link_classes["other"]}" rel="next" '
+                     f'aria-label="Page suivante">&rsaquo;</a>')
+    inner = ''.join(f'\n            {item}' for item in items)
+    return (f'<nav id="shopsPagination" class="mt-16 flex flex-wrap items-center justify-center gap-2" '
+            f'aria-label="Pages des boutiques">{inner}\n        </nav>')
+
+
+def render_page(template, sellers, number, total, snapshot):
+    index = HtmlIndex(template)
+    grid = index.get('shopsGrid')
+    if grid is None:
+        raise SystemExit(f"{SHOPS_PAGE} has no #shopsGrid to render into")
+    splicer = Splicer(index)
+    # The first row is on the first screen: its avatars are not lazy
+    cards = ''.join(render_card(seller, eager=i < 4) for i, seller in enumerate(sellers))
+    splicer.replace_inner(grid, cards + '\n        ' if cards else '')
+    splicer.set_attr(grid, 'data-snapshot', snapshot)
+    splicer.set_attr(grid, 'data-page', str(number))
+
+    pagination = render_pagination(number, total)
+    existing = index.get('shopsPagination')
+    if existing is not None:
+        splicer.replace(existing, pagination)
+    else:
+        splicer.insert_after(grid, '\n\n        ' + pagination)
+
+    no_shops = index.get('noShopsMsg')
+    if no_shops is not None:
+        classes = [c for c in no_shops.classes if c != 'hidden']
+        if sellers:
+            classes.insert(0, 'hidden')
+        splicer.set_attr(no_shops, 'class', ' '.join(classes))
+
+    title = index.first('title')
+    if title is not None:
+        splicer.replace_inner(title, 'Boutiques — NewKet' if number == 1 else f'Boutiques — Page {number} — NewKet')
+    return splicer.apply()
+
+
+def chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def prerender(root, source, page_size=PAGE_SIZE):
+    count, rows, snapshot = open_table(source, 'users', SELLER_FIELDS, where={'role': SELLER_ROLES},
+                                       order_by=('date_joined', True))
+    snapshot = json_value(snapshot)
+    with open(os.path.join(root, SHOPS_PAGE), 'r', encoding='utf-8') as f:
+        template = f.read()
+
+    total = max(1, -(-count // page_size))
+    written = 0
+    for number, sellers in enumerate(chunks(rows, page_size), start=1):
+        html = render_page(template, sellers, number, total, snapshot)
+        with open(os.path.join(root, page_filename(number)), 'w', encoding='utf-8') as f:
+            f.write(html)
+        written = number
+    if written == 0:
+        with open(os.path.join(root, SHOPS_PAGE), 'w', encoding='utf-8') as f:
+            f.write(render_page(template, [], 1, 1, snapshot))
+        written = 1
+
+    # Pages left over from a bigger snapshot
+    for path in glob.glob(os.path.join(root, 'shops-*.html')):
+        match = shops_page_regex.fullmatch(os.path.basename(path))
+        if match and int(match.group(1)) > written:
+            os.remove(path)
+    print(f"{count} seller(s) pre-rendered on {written} page(s), snapshot of {snapshot}.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the shops directory page, or pre-render it from a snapshot.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--create', action='store_true',
+                        help='build shops.html from index.html and link it from the main pages')
+    parser.add_argument('--snapshot', metavar='SOURCE',
+                        help='pre-render the sellers of a JSON export, a SQLite file or a postgresql:// URL')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help=f'shops per page (default: {PAGE_SIZE})')
+    args = parser.parse_args()
+
+    if not args.create and not args.snapshot:
+        parser.error('nothing to do: pass --create and/or --snapshot')
+    if args.create:
+        create_page(args.root)
+        add_nav_links(args.root)
+    if args.snapshot:
+        prerender(args.root, args.snapshot, args.page_size)
@@ -0,0 +1,464 @@
+import os
+import posixpath
+import re
+
+from html_index import Element, HtmlIndex, Splicer
+from page_manifest import file_hash
+from rewrite_engine import Rule, RuleSet, main
+
+# Critical CSS.
+# Every page used to block its first paint on its local stylesheets
+# (css/style.css, css/responsive.css, the Tailwind build...). This step
+# works out the markup of the first screen of each page and inlines only the
+# CSS rules that can apply to it in a <style data-critical> block; the full
+# stylesheets are then loaded without blocking the render (media="print"
+# switched to "all" once loaded, with a <noscript> fallback).
+#
+# The first screen is the page header (the <header>, or the first <nav> of
+# the admin pages), the blocks listed in FOLD_IDS and the visible markup
+# within FOLD_BYTES after the header. A selector is kept when its last
+# compound matches one of those elements and its descendant and child
+# combinators can be satisfied by their ancestors; pseudo-classes, :not()
+# and sibling combinators are assumed to match, so a rule is kept rather
+# than lost when in doubt.
+#
+# Only local stylesheets can be inlined: run build_css.py first so the
+# Tailwind CDN script is replaced by a local build. Rerunning the rule set
+# regenerates the critical CSS from the stylesheets.
+
+# Blocks that are on the first screen whenever the page has them
+FOLD_IDS = ['shopsGrid', 'adminSidebar', 'pinnedSection']
+# Markup after the header considered to be above the fold
+FOLD_BYTES = 6000
+SKIPPED_TAGS = {'script', 'style', 'template', 'noscript', 'link', 'meta'}
+
+ASYNC_LINK = '<link rel="stylesheet" href="{href}" media="print" onload="this.media=\'all\'" data-critical>'
+
+css_token_regex = re.compile(r'/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|[{};]', re.DOTALL)
+compact_regex = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/|\s+''', re.DOTALL)
+compact_punct_regex = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|\s*([{};,])\s*''')
+# A custom property set to a space (--tw-pan-x: ;) must keep it
+empty_value_regex = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|:(?=[;}]|$)''')
+url_regex = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
+ident = r'(?:\\[0-9a-fA-F]{1,6}\s?|\\.|[\w-]|[^\x00-\x7f])+'
+compound_part_regex = re.compile(
+    rf'(?P<tag>{ident}|\*)|#(?P<id>{ident})|\.(?P<cls>{ident})'
+    r'|\[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~|^$*]?=)\s*(?P<value>"[^"]*"|\'[^\']*\'|[^\]\s]+)\s*\w?\s*)?\]'
+    rf'|::?(?P<pseudo>{ident})(?P<args>\()?'
+)
+escape_regex = re.compile(r'\\([0-9a-fA-F]{1,6})\s?|\\(.)')
+frames_name_regex = re.compile(r'@(?:-webkit-)?keyframes\s+(\S+)')
+font_family_regex = re.compile(r'font-family\s*:\s*([^;}]+)')
+
+
+def compact(css):
+    # Comments dropped and whitespace collapsed, strings left as they are
+    css = compact_regex.sub(lambda m: m.group(1) or ' ', css)
+    css = compact_punct_regex.sub(lambda m: m.group(1) or m.group(2), css).strip()
+    return empty_value_regex.sub(lambda m: m.group(1) or ': ', css)
+
+
+def blocks(css):
+    # Top-level (prelude, body) pairs; body is None for statements (@import...)
+    depth = 0
+    start = body_start = 0
+    prelude = ''
+    for match in css_token_regex.finditer(css):
+        token = match.group(0)
+        if token == '{':
+            if depth == 0:
+                prelude = css[start:match.start()]
+                body_start = match.end()
+            depth += 1
+        elif token == '}':
+            if depth == 0:
+                start = match.end()
+                continue
+            depth -= 1
+            if depth == 0:
+                yield prelude, css[body_start:match.start()]
+                start = match.end()
+        elif token == ';' and depth == 0:
+            yield css[start:match.start()], None
+            start = match.end()
+
+
+def unescape(name):
+    return escape_regex.sub(lambda m: chr(int(m.group(1), 16)) if m.group(1) else m.group(2), name)
+
+
+def split_top(text, separators):
+    # Splits at the separator characters outside (), [], strings and escapes
+    parts = []
+    depth = 0
+    quote = None
+    start = pos = 0
+    while pos < len(text):
+        char = text[pos]
+        if char == '\\':
+            pos += 2
+            continue
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif depth == 0 and char in separators:
+            parts.append((text[start:pos], char))
+            start = pos + 1
+        pos += 1
+    parts.append((text[start:], None))
+    return parts
+
+
+class Compound:
+    def __init__(self, text):
+        self.tag = None
+        self.ids = []
+        self.classes = []
+        # (name, value or None when only presence can be checked)
+        self.attrs = []
+        self.root = False
+        pos = 0
+        while pos < len(text):
+            match = compound_part_regex.match(text, pos)
+            if not match:
+                raise ValueError(f'cannot parse selector {text!r}')
+            if match.group('tag'):
+                self.tag = None if match.group('tag') == '*' else unescape(match.group('tag')).lower()
+            elif match.group('id'):
+                self.ids.append(unescape(match.group('id')))
+            elif match.group('cls'):
+                self.classes.append(unescape(match.group('cls')))
+            elif match.group('attr'):
+                value = match.group('value')
+                if match.group('op') == '=' and value:
+                    self.attrs.append((match.group('attr').lower(), value.strip('"\'')))
+                else:
+                    self.attrs.append((match.group('attr').lower(), None))
+            else:
+                self.root = self.root or match.group('pseudo').lower() == 'root'
+            pos = match.end()
+            if match.group('args'):
+                # :not(), :is(), :nth-child()... are assumed to match
+                depth = 1
+                while pos < len(text) and depth:
+                    depth += {'(': 1, ')': -1}.get(text[pos], 0)
+                    pos += 1
+
+    def matches(self, element):
+        if self.tag is not None and element.tag != self.tag:
+            return False
+        if self.root and element.tag != 'html':
+            return False
+        if any(element.id != i for i in self.ids):
+            return False
+        classes = element.classes
+        if any(c not in classes for c in self.classes):
+            return False
+        for name, value in self.attrs:
+            if name not in element.attrs or (value is not None and element.attrs[name] != value):
+                return False
+        return True
+
+
+class Selector:
+    def __init__(self, text):
+        self.text = text
+        # [(compound, combinator to the next compound)], the subject last
+        self.chain = []
+        combinator = None
+        for part, separator in split_top(text.strip(), ' >+~'):
+            if part:
+                if self.chain:
+                    self.chain[-1][1] = combinator or ' '
+                self.chain.append([Compound(part), None])
+                combinator = None
+            if separator and separator != ' ':
+                combinator = separator
+        if not self.chain:
+            raise ValueError(f'empty selector {text!r}')
+
+    def matches(self, element, depth=None):
+        depth = len(self.chain) - 1 if depth is None else depth
+        compound, _ = self.chain[depth]
+        if not compound.matches(element):
+            return False
+        if depth == 0:
+            return True
+        combinator = self.chain[depth - 1][1]
+        if combinator == '>':
+            return isinstance(element.parent, Element) and self.matches(element.parent, depth - 1)
+        if combinator == ' ':
+            parent = element.parent
+            while isinstance(parent, Element) and parent.tag != '#document':
+                if self.matches(parent, depth - 1):
+                    return True
+                parent = parent.parent
+            return False
+        # Siblings are not tracked: assumed to match
+        return True
+
+
+def parse_selectors(prelude):
+    selectors = []
+    for text, _ in split_top(prelude, ','):
+        try:
+            selectors.append(Selector(text))
+        except ValueError:
+            # Unknown syntax: kept as if it matched
+            selectors.append(text.strip())
+    return selectors
+
+
+def rebase_urls(body, sheet_dir, page_dir):
+    # url() values are relative to the stylesheet, the inline copy to the page
+    def rebase(match):
+        url = match.group(2).strip()
+        if url.startswith(('data:', '#', '/')) or '://' in url:
+            return match.group(0)
+        path = posixpath.normpath(posixpath.join(sheet_dir, url))
+        return f"url('{posixpath.relpath(path, page_dir)}')"
+    return url_regex.sub(rebase, body)
+
+
+def parse_stylesheet(css):
+    # [('rule', [Selector], body) | ('group', prelude, items) | ('keyframes', name, text) | ('font', text)]
+    items = []
+    for prelude, body in blocks(css):
+        head = compact(prelude)
+        if body is None:
+            # @import and @charset stay in the full stylesheet
+            continue
+        if head.startswith('@'):
+            name = re.match(r'@([\w-]+)', head).group(1).lower()
+            if name in ('media', 'supports', 'layer'):
+                if not re.match(r'@media\s*print\b', head, re.IGNORECASE):
+                    items.append(('group', head, parse_stylesheet(body)))
+            elif name.endswith('keyframes'):
+                items.append(('keyframes', frames_name_regex.match(head).group(1), f'{head}{{{compact(body)}}}'))
+            elif name == 'font-face':
+                items.append(('font', f'{head}{{{compact(body)}}}'))
+            continue
+        items.append(('rule', parse_selectors(head), compact(body)))
+    return items
+
+
+class Fold:
+    # The elements of the first screen of a page
+    def __init__(self, index):
+        self.elements = set()
+        body = index.first('body') or index.root
+        header = index.first('header') or index.first('nav')
+        start = body.open_end
+        if header is not None:
+            self.add_subtree(header)
+            start = header.end
+        for element_id in FOLD_IDS:
+            element = index.get(element_id)
+            if element is not None:
+                self.add_subtree(element)
+        self.add_window(body, start, start + FOLD_BYTES)
+
+    def add(self, element):
+        while isinstance(element, Element) and element.tag != '#document' and id(element) not in self.elements:
+            self.elements.add(id(element))
+            element = element.parent
+
+    def add_subtree(self, element):
+        self.add(element)
+        for child in element.children:
+            if isinstance(child, Element) and child.tag not in SKIPPED_TAGS:
+                self.add_subtree(child)
+
+    def add_window(self, element, start, end):
+        for child in element.children:
+            if not isinstance(child, Element) or child.tag in SKIPPED_TAGS or child.end <= start:
+                continue
+            if child.start >= end:
+                break
+            if 'hidden' in child.classes and not any(':' in c for c in child.classes):
+                # Not displayed on the first paint
+                continue
+            if child.start >= start:
+                self.add(child)
+            self.add_window(child, start, end)
+
+    def __contains__(self, element):
+        return id(element) in self.elements
+
+
+def candidates(index, selector, fold):
+    compound = selector.chain[-1][0]
+    if compound.ids:
+        found = index.by_id.get(compound.ids[0], [])
+    elif compound.classes:
+        found = index.by_class.get(compound.classes[0], [])
+    elif compound.tag:
+        found = index.by_tag.get(compound.tag, [])
+    else:
+        found = [e for elements in index.by_tag.values() for e in elements]
+    return (e for e in found if e in fold)
+
+
+def selector_applies(index, selector, fold):
+    if isinstance(selector, str):
+        return True
+    return any(selector.matches(element) for element in candidates(index, selector, fold))
+
+
+class CriticalCss:
+    # Keeps the rules of parsed stylesheets that apply to the first screen
+    def __init__(self, index, page_dir):
+        self.index = index
+        self.fold = Fold(index)
+        self.page_dir = page_dir
+        self.out = []
+        self.keyframes = []
+        self.fonts = []
+
+    def add_sheet(self, items, sheet_dir):
+        self.out.append(self.select(items, sheet_dir))
+
+    def select(self, items, sheet_dir):
+        kept = []
+        for item in items:
+            if item[0] == 'rule':
+                selectors = [s for s in item[1] if selector_applies(self.index, s, self.fold)]
+                if selectors:
+                    text = ','.join(s if isinstance(s, str) else s.text.strip() for s in selectors)
+                    kept.append(f'{text}{{{rebase_urls(item[2], sheet_dir, self.page_dir)}}}')
+            elif item[0] == 'group':
+                inner = self.select(item[2], sheet_dir)
+                if inner:
+                    kept.append(f'{item[1]}{{{inner}}}')
+            elif item[0] == 'keyframes':
+                self.keyframes.append(item[1:])
+            else:
+                self.fonts.append(rebase_urls(item[1], sheet_dir, self.page_dir))
+        return ''.join(kept)
+
+    def css(self):
+        css = ''.join(self.out)
+        # Animations and font faces used by the kept rules
+        extra = [text for name, text in self.keyframes if re.search(rf'(?<![\w-]){re.escape(name)}(?![\w-])', css)]
+        families = ' '.join(font_family_regex.findall(css)).lower()
+        for text in self.fonts:
+            match = font_family_regex.search(text)
+            if match and match.group(1).strip('\'" ').lower() in families:
+                extra.append(text)
+        return css + ''.join(extra)
+
+
+def stylesheet_links(index):
+    # Local stylesheets of the page, whether already made asynchronous or not
+    links = []
+    for link in index.find('link'):
+        if 'stylesheet' not in link.attrs.get('rel', '').lower().split() or link.parent.tag == 'noscript':
+            continue
+        href = link.attrs.get('href', '')
+        if not href or href.startswith(('data:', '//')) or '://' in href:
+            continue
+        if 'media' in link.attrs and 'data-critical' not in link.attrs:
+            # Already scoped to some media: left alone
+            continue
+        links.append(link)
+    return links
+
+
+def indentation(text, pos):
+    line_start = text.rfind('\n', 0, pos) + 1
+    prefix = text[line_start:pos]
+    return prefix if not prefix.strip() else ''
+
+
+class InlineCriticalCss(Rule):
+    def __init__(self, name='inline_critical_css', pages=None):
+        super().__init__(name, pages)
+        self.root = None
+        self.sheets = {}
+        self.hashes = {}
+
+    def prepare(self, root):
+        self.root = root
+        self.sheets = {}
+        self.hashes = {}
+        css_dir = os.path.join(root, 'css')
+        if os.path.isdir(css_dir):
+            for filename in sorted(os.listdir(css_dir)):
+                if filename.endswith('.css'):
+                    self.hashes[filename] = file_hash(os.path.join(css_dir, filename))
+
+    def inputs(self):
+        return ['css/*.css']
+
+    def stylesheet(self, relpath):
+        if relpath not in self.sheets:
+            path = os.path.join(self.root, relpath)
+            if os.path.isfile(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.sheets[relpath] = parse_stylesheet(f.read())
+            else:
+                self.sheets[relpath] = None
+        return self.sheets[relpath]
+
+    def apply(self, content, page):
+        index = HtmlIndex(content)
+        links = stylesheet_links(index)
+        if not links:
+            return content
+        if any(s.attrs.get('src', '').startswith('https://cdn.tailwindcss.com') for s in index.find('script')):
+            page.warn("Tailwind still comes from the CDN script: run build_css.py first")
+
+        page_dir = posixpath.dirname(page.relpath) or '.'
+        critical = CriticalCss(index, page_dir)
+        hrefs = []
+        for link in links:
+            href = link.attrs['href']
+            relpath = posixpath.normpath(posixpath.join(page_dir, href.split('?')[0]))
+            items = self.stylesheet(relpath)
+            if items is None:
+                page.warn(f"{href} not found: loaded as before")
+                continue
+            critical.add_sheet(items, posixpath.dirname(relpath))
+            hrefs.append((link, href))
+        if not hrefs:
+            return content
+
+        splicer = Splicer(index)
+        style = f'<style data-critical>{critical.css()}</style>'
+        noscript = '<noscript data-critical>' + ''.join(
+            f'<link rel="stylesheet" href="{href}">' for link, href in hrefs) + '</noscript>'
+        existing_style = index.first('style', attrs={'data-critical': ''})
+        existing_noscript = index.first('noscript', attrs={'data-critical': ''})
+        first, last = hrefs[0][0], hrefs[-1][0]
+        for link, href in hrefs:
+            source = index.source(link)
+            text = [source if 'data-critical' in link.attrs else ASYNC_LINK.format(href=href)]
+            if link is first and existing_style is None:
+                text.insert(0, style)
+            if link is last and existing_noscript is None:
+                text.append(noscript)
+            if text != [source]:
+                splicer.replace(link, ('\n' + indentation(content, link.start)).join(text))
+        if existing_style:
+            splicer.replace(existing_style, style)
+        if existing_noscript:
+            splicer.replace(existing_noscript, noscript)
+        new_content = splicer.apply()
+        if new_content != content:
+            page.hit('critical_css')
+        return new_content
+
+    def describe(self):
+        return super().describe() + [self.hashes, FOLD_IDS, FOLD_BYTES]
+
+
+RULES = RuleSet('critical_css', [InlineCriticalCss()], pages=['*.html', 'admin/*.html'])
+
+if __name__ == '__main__':
+    main([RULES], 'Inline the critical CSS of each page and load its stylesheets asynchronously.')
@@ -0,0 +1,315 @@
+import re
+
+# Tolerant HTML tokenizer and offset index.
+# One scan of the page records every element (tag, attributes, start tag
+# and end tag offsets), comment and doctype, with dictionaries by id, class
+# and tag for O(1) lookups afterwards. Transforms select nodes by structure
+# and splice by offsets through a Splicer, which only accepts edits on
+# whole nodes, element contents or attribute values: a replacement can
+# never swallow half of a neighbouring element the way `<x>.*?</x>` with
+# DOTALL can.
+#
+# Not a validating parser: unknown or stray end tags are ignored, unclosed
+# elements end where their parent ends.
+
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link',
+    'meta', 'param', 'source', 'track', 'wbr',
+}
+RAW_TEXT_TAGS = {'script', 'style', 'textarea', 'title'}
+
+tag_name_regex = re.compile(r'[a-zA-Z][^\s/>]*')
+attr_regex = re.compile(r'''\s*([^\s"'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+)))?''')
+tag_close_regex = re.compile(r'\s*/?>')
+
+
+class Node:
+    def __init__(self, tag, start, end, parent=None):
+        self.tag = tag
+        self.start = start
+        self.end = end
+        self.parent = parent
+
+
+class Comment(Node):
+    def __init__(self, start, end, text, parent):
+        super().__init__('#comment', start, end, parent)
+        self.text = text
+
+
+class Element(Node):
+    def __init__(self, tag, start, open_end, attrs, spans, parent):
+        super().__init__(tag, start, open_end, parent)
+        self.open_end = open_end
+        self.close_start = open_end
+        self.attrs = attrs
+        # attribute name -> (value start, value end, quote char)
+        self.spans = spans
+        self.children = []
+
+    @property
+    def id(self):
+        return self.attrs.get('id')
+
+    @property
+    def classes(self):
+        return self.attrs.get('class', '').split()
+
+    def first_child_element(self):
+        for child in self.children:
+            if isinstance(child, Element):
+                return child
+        return None
+
+    def __repr__(self):
+        return f'<{self.tag} {self.attrs} @{self.start}:{self.end}>'
+
+
+class HtmlIndex:
+    def __init__(self, text):
+        self.text = text
+        self.root = Element('#document', 0, 0, {}, {}, None)
+        self.by_id = {}
+        self.by_class = {}
+        self.by_tag = {}
+        self.comments = []
+        self._parse()
+
+    def _add(self, parent, node):
+        node.parent = parent
+        parent.children.append(node)
+
+    def _parse(self):
+        text = self.text
+        length = len(text)
+        stack = [self.root]
+        pos = 0
+        while True:
+            lt = text.find('<', pos)
+            if lt == -1 or lt + 1 >= length:
+                break
+            nxt = text[lt + 1]
+
+            if text.startswith('<!--', lt):
+                end = text.find('-->', lt + 4)
+                end = length if end == -1 else end + 3
+                comment = Comment(lt, end, text[lt + 4:end - 3], stack[-1])
+                self._add(stack[-1], comment)
+                self.comments.append(comment)
+                pos = end
+                continue
+
+            if nxt in '!?':
+                end = text.find('>', lt)
+                pos = length if end == -1 else end + 1
+                self._add(stack[-1], Node('#decl', lt, pos))
+                continue
+
+            if nxt == '/':
+                match = tag_name_regex.match(text, lt + 2)
+                end = text.find('>', lt)
+                if not match or end == -1:
+                    pos = lt + 2
+                    continue
+                self._close(stack, match.group(0).lower(), lt, end + 1)
+                pos = end + 1
+                continue
+
+            match = tag_name_regex.match(text, lt + 1)
+            if not match:
+                # A bare '<' in text
+                pos = lt + 1
+                continue
+            tag = match.group(0).lower()
+            attrs, spans, pos = self._parse_attrs(match.end())
+            element = Element(tag, lt, pos, attrs, spans, stack[-1])
+            self._add(stack[-1], element)
+            self._register(element)
+
+            self_closing = text[pos - 2:pos] == '/>'
+            if tag in VOID_TAGS or self_closing:
+                element.end = element.close_start = pos
+                continue
+            if tag in RAW_TEXT_TAGS:
+                close = re.compile(r'</' + tag + r'\s*>', re.IGNORECASE).search(text, pos)
+                if close:
+                    element.close_start, element.end = close.start(), close.end()
+                else:
+                    element.close_start = element.end = length
+                pos = element.end
+                continue
+            stack.append(element)
+
+        for element in stack[1:]:
+            element.close_start = element.end = length
+        self.root.close_start = self.root.end = length
+
+    def _parse_attrs(self, pos):
+        text = self.text
+        attrs = {}
+        spans = {}
+        while True:
+            close = tag_close_regex.match(text, pos)
+            if close:
+                return attrs, spans, close.end()
+            match = attr_regex.match(text, pos)
+            if not match or match.end() == pos:
+                # Malformed tag: stop at the next '>'
+                end = text.find('>', pos)
+                return attrs, spans, len(text) if end == -1 else end + 1
+            name = match.group(1).lower()
+            for group, quote in ((2, '"'), (3, "'"), (4, '')):
+                if match.group(group) is not None:
+                    if name not in attrs:
+                        attrs[name] = match.group(group)
+                        spans[name] = (match.start(group), match.end(group), quote)
+                    break
+            else:
+                attrs.setdefault(name, '')
+            pos = match.end()
+
+    def _close(self, stack, tag, start, end):
+        for depth in range(len(stack) - 1, 0, -1):
+            if stack[depth].tag == tag:
+                # Elements left open inside end where this one closes
+                for element in stack[depth + 1:]:
+                    element.close_start = element.end = start
+                element = stack[depth]
+                element.close_start, element.end = start, end
+                del stack[depth:]
+                return
+        # Stray end tag: ignored
+
+    def _register(self, element):
+        self.by_tag.setdefault(element.tag, []).append(element)
+        if element.id is not None:
+            self.by_id.setdefault(element.id, []).append(element)
+        for cls in element.classes:
+            self.by_class.setdefault(cls, []).append(element)
+
+    def get(self, element_id):
+        found = self.by_id.get(element_id)
+        return found[0] if found else None
+
+    def find(self, tag=None, id=None, cls=None, attrs=None):
+        # Every element matching all given criteria, in document order.
+        # `cls` may be one class or a list of classes that must all be set;
+        # `attrs` maps attribute names to exact values.
+        if id is not None:
+            candidates = self.by_id.get(id, [])
+        elif cls is not None:
+            first = cls if isinstance(cls, str) else cls[0]
+            candidates = self.by_class.get(first, [])
+        elif tag is not None:
+            candidates = self.by_tag.get(tag, [])
+        else:
+            candidates = [e for elements in self.by_tag.values() for e in elements]
+            candidates.sort(key=lambda e: e.start)
+        wanted = [] if cls is None else [cls] if isinstance(cls, str) else list(cls)
+        result = []
+        for element in candidates:
+            if tag is not None and element.tag != tag:
+                continue
+            if id is not None and element.id != id:
+                continue
+            if wanted and not all(c in element.classes for c in wanted):
+                continue
+            if attrs and any(element.attrs.get(k) != v for k, v in attrs.items()):
+                continue
+            result.append(element)
+        return result
+
+    def first(self, tag=None, id=None, cls=None, attrs=None):
+        found = self.find(tag, id, cls, attrs)
+        return found[0] if found else None
+
+    def source(self, node):
+        return self.text[node.start:node.end]
+
+    def inner(self, element):
+        return self.text[element.open_end:element.close_start]
+
+    def previous_sibling(self, node, skip_blank=True):
+        # The sibling right before `node`, provided only whitespace separates them
+        siblings = node.parent.children
+        index = siblings.index(node)
+        if index == 0:
+            return None
+        previous = siblings[index - 1]
+        if skip_blank and self.text[previous.end:node.start].strip():
+            return None
+        return previous
+
+    def next_sibling(self, node, skip_blank=True):
+        siblings = node.parent.children
+        index = siblings.index(node)
+        if index + 1 >= len(siblings):
+            return None
+        following = siblings[index + 1]
+        if skip_blank and self.text[node.end:following.start].strip():
+            return None
+        return following
+
+
+class Splicer:
+    # Collects edits against one HtmlIndex and applies them in a single pass
+    def __init__(self, index):
+        self.index = index
+        self.edits = []
+
+    def replace(self, node, text):
+        self.edits.append((node.start, node.end, text))
+
+    def remove(self, node):
+        # Drops the node, with its line when nothing else is on it
+        text = self.index.text
+        line_start = text.rfind('\n', 0, node.start) + 1
+        line_end = text.find('\n', node.end)
+        line_end = len(text) if line_end == -1 else line_end + 1
+        if text[line_start:node.start].strip() or text[node.end:line_end].strip():
+            self.edits.append((node.start, node.end, ''))
+        else:
+            self.edits.append((line_start, line_end, ''))
+
+    def replace_siblings(self, first, last, text):
+        # From the start of `first` to the end of `last`, which must share a parent
+        if first.parent is not last.parent or first.start > last.start:
+            raise ValueError('replace_siblings needs two siblings in document order')
+        self.edits.append((first.start, last.end, text))
+
+    def insert_after(self, node, text):
+        self.edits.append((node.end, node.end, text))
+
+    def replace_inner(self, element, text):
+        self.edits.append((element.open_end, element.close_start, text))
+
+    def insert_after_start_tag(self, element, text):
+        self.edits.append((element.open_end, element.open_end, text))
+
+    def set_attr(self, element, name, value):
+        if name in element.spans:
+            start, end, quote = element.spans[name]
+            if not quote:
+                # Unquoted value: quote it so the new value may contain spaces
+                self.edits.append((start, end, f'"{value}"'))
+            else:
+                self.edits.append((start, end, value))
+        else:
+            # value=None adds a boolean attribute (defer, hidden...)
+            at = element.start + 1 + len(element.tag)
+            self.edits.append((at, at, f' {name}' if value is None else f' {name}="{value}"'))
+
+    def apply(self):
+        text = self.index.text
+        if not self.edits:
+            return text
+        parts = []
+        pos = 0
+        for start, end, replacement in sorted(self.edits, key=lambda e: (e[0], e[1])):
+            if start < pos:
+                raise ValueError(f'overlapping edits at offset {start}')
+            parts.append(text[pos:start])
+            parts.append(replacement)
+            pos = end
+        parts.append(text[pos:])
+        return ''.join(parts)
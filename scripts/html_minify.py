@@ -0,0 +1,86 @@
+import re
+
+from html_index import Comment, Element, HtmlIndex
+
+# Conservative HTML minifier for the dist/ output.
+# Runs of whitespace between and inside tags become a single space (or a
+# single newline when they contained one), and comments are dropped. What
+# the browser would render differently is copied verbatim: <pre>, raw text
+# elements (inline scripts with their template literals, styles, textareas)
+# and elements styled with white-space: pre*.
+
+VERBATIM_TAGS = {'pre', 'script', 'style', 'textarea', 'title'}
+PRE_CLASSES = {'whitespace-pre', 'whitespace-pre-wrap', 'whitespace-pre-line', 'whitespace-break-spaces'}
+
+space_regex = re.compile(r'\s+')
+tag_space_regex = re.compile(r'''("[^"]*"|'[^']*')|\s+''')
+pre_style_regex = re.compile(r'white-space\s*:\s*(?:pre|break-spaces)', re.IGNORECASE)
+
+
+def collapse(text):
+    return space_regex.sub(lambda m: '\n' if '\n' in m.group(0) else ' ', text)
+
+
+def collapse_tag(text):
+    # Whitespace between attributes; quoted values are left alone
+    return tag_space_regex.sub(lambda m: m.group(1) or ' ', text)
+
+
+def is_verbatim(element):
+    if element.tag in VERBATIM_TAGS:
+        return True
+    if PRE_CLASSES.intersection(element.classes):
+        return True
+    return bool(pre_style_regex.search(element.attrs.get('style', '')))
+
+
+def keep_comment(comment):
+    # Conditional comments are read by old IE
+    return comment.text.startswith('[if') or comment.text.startswith('<![endif')
+
+
+class _Writer:
+    def __init__(self):
+        self.parts = []
+
+    def text(self, text):
+        text = collapse(text)
+        if not text:
+            return
+        # Whitespace on both sides of a dropped comment
+        if text[0].isspace() and self.parts and self.parts[-1][-1:].isspace():
+            text = text[1:]
+        if text:
+            self.parts.append(text)
+
+    def raw(self, text):
+        if text:
+            self.parts.append(text)
+
+
+def _write_children(index, element, writer):
+    text = index.text
+    pos = element.open_end
+    for child in element.children:
+        writer.text(text[pos:child.start])
+        if isinstance(child, Element):
+            if is_verbatim(child):
+                writer.raw(index.source(child))
+            else:
+                writer.raw(collapse_tag(text[child.start:child.open_end]))
+                _write_children(index, child, writer)
+                writer.raw(collapse_tag(text[child.close_start:child.end]))
+        elif isinstance(child, Comment):
+            if keep_comment(child):
+                writer.raw(index.source(child))
+        else:
+            writer.raw(index.source(child))
+        pos = child.end
+    writer.text(text[pos:element.close_start])
+
+
+def minify(html):
+    index = HtmlIndex(html)
+    writer = _Writer()
+    _write_children(index, index.root, writer)
+    return ''.join(writer.parts).strip() + '\n'
@@ -0,0 +1,796 @@
+import argparse
+import glob
+import os
+import re
+import statistics
+import time
+
+from rewrite_engine import ROOT
+
+try:
+    import psycopg
+except ImportError:
+    psycopg = None
+
+# Index advisor for the queries the front-end sends to Supabase.
+# backup/schema.sql has few indexes besides the primary keys, while the
+# pages filter and sort on other columns through js/supabase-adapter.js (eq, in, ilike, or, gte,
+# lte, order, limit) or supabase-js chains (.from('t').eq(...).order(...)).
+#
+#   1. The query shapes are read from the sources: every fetchWithFilters /
+#      fetchPaginated call and every .from('table') chain of js/*.js and of
+#      the inline scripts of the pages. Options a page adds conditionally
+#      (options.in = ... inside an if, query = query.eq(...)) give one more
+#      shape each, on top of the options it always sends.
+#   2. Each shape proposes indexes: a B-tree on its equality columns followed
+#      by its sort columns (or range column), and a pg_trgm GIN index for
+#      every column searched with ilike '%...%'. A B-tree that the primary
+#      key or a CREATE INDEX of schema.sql starts with is not proposed.
+#   3. With --dsn, the tables and indexes of schema.sql are created in a
+#      scratch schema of that database and filled with synthetic rows at
+#      each --rows scale.
+#      Every shape is replayed with EXPLAIN ANALYZE before and after creating
+#      the candidate indexes, and the indexes the planner used for a query
+#      that got faster at the largest scale are written as a migration.
+#
+#   python scripts/index_advisor.py
+#   python scripts/index_advisor.py --dsn postgresql://postgres@localhost/scratch
+#
+# Use a local database: loading 1M rows per table takes a few minutes. The
+# scratch schema is dropped at the end; nothing else is touched.
+
+SCHEMA_FILE = os.path.join('backup', 'schema.sql')
+SOURCES = ['js/*.js', '*.html', 'admin/*.html']
+MIGRATIONS_DIR = os.path.join('supabase', 'migrations')
+SCRATCH_SCHEMA = 'index_advisor'
+SCALES = (10000, 100000, 1000000)
+# PostgREST answers at most this many rows without an explicit limit
+DEFAULT_LIMIT = 1000
+# fetchPaginated's default page size
+DEFAULT_PAGE_SIZE = 20
+REPEAT = 5
+# An index is kept if a query using it runs in at most this fraction of the time
+GAIN = 0.8
+
+FILTER_OPS = ('eq', 'neq', 'in', 'ilike', 'like', 'gte', 'lte', 'gt', 'lt')
+EQUALITY_OPS = ('eq', 'in')
+RANGE_OPS = ('gte', 'lte', 'gt', 'lt')
+PATTERN_OPS = ('ilike', 'like')
+SQL_OPS = {'eq': '=', 'neq': '<>', 'gte': '>=', 'lte': '<=', 'gt': '>', 'lt': '<',
+           'ilike': 'ILIKE', 'like': 'LIKE'}
+
+OPEN, CLOSE = '([{', ')]}'
+
+call_regex = re.compile(r'\bfetch(WithFilters|Paginated)\(\s*([\'"])(\w+)\2\s*,')
+from_regex = re.compile(r'\.from\(\s*([\'"])(\w+)\1\s*\)')
+method_regex = re.compile(r'\.(\w+)\(')
+assigned_chain_regex = re.compile(r'(?:(?:const|let|var)\s+)?(\w+)\s*=\s*(?:await\s+)?[\w.]*$')
+constant_regex = re.compile(r'\bconst\s+(\w+)\s*=\s*(\d+|\[[^\]]*\])\s*;')
+pair_column_regex = re.compile(r'\[\s*[\'"](\w+)[\'"]\s*,\s*([^\]\[]*(?:\[[^\]]*\])?[^\]]*)\]')
+or_filter_regex = re.compile(r'(\w+)\.(' + '|'.join(FILTER_OPS) + r')\.')
+string_regex = re.compile(r'[\'"]([^\'"]*)[\'"]')
+table_regex = re.compile(r'CREATE TABLE IF NOT EXISTS public\.(\w+)\s*\((.*?)\n\);', re.S)
+schema_index_regex = re.compile(r'CREATE (?:UNIQUE )?INDEX (?:IF NOT EXISTS )?(\w+)\s+ON public\.(\w+)\s*'
+                                r'(?:USING (\w+)\s*)?\(([^;]*)\)\s*;', re.I)
+column_regex = re.compile(r'^\s*(\w+)\s+([A-Z][A-Z ]*?)(?:\s+(?:PRIMARY|DEFAULT|NOT|UNIQUE|REFERENCES)\b.*)?,?$')
+
+
+# ---------------------------------------------------------------------------
+# Reading the JavaScript
+
+def skip_string(text, i):
+    # Index after the string or template literal starting at text[i]
+    quote = text[i]
+    i += 1
+    while i < len(text):
+        if text[i] == '\\':
+            i += 2
+            continue
+        if text[i] == quote:
+            return i + 1
+        i += 1
+    return i
+
+
+def scan(text, i):
+    # (index, character, depth) of the code from i on, without strings and comments
+    depth = 0
+    while i < len(text):
+        c = text[i]
+        if c in '\'"`':
+            i = skip_string(text, i)
+            continue
+        if text.startswith('//', i):
+            i = text.find('\n', i)
+            if i < 0:
+                return
+            continue
+        if text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = len(text) if end < 0 else end + 2
+            continue
+        if c in OPEN:
+            depth += 1
+        elif c in CLOSE:
+            depth -= 1
+        yield i, c, depth
+        i += 1
+
+
+def matching(text, i):
+    # Index of the bracket closing the one at text[i]
+    for index, c, depth in scan(text, i):
+        if depth == 0 and c in CLOSE:
+            return index
+    return len(text)
+
+
+def statement_end(text, i):
+    for index, c, depth in scan(text, i):
+        if depth == 0 and c == ';' or depth < 0:
+            return index
+    return len(text)
+
+
+def split_top(text):
+    # Comma-separated items of a bracket's contents
+    items = []
+    start = 0
+    for index, c, depth in scan(text, 0):
+        if depth == 0 and c == ',':
+            items.append(text[start:index])
+            start = index + 1
+    items.append(text[start:])
+    return [item.strip() for item in items if item.strip()]
+
+
+def object_entries(literal):
+    # [(key, value text)] of an object literal
+    entries = []
+    for item in split_top(literal.strip()[1:-1]):
+        m = re.match(r'[\'"]?(\w+)[\'"]?\s*:\s*', item)
+        if m:
+            entries.append((m.group(1), item[m.end():]))
+    return entries
+
+
+def constants(text):
+    # const NAME = 24; and const NAME = ['a', 'b']; of a script
+    values = {}
+    for name, value in constant_regex.findall(text):
+        values[name] = int(value) if value.isdigit() else string_regex.findall(value)
+    return values
+
+
+def literal_values(value, known):
+    # The strings or numbers of an argument when the source spells them out
+    value = value.strip()
+    if value in known:
+        return known[value] if isinstance(known[value], list) else [known[value]]
+    if value.startswith('['):
+        strings = string_regex.findall(value)
+        return strings or None
+    m = string_regex.fullmatch(value)
+    if m:
+        return [m.group(1)]
+    if value in ('true', 'false'):
+        return [value == 'true']
+    if re.fullmatch(r'-?\d+(\.\d+)?', value):
+        return [float(value) if '.' in value else int(value)]
+    return None
+
+
+def int_value(value, known, default):
+    values = literal_values(value, known)
+    return values[0] if values and isinstance(values[0], int) else default
+
+
+def or_condition(value):
+    # The .or('a.ilike.x,b.eq.y') filter as one condition
+    terms = tuple((column, op) for column, op in or_filter_regex.findall(value))
+    return ('where', 'or', terms, None) if terms else None
+
+
+def option_parts(key, value, known):
+    # Conditions of one fetchWithFilters option:
+    #   ('where', op, column or ((column, op), ...) for or, literal values)
+    #   ('order', column, descending)
+    #   ('limit', rows)
+    if key in FILTER_OPS:
+        return [('where', key, column, literal_values(argument, known))
+                for column, argument in pair_column_regex.findall(value)]
+    if key == 'or':
+        condition = or_condition(value)
+        return [condition] if condition else []
+    if key == 'order':
+        m = re.match(r'\s*\[\s*[\'"](\w+)[\'"]', value)
+        return [('order', m.group(1), bool(re.search(r'ascending\s*:\s*false', value)))] if m else []
+    if key == 'limit':
+        return [('limit', int_value(value, known, DEFAULT_LIMIT))]
+    if key == 'range':
+        return [('limit', range_rows(split_top(value.strip()[1:-1]), known))]
+    return []
+
+
+def range_rows(bounds, known):
+    if len(bounds) == 2:
+        start, end = (int_value(bound, known, None) for bound in bounds)
+        if start is not None and end is not None:
+            return end - start + 1
+        # from + PAGE_SIZE - 1
+        for name in re.findall(r'\w+', bounds[1]):
+            if isinstance(known.get(name), int) and known[name] > 1:
+                return known[name]
+    return DEFAULT_PAGE_SIZE
+
+
+def chain_parts(chain, known):
+    # Conditions of the .eq() / .order() / ... calls of a supabase-js chain
+    parts = []
+    writes = False
+    for m in method_regex.finditer(chain):
+        method = m.group(1)
+        arguments = split_top(chain[m.end():matching(chain, m.end() - 1)])
+        if method in ('insert', 'upsert'):
+            writes = True
+        elif method in FILTER_OPS and arguments:
+            column = string_regex.fullmatch(arguments[0])
+            if column:
+                values = literal_values(arguments[1], known) if len(arguments) > 1 else None
+                parts.append(('where', method, column.group(1), values))
+        elif method == 'or' and arguments:
+            condition = or_condition(arguments[0])
+            if condition:
+                parts.append(condition)
+        elif method == 'order' and arguments:
+            column = string_regex.fullmatch(arguments[0])
+            if column:
+                descending = len(arguments) > 1 and bool(re.search(r'ascending\s*:\s*false', arguments[1]))
+                parts.append(('order', column.group(1), descending))
+        elif method == 'limit' and arguments:
+            parts.append(('limit', int_value(arguments[0], known, DEFAULT_LIMIT)))
+        elif method == 'range' and len(arguments) == 2:
+            parts.append(('limit', range_rows(arguments, known)))
+    return parts, writes
+
+
+class Shape:
+    def __init__(self, table, where, order, limit, location):
+        self.table = table
+        # [(op, column or or-terms, literal values)]
+        self.where = where
+        # ((column, descending), ...) in the order of the .order() calls
+        self.order = order
+        self.limit = limit
+        self.locations = [location]
+
+    def key(self):
+        return (self.table, tuple(sorted((op, column) for op, column, _ in self.where)), self.order, self.limit)
+
+    def columns(self, ops):
+        return [column for op, column, _ in self.where if op in ops]
+
+    def pattern_columns(self):
+        columns = self.columns(PATTERN_OPS)
+        for op, terms, _ in self.where:
+            if op == 'or':
+                columns.extend(column for column, term_op in terms if term_op in PATTERN_OPS)
+        return columns
+
+    def order_sql(self):
+        return ', '.join(f"{column}{' DESC' if descending else ''}" for column, descending in self.order)
+
+    def describe(self):
+        conditions = []
+        for op, column, _ in self.where:
+            if op == 'or':
+                conditions.append('(' + ' OR '.join(f'{c} {SQL_OPS.get(o, o.upper())}' for c, o in column) + ')')
+            else:
+                conditions.append(f"{column} {SQL_OPS.get(op, op.upper())}")
+        text = self.table
+        if conditions:
+            text += ' WHERE ' + ' AND '.join(conditions)
+        if self.order:
+            text += f" ORDER BY {self.order_sql()}"
+        return text + f' LIMIT {self.limit}'
+
+
+def shapes_of(parts_list, table, location):
+    # One shape per variant; a later limit replaces an earlier one, each
+    # .order() adds a sort key after the previous ones
+    shapes = []
+    for parts in parts_list:
+        where = [(op, column, values) for kind, op, column, values in
+                 (part for part in parts if part[0] == 'where')]
+        orders = {}
+        for part in parts:
+            if part[0] == 'order':
+                orders.setdefault(part[1], part[2])
+        limits = [part[1] for part in parts if part[0] == 'limit']
+        shapes.append(Shape(table, where, tuple(orders.items()),
+                            limits[-1] if limits else DEFAULT_LIMIT, location))
+    return shapes
+
+
+def variants(base, optional):
+    # The parts always sent, then those plus each optional option in turn.
+    # `base` and `optional` are lists of (slot, parts); an optional option
+    # replaces the base parts of the same slot (None: adds to them).
+    always = [(slot, parts) for slot, parts in base]
+    if not any(slot == 'order' for slot, _ in always):
+        # options.order set in every branch of an if/else: the last is the default
+        orders = [parts for slot, parts in optional if slot == 'order']
+        if orders:
+            always.append(('order', orders[-1]))
+    result = [[part for _, parts in always for part in parts]]
+    for slot, parts in optional:
+        kept = [part for s, ps in always if slot is None or s != slot for part in ps]
+        result.append(kept + parts)
+    return result
+
+
+def adapter_shapes(text, m, known, location):
+    open_paren = text.index('(', m.start())
+    arguments = split_top(text[open_paren + 1:matching(text, open_paren)])
+    paginated = m.group(1) == 'Paginated'
+    options = arguments[3] if paginated and len(arguments) > 3 else (arguments[1] if not paginated and len(arguments) > 1 else '{}')
+    base = []
+    optional = []
+    if paginated:
+        page_size = int_value(arguments[2], known, DEFAULT_PAGE_SIZE) if len(arguments) > 2 else DEFAULT_PAGE_SIZE
+        base.append(('limit', [('limit', page_size)]))
+
+    if options.startswith('{'):
+        entries = object_entries(options)
+    else:
+        # const options = {...}; options.in = ...; fetchWithFilters('t', options)
+        entries = []
+        declarations = list(re.finditer(r'\b(?:const|let|var)\s+' + re.escape(options) + r'\s*=\s*\{', text[:m.start()]))
+        if declarations:
+            brace = declarations[-1].end() - 1
+            end = matching(text, brace)
+            entries = object_entries(text[brace:end + 1])
+            for assignment in re.finditer(re.escape(options) + r'\.(\w+)\s*=\s*', text[end:m.start()]):
+                start = end + assignment.end()
+                value = text[start:statement_end(text, start)]
+                optional.append((assignment.group(1), option_parts(assignment.group(1), value, known)))
+    for key, value in entries:
+        base.append((key, option_parts(key, value, known)))
+    return shapes_of(variants(base, optional), m.group(3), location)
+
+
+def chain_shapes(text, m, known, location):
+    end = statement_end(text, m.end())
+    parts, writes = chain_parts(text[m.end():end], known)
+    if writes:
+        return []
+    optional = []
+    # let query = client.from('t')...; if (x) query = query.eq(...); await query
+    head = text[max(0, m.start() - 200):m.start()]
+    target = assigned_chain_regex.search(head[head.rfind(';') + 1:].rstrip())
+    if target:
+        name = re.escape(target.group(1))
+        finish = re.search(r'\bawait\s+' + name + r'\b', text[end:])
+        scope = text[end:end + finish.start()] if finish else ''
+        for update in re.finditer(name + r'\s*=\s*' + name + r'(?=\.)', scope):
+            start = end + update.end()
+            extra, _ = chain_parts(text[start:statement_end(text, start)], known)
+            optional.append((None, extra))
+    return shapes_of(variants([('chain', parts)], optional), m.group(2), location)
+
+
+def extract_shapes(root):
+    shapes = {}
+    for pattern in SOURCES:
+        for path in sorted(glob.glob(os.path.join(root, pattern))):
+            relpath = os.path.relpath(path, root).replace(os.sep, '/')
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            known = constants(text)
+            found = []
+            for m in call_regex.finditer(text):
+                found += adapter_shapes(text, m, known, f'{relpath}:{text.count(chr(10), 0, m.start()) + 1}')
+            for m in from_regex.finditer(text):
+                found += chain_shapes(text, m, known, f'{relpath}:{text.count(chr(10), 0, m.start()) + 1}')
+            for shape in found:
+                if shape.key() in shapes:
+                    if shape.locations[0] not in shapes[shape.key()].locations:
+                        shapes[shape.key()].locations.append(shape.locations[0])
+                else:
+                    shapes[shape.key()] = shape
+    return list(shapes.values())
+
+
+# ---------------------------------------------------------------------------
+# Schema and candidate indexes
+
+class Table:
+    def __init__(self, name, body):
+        self.name = name
+        self.columns = {}
+        self.primary_key = None
+        # B-tree indexes of schema.sql: (name, ((column, descending), ...))
+        self.indexes = []
+        for line in body.split('\n'):
+            m = column_regex.match(line)
+            if m:
+                self.columns[m.group(1)] = m.group(2).strip()
+                if 'PRIMARY KEY' in line:
+                    self.primary_key = m.group(1)
+
+    def ddl(self, schema):
+        columns = ',\n'.join(f'    {name} {kind}' + (' PRIMARY KEY' if name == self.primary_key else '')
+                             for name, kind in self.columns.items())
+        return f'CREATE TABLE {schema}.{self.name} (\n{columns}\n)'
+
+    def index_ddl(self, schema):
+        for name, keys in self.indexes:
+            columns = ', '.join(f"{column}{' DESC' if descending else ''}" for column, descending in keys)
+            yield f'CREATE INDEX {name} ON {schema}.{self.name} ({columns})'
+
+    def covers(self, index):
+        # True if the primary key or an index of schema.sql starts with the
+        # columns of `index`, in the same directions or all reversed (a
+        # B-tree is read both ways)
+        if index.trigram:
+            return False
+        wanted = index.keys()
+        existing = [((self.primary_key, False),)] if self.primary_key else []
+        existing += [keys for _, keys in self.indexes]
+        for keys in existing:
+            prefix = keys[:len(wanted)]
+            if [column for column, _ in prefix] != [column for column, _ in wanted]:
+                continue
+            same = [a == b for (_, a), (_, b) in zip(prefix, wanted)]
+            if all(same) or not any(same):
+                return True
+        return False
+
+
+def read_schema(root):
+    with open(os.path.join(root, SCHEMA_FILE), 'r', encoding='utf-8') as f:
+        text = f.read()
+    tables = {name: Table(name, body) for name, body in table_regex.findall(text)}
+    for name, table, method, columns in schema_index_regex.findall(text):
+        if table in tables and (method or 'btree').lower() == 'btree':
+            keys = tuple((key.split()[0], bool(re.search(r'\bDESC\b', key, re.I)))
+                         for key in split_top(columns) if key.strip())
+            tables[table].indexes.append((name, keys))
+    return tables
+
+
+class Index:
+    def __init__(self, table, columns, trigram=False, descending=()):
+        self.table = table
+        self.columns = tuple(columns)
+        self.trigram = trigram
+        # Columns sorted in descending order (only for sorts mixing directions)
+        self.descending = tuple(descending)
+        self.shapes = []
+
+    def key(self):
+        return (self.table, self.columns, self.trigram, self.descending)
+
+    def keys(self):
+        return tuple((column, column in self.descending) for column in self.columns)
+
+    @property
+    def name(self):
+        return f"idx_{self.table}_{'_'.join(self.columns)}" + ('_trgm' if self.trigram else '')
+
+    def sql(self, schema='public'):
+        if self.trigram:
+            return (f'CREATE INDEX IF NOT EXISTS {self.name} ON {schema}.{self.table} '
+                    f'USING gin ({self.columns[0]} gin_trgm_ops)')
+        columns = ', '.join(f"{column}{' DESC' if descending else ''}" for column, descending in self.keys())
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {schema}.{self.table} ({columns})"
+
+
+def proposed_indexes(shape, tables):
+    table = tables.get(shape.table)
+    primary_key = table.primary_key if table else 'id'
+    equality = list(dict.fromkeys(shape.columns(EQUALITY_OPS)))
+    if primary_key in equality:
+        # Looked up by primary key already
+        return []
+    ranges = shape.columns(RANGE_OPS)
+    indexes = []
+    sorts = [(column, descending) for column, descending in shape.order if column not in equality]
+    trailing = [column for column, _ in sorts] or ranges[:1]
+    # Directions only matter when the sort mixes them
+    descending = [column for column, desc in sorts if desc] if len({desc for _, desc in sorts}) > 1 else []
+    if equality or trailing:
+        indexes.append(Index(shape.table, equality + trailing, descending=descending))
+    if sorts and ranges and ranges[0] not in equality and ranges[0] != sorts[0][0]:
+        # Whichever is more selective: the planner picks
+        indexes.append(Index(shape.table, equality + [ranges[0]]))
+    for column in dict.fromkeys(shape.pattern_columns()):
+        indexes.append(Index(shape.table, [column], trigram=True))
+    if table:
+        indexes = [index for index in indexes if all(column in table.columns for column in index.columns)
+                   and not table.covers(index)]
+    return indexes
+
+
+def candidate_indexes(shapes, tables):
+    candidates = {}
+    for shape in shapes:
+        for index in proposed_indexes(shape, tables):
+            candidates.setdefault(index.key(), index).shapes.append(shape)
+    indexes = list(candidates.values())
+    # A B-tree that is a prefix of another one on the same table is redundant
+    redundant = set()
+    for index in indexes:
+        for other in indexes:
+            if (other is not index and not index.trigram and not other.trigram and index.table == other.table
+                    and len(index.columns) < len(other.columns)
+                    and other.keys()[:len(index.columns)] == index.keys()):
+                other.shapes.extend(shape for shape in index.shapes if shape not in other.shapes)
+                redundant.add(index.key())
+    return [index for index in indexes if index.key() not in redundant]
+
+
+# ---------------------------------------------------------------------------
+# Synthetic data and EXPLAIN
+
+CATEGORIES = ['Électronique', 'Mode', 'Maison', 'Beauté', 'Sport', 'Alimentation',
+              'Informatique', 'Téléphones', 'Jouets', 'Auto', 'Livres', 'Santé']
+WORDS = ['chaise', 'lampe', 'robe', 'montre', 'sac', 'chaussure', 'table', 'casque', 'tapis', 'veste',
+         'ordinateur', 'téléphone', 'parfum', 'savon', 'ballon', 'vélo', 'livre', 'jouet', 'miroir', 'pagne',
+         'radio', 'chargeur', 'câble', 'bouilloire', 'mixeur', 'ventilateur', 'moustiquaire', 'panier', 'bol', 'tasse']
+STATUSES = ['En attente', 'Confirmé', 'Expédié', 'Livré', 'Annulé']
+
+
+def sql_array(values):
+    return 'ARRAY[' + ', '.join("'" + value.replace("'", "''") + "'" for value in values) + ']'
+
+
+def pick(values, expression):
+    return f'({sql_array(values)})[1 + ({expression}) % {len(values)}]'
+
+
+# Columns whose values matter for the plans: a few distinct values, names
+# that can be searched, a small share of sellers
+SYNTHETIC = {
+    'name': f"{pick(WORDS, 'g')} || ' ' || {pick(WORDS, 'g / 30')} || ' ' || (g % 997)",
+    'category': pick(CATEGORIES, '(random() * 1000)::int'),
+    'email': "'user' || g || '@example.com'",
+    'customer_email': "'user' || (g % 5000) || '@example.com'",
+    'supplier_email': "'user' || (g % 200) || '@example.com'",
+    'role': "CASE WHEN g % 25 = 0 THEN 'vendor' WHEN g % 100 = 1 THEN 'supplier' ELSE 'customer' END",
+    'status': pick(STATUSES, '(random() * 100)::int'),
+    'is_new': 'random() < 0.2',
+    'is_promo': 'random() < 0.1',
+}
+SYNTHETIC_TYPES = {
+    'TEXT': 'md5(g::text)',
+    'NUMERIC': 'round((random() * 500)::numeric, 2)',
+    'INTEGER': '(random() * 200)::int',
+    'BOOLEAN': 'random() < 0.5',
+    'JSONB': "'[]'::jsonb",
+    'TIMESTAMP WITH TIME ZONE': "now() - random() * interval '730 days'",
+}
+
+
+def synthetic_insert(table, schema, rows):
+    expressions = []
+    for column, kind in table.columns.items():
+        if column == table.primary_key:
+            expressions.append(f"'{table.name}-' || g")
+        else:
+            expressions.append(SYNTHETIC.get(column) or SYNTHETIC_TYPES.get(kind, 'NULL'))
+    return (f"INSERT INTO {schema}.{table.name} ({', '.join(table.columns)}) "
+            f"SELECT {', '.join(expressions)} FROM generate_series(1, {int(rows)}) AS g")
+
+
+def parameters(connection, shape, schema):
+    # Values for the filters: the ones in the source, or taken from the data
+    def sample(column, count):
+        rows = connection.execute(f'SELECT {column} FROM {schema}.{shape.table} '
+                                  f'WHERE {column} IS NOT NULL ORDER BY random() LIMIT %s', [count]).fetchall()
+        return [row[0] for row in rows]
+
+    def percentile(column, fraction):
+        return connection.execute(f'SELECT percentile_disc(%s) WITHIN GROUP (ORDER BY {column}) '
+                                  f'FROM {schema}.{shape.table}', [fraction]).fetchone()[0]
+
+    def pattern(column):
+        values = sample(column, 1)
+        text = str(values[0]) if values else ''
+        word = max(re.findall(r'\w+', text) or [text], key=len)
+        return f'%{word[:4]}%'
+
+    conditions = []
+    params = []
+    for op, column, values in shape.where:
+        if op == 'or':
+            terms = []
+            for term_column, term_op in column:
+                if term_op in PATTERN_OPS:
+                    terms.append(f'{term_column} {SQL_OPS[term_op]} %s')
+                    params.append(pattern(term_column))
+                else:
+                    terms.append(f'{term_column} {SQL_OPS.get(term_op, "=")} %s')
+                    params.append(sample(term_column, 1)[0])
+            conditions.append('(' + ' OR '.join(terms) + ')')
+        elif op == 'in':
+            values = values or sample(column, 3)
+            conditions.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+        elif op in PATTERN_OPS:
+            conditions.append(f'{column} {SQL_OPS[op]} %s')
+            params.append(pattern(column))
+        elif op in RANGE_OPS:
+            conditions.append(f'{column} {SQL_OPS[op]} %s')
+            # A tenth of the rows: the recent ones, the expensive ones...
+            params.append(percentile(column, 0.9 if op in ('gte', 'gt') else 0.1))
+        else:
+            conditions.append(f'{column} {SQL_OPS[op]} %s')
+            params.append(values[0] if values else sample(column, 1)[0])
+    sql = f'SELECT * FROM {schema}.{shape.table}'
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    if shape.order:
+        sql += f" ORDER BY {shape.order_sql()}"
+    return sql + f' LIMIT {shape.limit}', params
+
+
+def scans(plan):
+    # "Index Scan using idx_x", "Seq Scan"... of a plan tree
+    found = []
+    if 'Scan' in plan['Node Type']:
+        found.append(plan['Node Type'] + (f" using {plan['Index Name']}" if 'Index Name' in plan else ''))
+    for child in plan.get('Plans', []):
+        found += scans(child)
+    return found
+
+
+def explain(connection, sql, params):
+    # Median execution time (ms) of REPEAT runs and the scans of the plan
+    times = []
+    plan = None
+    for _ in range(REPEAT):
+        result = connection.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params).fetchone()[0][0]
+        times.append(result['Execution Time'])
+        plan = result['Plan']
+    return statistics.median(times), scans(plan)
+
+
+def measure(dsn, shapes, indexes, tables, scales):
+    if psycopg is None:
+        raise SystemExit("Running the queries needs psycopg: pip install psycopg")
+    schema = SCRATCH_SCHEMA
+    connection = psycopg.connect(dsn, autocommit=True)
+    results = []
+    try:
+        connection.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        connection.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        connection.execute(f'CREATE SCHEMA {schema}')
+        used = {shape.table for shape in shapes}
+        for table in tables.values():
+            if table.name in used:
+                connection.execute(table.ddl(schema))
+                for ddl in table.index_ddl(schema):
+                    connection.execute(ddl)
+        for rows in scales:
+            started = time.perf_counter()
+            for table in tables.values():
+                if table.name in used:
+                    connection.execute(f'TRUNCATE {schema}.{table.name}')
+                    connection.execute(synthetic_insert(table, schema, rows))
+                    connection.execute(f'ANALYZE {schema}.{table.name}')
+            print(f'{rows} row(s) per table loaded in {time.perf_counter() - started:.1f}s')
+
+            queries = [(shape, *parameters(connection, shape, schema)) for shape in shapes]
+            before = [explain(connection, sql, params) for _, sql, params in queries]
+            for index in indexes:
+                connection.execute(index.sql(schema))
+            for table in {index.table for index in indexes}:
+                connection.execute(f'ANALYZE {schema}.{table}')
+            after = [explain(connection, sql, params) for _, sql, params in queries]
+            for index in indexes:
+                connection.execute(f'DROP INDEX {schema}.{index.name}')
+            for (shape, _, _), (before_ms, before_plan), (after_ms, after_plan) in zip(queries, before, after):
+                results.append({'shape': shape, 'rows': rows, 'before': before_ms, 'after': after_ms,
+                                'plan_before': before_plan, 'plan_after': after_plan})
+    finally:
+        connection.execute(f'DROP SCHEMA IF EXISTS {schema} CASCADE')
+        connection.close()
+    return results
+
+
+def useful_indexes(indexes, results):
+    # Indexes a faster query used at the largest scale
+    largest = max(result['rows'] for result in results)
+    used = set()
+    for result in results:
+        if result['rows'] == largest and result['after'] <= result['before'] * GAIN:
+            used.update(plan.split(' using ')[1] for plan in result['plan_after'] if ' using ' in plan)
+    return [index for index in indexes if index.name in used]
+
+
+# ---------------------------------------------------------------------------
+# Report and migration
+
+def print_shapes(shapes, tables):
+    print(f'{len(shapes)} query shape(s):')
+    for shape in sorted(shapes, key=lambda s: (s.table, s.describe())):
+        note = '' if shape.table in tables else '  (table not in schema.sql)'
+        print(f'  {shape.describe()}{note}')
+        print(f"      {', '.join(shape.locations)}")
+
+
+def print_results(results):
+    width = max(len(result['shape'].describe()) for result in results)
+    print(f"{'Query':<{width}}  {'rows':>8}  {'before':>10}  {'after':>10}  plan after")
+    for result in results:
+        plan = ', '.join(dict.fromkeys(result['plan_after'])) or '-'
+        print(f"{result['shape'].describe():<{width}}  {result['rows']:>8}  "
+              f"{result['before']:>8.2f}ms  {result['after']:>8.2f}ms  {plan}")
+
+
+def migration_text(indexes, results=None):
+    lines = ['-- Indexes for the filters and sorts of the front-end queries.',
+             '-- Generated by scripts/index_advisor.py' + ('' if results else ' (not measured: no --dsn)') + '.',
+             '']
+    if any(index.trigram for index in indexes):
+        lines += ['-- ilike \'%...%\' searches', 'CREATE EXTENSION IF NOT EXISTS pg_trgm;', '']
+    largest = max((result['rows'] for result in results), default=None) if results else None
+    for index in indexes:
+        for shape in index.shapes:
+            comment = f'-- {shape.describe()}'
+            for result in results or []:
+                if result['shape'] is shape and result['rows'] == largest:
+                    comment += f" ({result['before']:.2f}ms -> {result['after']:.2f}ms at {largest} rows)"
+            lines.append(comment)
+        lines += [index.sql() + ';', '']
+    return '\n'.join(lines)
+
+
+def write_migration(path, text):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    print(f'Migration written to {path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Propose indexes for the query shapes of the front-end.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--dsn', help='postgresql:// URL of a scratch database to run EXPLAIN ANALYZE on')
+    parser.add_argument('--rows', type=int, nargs='+', default=list(SCALES), metavar='N',
+                        help=f"rows per table (default: {' '.join(map(str, SCALES))})")
+    parser.add_argument('--migration', metavar='FILE',
+                        help=f'where to write the migration (default with --dsn: {MIGRATIONS_DIR}/<time>_query_indexes.sql)')
+    args = parser.parse_args()
+
+    tables = read_schema(args.root)
+    shapes = extract_shapes(args.root)
+    print_shapes(shapes, tables)
+    indexes = candidate_indexes([shape for shape in shapes if shape.table in tables], tables)
+    other = sorted({shape.table for shape in shapes} - set(tables))
+    if other:
+        print(f"Not in {SCHEMA_FILE} (no data to test on): {', '.join(other)}")
+
+    if not args.dsn:
+        print()
+        print(migration_text(indexes))
+        if args.migration:
+            write_migration(args.migration, migration_text(indexes))
+        else:
+            print('Run with --dsn to measure these indexes and write the ones that help as a migration.')
+        raise SystemExit(0)
+
+    results = measure(args.dsn, [shape for shape in shapes if shape.table in tables], indexes, tables, args.rows)
+    print()
+    print_results(results)
+    kept = useful_indexes(indexes, results)
+    dropped = [index.name for index in indexes if index not in kept]
+    if dropped:
+        print(f"Not used or not faster: {', '.join(dropped)}")
+    if not kept:
+        print('No index to add.')
+        raise SystemExit(0)
+    path = args.migration or os.path.join(args.root, MIGRATIONS_DIR,
+                                          time.strftime('%Y%m%d%H%M%S', time.gmtime()) + '_query_indexes.sql')
+    write_migration(path, migration_text(kept, results))
@@ -0,0 +1,165 @@
+import re
+
+# Conservative JavaScript minifier for the bundles.
+# Drops comments, indentation, trailing spaces and blank lines, and collapses
+# runs of spaces to one. Line breaks are kept, so automatic semicolon
+# insertion sees the same code, and strings, template literals (including
+# the HTML of components-loader.js) and regex literals are copied verbatim.
+
+# After these tokens a '/' starts a regex literal, otherwise it is a division
+REGEX_PREFIX_CHARS = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_PREFIX_WORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void',
+    'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+word_regex = re.compile(r'[A-Za-z0-9_$\u0080-￿]+')
+
+
+def _read_string(source, i):
+    quote = source[i]
+    j = i + 1
+    while j < len(source):
+        c = source[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == quote or c == '\n':
+            return j + 1
+        j += 1
+    return j
+
+
+def _read_template(source, i):
+    # From just after '`' or '}' to the end of the literal or of the next '${'
+    j = i
+    while j < len(source):
+        c = source[j]
+        if c == '\\':
+            j += 2
+            continue
+        if c == '`':
+            return j + 1, False
+        if c == '$' and source.startswith('${', j):
+            return j + 2, True
+        j += 1
+    return j, False
+
+
+def _read_regex(source, i):
+    # Returns None when this '/' cannot start a regex on this line
+    j = i + 1
+    in_class = False
+    while j < len(source):
+        c = source[j]
+        if c == '\n':
+            return None
+        if c == '\\':
+            j += 2
+            continue
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            j += 1
+            while j < len(source) and (source[j].isalnum() or source[j] == '_'):
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def minify(source):
+    out = []
+    braces = []          # 'template' for the '{' of a '${', else 'block'
+    regex_allowed = True
+    i = 0
+    n = len(source)
+
+    def emit_space():
+        if out and out[-1] not in (' ', '\n'):
+            out.append(' ')
+
+    while i < n:
+        c = source[i]
+
+        if c in ' \t\f\v\r ﻿':
+            i += 1
+            emit_space()
+            continue
+
+        if c == '\n':
+            while out and out[-1] == ' ':
+                out.pop()
+            if out and out[-1] != '\n':
+                out.append('\n')
+            i += 1
+            continue
+
+        if c == '/' and i + 1 < n and source[i + 1] == '/':
+            end = source.find('\n', i)
+            i = n if end == -1 else end
+            continue
+
+        if c == '/' and i + 1 < n and source[i + 1] == '*':
+            end = source.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            # A comment spanning lines still separates statements for ASI
+            if '\n' in source[i:end]:
+                while out and out[-1] == ' ':
+                    out.pop()
+                if out and out[-1] != '\n':
+                    out.append('\n')
+            else:
+                emit_space()
+            i = end
+            continue
+
+        if c in '"\'':
+            end = _read_string(source, i)
+            out.append(source[i:end])
+            i = end
+            regex_allowed = False
+            continue
+
+        if c == '`' or (c == '}' and braces and braces[-1] == 'template'):
+            if c == '}':
+                braces.pop()
+            end, expression = _read_template(source, i + 1)
+            out.append(source[i:end])
+            i = end
+            if expression:
+                braces.append('template')
+                regex_allowed = True
+            else:
+                regex_allowed = False
+            continue
+
+        if c == '/' and regex_allowed:
+            end = _read_regex(source, i)
+            if end is not None:
+                out.append(source[i:end])
+                i = end
+                regex_allowed = False
+                continue
+
+        match = word_regex.match(source, i)
+        if match:
+            word = match.group(0)
+            out.append(word)
+            i = match.end()
+            regex_allowed = word in REGEX_PREFIX_WORDS
+            continue
+
+        if c == '{':
+            braces.append('block')
+        elif c == '}':
+            if braces:
+                braces.pop()
+        out.append(c)
+        i += 1
+        # ')' and ']' end an expression; '}' usually ends a block
+        regex_allowed = c in REGEX_PREFIX_CHARS or c == '}'
+
+    return ''.join(out).strip('\n ') + '\n'
@@ -0,0 +1,298 @@
+import re
+from collections import deque
+
+# Single-scan matchers for the (old, new) replacement tables.
+# Applying a table with one str.replace per pair rescans the page once per
+# rule. That chain is still the fastest way for a few rules: str.replace
+# runs in C, while a single scan pays per match (or per character) in
+# Python. Timed on index.html x 5, the chain wins below SCAN_MIN_RULES
+# rules; from there one compiled alternation of the patterns, with a dict
+# lookup of the replacement, is faster; from AUTOMATON_MIN_RULES an
+# Aho-Corasick automaton, whose cost no longer depends on the rule count,
+# is faster still.
+#
+# A single scan only gives the same result as the sequential str.replace
+# chain when the rules cannot affect each other (no old string overlapping
+# another one, no replacement producing a later rule's input). Tables that
+# fail that check are applied sequentially instead, and `reason` says why.
+#
+# ChainMatcher gives a table explicit semantics when its rules feed each
+# other (h-24 -> h-20, then h-20 -> h-16):
+#   sequential    each rule sees the output of the rules before it, as the
+#                 str.replace chain did; the table is cut into the fewest
+#                 runs of consecutive rules that can share one scan
+#   simultaneous  one scan of the original text, replacements are not
+#                 matched again
+#   fixpoint      scans again while a replacement can have created a match,
+#                 so the result no longer changes when the table is rerun;
+#                 a table whose rules feed each other in a cycle (a -> b,
+#                 b -> a) may never settle and is refused
+# The last two need patterns that do not overlap each other.
+
+MODES = ('sequential', 'simultaneous', 'fixpoint')
+# Rules from which a table is matched in one scan rather than by the
+# str.replace chain, and from which that scan uses the automaton
+SCAN_MIN_RULES = 16
+AUTOMATON_MIN_RULES = 128
+
+
+def _overlaps(a, b):
+    # True if a suffix of `a` is a prefix of `b` (proper, non-empty)
+    for k in range(1, min(len(a), len(b))):
+        if a[-k:] == b[:k]:
+            return True
+    return False
+
+
+def can_create(new, old):
+    # True if writing `new` into a page can produce a match for `old` that
+    # was not there: inside `new` or across its edges
+    if not new:
+        # Deleting text joins its neighbours, which may spell the pattern
+        return len(old) > 1
+    return old in new or new in old or _overlaps(new, old) or _overlaps(old, new)
+
+
+def find_conflict(table):
+    # Why the patterns cannot be matched in one scan, or None
+    olds = [old for old, _ in table]
+    for i, a in enumerate(olds):
+        if not a:
+            return f"rule {i} has an empty pattern"
+        for j, b in enumerate(olds):
+            if i == j:
+                continue
+            if a == b:
+                return f"rules {i} and {j} share the same pattern"
+            if a in b:
+                return f"pattern {i} is contained in pattern {j}"
+            if _overlaps(a, b):
+                return f"pattern {i} overlaps pattern {j}"
+    return None
+
+
+def find_interaction(table):
+    reason = find_conflict(table)
+    if reason:
+        return reason
+    for i, (_, new) in enumerate(table):
+        for j in range(i + 1, len(table)):
+            if can_create(new, table[j][0]):
+                return f"replacement {i} can create a match for rule {j}"
+    return None
+
+
+def feeds(table):
+    # {i: rules whose pattern the replacement of rule i can create}
+    return {i: [j for j, (old, _) in enumerate(table) if can_create(new, old)] for i, (_, new) in enumerate(table)}
+
+
+def find_cycle(graph):
+    # A list of nodes [a, b, ..., a] following the edges of graph, or None
+    state = {}
+    path = []
+
+    def visit(node):
+        state[node] = 'open'
+        path.append(node)
+        for nxt in graph.get(node, ()):
+            if state.get(nxt) == 'open':
+                return path[path.index(nxt):] + [nxt]
+            if nxt not in state:
+                cycle = visit(nxt)
+                if cycle:
+                    return cycle
+        state[node] = 'done'
+        path.pop()
+        return None
+
+    for node in graph:
+        if node not in state:
+            cycle = visit(node)
+            if cycle:
+                return cycle
+    return None
+
+
+def sequential_passes(table):
+    # The table cut into the fewest runs of consecutive rules that a single
+    # scan applies like the str.replace chain would
+    groups = []
+    for pair in table:
+        if groups and not find_interaction(groups[-1] + [pair]):
+            groups[-1].append(pair)
+        else:
+            groups.append([pair])
+    return groups
+
+
+class LiteralMatcher:
+    def __init__(self, table, simultaneous=False):
+        # simultaneous: the replacements are not matched again, only the
+        # patterns have to be independent
+        self.table = [(old, new) for old, new in table]
+        self.reason = find_conflict(self.table) if simultaneous else find_interaction(self.table)
+        # Small tables keep the chain, as long as it gives the result of a
+        # single scan: without a rule feeding a later one
+        small = len(self.table) < SCAN_MIN_RULES and \
+            (not simultaneous or find_interaction(self.table) is None)
+        self.sequential = self.reason is not None or not self.table or small
+        self.automaton = not self.sequential and len(self.table) >= AUTOMATON_MIN_RULES
+        if self.automaton:
+            self._build()
+        elif not self.sequential:
+            # Patterns never contain each other here, so at most one of them
+            # matches at a given position and the alternation's order is moot
+            self.index = {old: index for index, (old, _) in enumerate(self.table)}
+            self.regex = re.compile('|'.join(re.escape(old) for old, _ in self.table))
+
+    @property
+    def scans(self):
+        # Passes over the text per replace()
+        return len(self.table) if self.sequential else 1
+
+    def _build(self):
+        # goto[state] maps a character to the next state; out[state] is the
+        # rule whose pattern ends at this state (patterns never contain each
+        # other here, so there is at most one).
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [-1]
+        for index, (old, _) in enumerate(self.table):
+            state = 0
+            for char in old:
+                nxt = self.goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(-1)
+                    self.goto[state][char] = nxt
+                state = nxt
+            self.out[state] = index
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[nxt] = self.goto[fallback].get(char, 0)
+
+        # Jump straight to the next character that can start a pattern while
+        # the automaton sits in its root state
+        self.first_chars = re.compile('[' + ''.join(re.escape(c) for c in self.goto[0]) + ']')
+
+    def _matches(self, text):
+        state = 0
+        pos = 0
+        end = len(text)
+        goto, fail, out = self.goto, self.fail, self.out
+        while pos < end:
+            if state == 0:
+                hit = self.first_chars.search(text, pos)
+                if hit is None:
+                    return
+                pos = hit.start()
+            char = text[pos]
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            pos += 1
+            # Patterns never overlap each other, so the first complete match
+            # is final; the state after it is the root again.
+            probe = state
+            while probe:
+                if out[probe] != -1:
+                    index = out[probe]
+                    yield pos - len(self.table[index][0]), index
+                    state = 0
+                    break
+                probe = fail[probe]
+
+    def replace(self, text):
+        counts = [0] * len(self.table)
+        if self.sequential:
+            for index, (old, new) in enumerate(self.table):
+                counts[index] = text.count(old)
+                if counts[index]:
+                    text = text.replace(old, new)
+            return text, counts
+
+        if not self.automaton:
+            def replacement(match):
+                index = self.index[match.group()]
+                counts[index] += 1
+                return self.table[index][1]
+            return self.regex.sub(replacement, text), counts
+
+        parts = []
+        last = 0
+        for start, index in self._matches(text):
+            old, new = self.table[index]
+            parts.append(text[last:start])
+            parts.append(new)
+            last = start + len(old)
+            counts[index] += 1
+        if not parts:
+            return text, counts
+        parts.append(text[last:])
+        return ''.join(parts), counts
+
+
+class ChainMatcher:
+    def __init__(self, table, mode='sequential'):
+        if mode not in MODES:
+            raise ValueError(f"unknown mode {mode!r}, expected one of {', '.join(MODES)}")
+        self.table = [(old, new) for old, new in table]
+        self.mode = mode
+        if mode == 'sequential':
+            if len(self.table) < SCAN_MIN_RULES:
+                # The chain is the sequential semantics, and the fastest here
+                self.passes = [(0, LiteralMatcher(self.table))]
+                return
+            self.passes = []
+            offset = 0
+            for group in sequential_passes(self.table):
+                self.passes.append((offset, LiteralMatcher(group)))
+                offset += len(group)
+            return
+
+        reason = find_conflict(self.table)
+        if reason:
+            raise ValueError(f"{mode} rules need independent patterns: {reason}")
+        self.feeds = feeds(self.table)
+        if mode == 'fixpoint':
+            cycle = find_cycle(self.feeds)
+            if cycle:
+                raise ValueError(f"rules {' -> '.join(map(str, cycle))} feed each other and may never converge")
+        self.passes = [(0, LiteralMatcher(self.table, simultaneous=True))]
+
+    def replace(self, text):
+        # (text, matches per rule, scans done)
+        counts = [0] * len(self.table)
+        scans = 0
+        if self.mode == 'sequential':
+            for offset, matcher in self.passes:
+                text, group_counts = matcher.replace(text)
+                scans += matcher.scans
+                for index, count in enumerate(group_counts):
+                    counts[offset + index] += count
+            return text, counts, scans
+
+        matcher = self.passes[0][1]
+        # Acyclic feeds: each scan can only enable rules further down a
+        # chain, so there are at most len(table) + 1 scans
+        for _ in range(len(self.table) + 1):
+            text, scan_counts = matcher.replace(text)
+            scans += matcher.scans
+            for index, count in enumerate(scan_counts):
+                counts[index] += count
+            if self.mode == 'simultaneous':
+                break
+            # Scan again only if a replacement made can have created a match
+            if not any(self.feeds[index] for index, count in enumerate(scan_counts) if count):
+                break
+        return text, counts, scans
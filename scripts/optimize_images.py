@@ -0,0 +1,227 @@
+import json
+import os
+import posixpath
+import re
+from urllib.parse import unquote
+
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import Pipeline, Rule, RuleSet, build_parser, run_from_args
+
+# Responsive image build.
+# Every JPEG/PNG/WebP of Images/ is re-encoded to WebP (and AVIF when the
+# installed Pillow can write it) at the breakpoints below, without EXIF/XMP
+# metadata, into Images/optimized/. variants.json lists what was produced;
+# the ResponsiveImages rule then rewrites the <img> tags that point at an
+# original so the browser picks a variant through srcset/sizes, with the
+# intrinsic width/height set to avoid layout shifts:
+#
+#   <picture data-responsive class="contents"><source type="image/avif" srcset="..." sizes="...">
+#   <img data-responsive src="Images/x.jpg" srcset="...webp 320w, ..." sizes="..." width="..." height="..."></picture>
+#
+# `contents` keeps <picture> out of the layout, so w-full/h-full on the
+# image still refer to its container. The original stays as src, for
+# browsers without WebP. Only the build
+# needs Pillow; rewriting pages from an existing variants.json does not.
+
+SOURCE_DIR = 'Images'
+OUTPUT_DIR = 'Images/optimized'
+VARIANTS_NAME = 'variants.json'
+
+SOURCE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+WIDTHS = (160, 320, 640, 960, 1280, 1920)
+
+# (extension, Pillow format name, encoder options), in order of preference
+FORMATS = [
+    ('avif', 'AVIF', {'quality': 50}),
+    ('webp', 'WEBP', {'quality': 78, 'method': 6}),
+]
+
+# Rendered width of each image, for the sizes attribute of its tags
+DEFAULT_SIZES = '100vw'
+SIZES = {
+    'Logo NewKet V2.jpeg': '96px',
+    'marketplace-hero.jpg': '(min-width: 1024px) 50vw, 100vw',
+}
+
+slug_regex = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def load_pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise SystemExit("Pillow is required to build the image variants: pip install Pillow "
+                         "(add pillow-avif-plugin for AVIF output)")
+    try:
+        import pillow_avif  # noqa: F401  (registers AVIF on older Pillow versions)
+    except ImportError:
+        pass
+    Image.init()
+    return Image, ImageOps
+
+
+def variant_stem(relpath):
+    # srcset entries are separated by spaces and commas: keep them out of file names
+    stem = os.path.splitext(os.path.basename(relpath))[0]
+    return slug_regex.sub('-', stem).strip('-')
+
+
+def breakpoints(width):
+    widths = [w for w in WIDTHS if w < width]
+    widths.append(min(width, WIDTHS[-1]))
+    return widths
+
+
+def find_sources(root):
+    sources = []
+    directory = os.path.join(root, SOURCE_DIR)
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith(SOURCE_EXTENSIONS) and os.path.isfile(os.path.join(directory, filename)):
+            sources.append(f'{SOURCE_DIR}/{filename}')
+    return sources
+
+
+def encode(Image, ImageOps, path, outputs):
+    with Image.open(path) as im:
+        # Apply the EXIF rotation before the EXIF block is dropped
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ('RGB', 'RGBA'):
+            im = im.convert('RGBA' if 'A' in im.getbands() or 'transparency' in im.info else 'RGB')
+        for width, fmt, options, out_path in outputs:
+            height = max(1, round(im.height * width / im.width))
+            resized = im if width == im.width else im.resize((width, height), Image.LANCZOS)
+            # No exif/xmp/icc passed to save(): the variants carry pixels only
+            resized.save(out_path, fmt, **options)
+
+
+def build_variants(root, force=False):
+    Image, ImageOps = load_pillow()
+    formats = [f for f in FORMATS if f[1] in Image.SAVE]
+    os.makedirs(os.path.join(root, OUTPUT_DIR), exist_ok=True)
+
+    variants = {}
+    for relpath in find_sources(root):
+        path = os.path.join(root, relpath)
+        with Image.open(path) as im:
+            width, height = ImageOps.exif_transpose(im).size
+
+        entry = {'width': width, 'height': height, 'bytes': os.path.getsize(path), 'formats': {}}
+        outputs = []
+        source_mtime = os.stat(path).st_mtime_ns
+        for ext, fmt, options in formats:
+            files = entry['formats'][ext] = []
+            for w in breakpoints(width):
+                out_relpath = f'{OUTPUT_DIR}/{variant_stem(relpath)}-{w}.{ext}'
+                out_path = os.path.join(root, out_relpath)
+                files.append([w, out_relpath])
+                if force or not os.path.exists(out_path) or os.stat(out_path).st_mtime_ns < source_mtime:
+                    outputs.append((w, fmt, options, out_path))
+        if outputs:
+            encode(Image, ImageOps, path, outputs)
+        for files in entry['formats'].values():
+            for item in files:
+                item.append(os.path.getsize(os.path.join(root, item[1])))
+        variants[relpath] = entry
+
+    with open(os.path.join(root, OUTPUT_DIR, VARIANTS_NAME), 'w', encoding='utf-8') as f:
+        json.dump(variants, f, indent=1, sort_keys=True)
+    return variants
+
+
+def print_savings(variants):
+    # Full-width variant of the lightest format against the original
+    total_before = total_after = 0
+    print(f"{'image':<60} {'original':>10} {'optimized':>10} {'saved':>7}")
+    for relpath, entry in sorted(variants.items()):
+        sizes = [files[-1][2] for files in entry['formats'].values() if files]
+        before = entry['bytes']
+        if not sizes or not before:
+            # No format could be written (or an empty file): nothing saved
+            print(f"{relpath[:60]:<60} {before:>10} {'-':>10} {'-':>7}")
+            continue
+        best = min(sizes)
+        total_before += before
+        total_after += min(best, before)
+        print(f"{relpath[:60]:<60} {before:>10} {best:>10} {100 - 100 * best / before:>6.1f}%")
+    if total_before:
+        print(f"{'total':<60} {total_before:>10} {total_after:>10} "
+              f"{100 - 100 * total_after / total_before:>6.1f}%")
+
+
+def tag_with_attrs(index, element, values):
+    # The element's start tag with the given attributes set
+    tag = HtmlIndex(index.source(element))
+    splicer = Splicer(tag)
+    for name, value in values.items():
+        splicer.set_attr(tag.root.first_child_element(), name, value)
+    return splicer.apply()
+
+
+class ResponsiveImages(Rule):
+    def __init__(self, name='responsive_images', pages=None):
+        super().__init__(name, pages)
+        self.variants = {}
+
+    def prepare(self, root):
+        path = os.path.join(root, OUTPUT_DIR, VARIANTS_NAME)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.variants = json.load(f)
+
+    def inputs(self):
+        return [f'{OUTPUT_DIR}/{VARIANTS_NAME}']
+
+    def apply(self, content, page):
+        if not self.variants:
+            return content
+        index = HtmlIndex(content)
+        splicer = Splicer(index)
+        page_dir = posixpath.dirname(page.relpath) or '.'
+        for img in index.find('img'):
+            src = img.attrs.get('src', '')
+            if '${' in src or '://' in src:
+                continue
+            entry = self.variants.get(posixpath.normpath(posixpath.join(page_dir, unquote(src))))
+            if entry is None or 'webp' not in entry['formats']:
+                continue
+
+            def srcset(ext):
+                return ', '.join(f"{posixpath.relpath(path, page_dir)} {w}w"
+                                 for w, path, size in entry['formats'][ext])
+
+            # Tags marked data-responsive were written by this rule; on the
+            # others, sizes and dimensions chosen by the page author win
+            owned = 'data-responsive' in img.attrs
+            sizes = SIZES.get(posixpath.basename(unquote(src)), DEFAULT_SIZES)
+            if not owned and img.attrs.get('sizes'):
+                sizes = img.attrs['sizes']
+            values = {'srcset': srcset('webp'), 'sizes': sizes, 'data-responsive': ''}
+            if owned or ('width' not in img.attrs and 'height' not in img.attrs):
+                values.update(width=str(entry['width']), height=str(entry['height']))
+            html = tag_with_attrs(index, img, values)
+
+            picture = img.parent
+            rebuilt = picture.tag == 'picture' and 'data-responsive' in picture.attrs
+            if 'avif' in entry['formats']:
+                html = (f'<picture data-responsive class="contents"><source type="image/avif" srcset="{srcset("avif")}" '
+                        f'sizes="{sizes}">{html}</picture>')
+            splicer.replace(picture if rebuilt else img, html)
+            page.hit(self.name)
+        return splicer.apply()
+
+    def describe(self):
+        return super().describe() + [self.variants, SIZES, DEFAULT_SIZES]
+
+
+RULES = RuleSet('optimize_images', [ResponsiveImages()], pages=['*.html', 'admin/*.html'])
+
+if __name__ == '__main__':
+    parser = build_parser('Build responsive WebP/AVIF variants of Images/ and point the <img> tags at them.')
+    parser.add_argument('--skip-build', action='store_true',
+                        help='only rewrite the pages from the existing variants.json')
+    parser.add_argument('--force', action='store_true', help='re-encode every variant')
+    args = parser.parse_args()
+
+    if not args.skip_build:
+        print_savings(build_variants(args.root, args.force))
+    run_from_args(Pipeline([RULES]), args)
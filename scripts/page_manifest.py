@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+import time
+
+# Persistent record of the pages a rule set has already been applied to.
+# For each pipeline fingerprint it stores the content hash of every page as
+# it was left by the last run (plus size and mtime, so a page that was not
+# touched is recognised from os.stat alone). A rerun skips a page when both
+# its hash and the fingerprint of the rules match.
+#
+# Each run only keeps the pages it found for its fingerprint, and the
+# fingerprints are dropped once MAX_FINGERPRINTS more recently used ones
+# exist (rules edited since, scripts no longer run), so the file does not
+# grow with every change of the rules.
+
+MANIFEST_NAME = '.rewrite-manifest.json'
+# Rule sets whose pages are remembered, the least recently run dropped first
+MAX_FINGERPRINTS = 32
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PageManifest:
+    def __init__(self, path):
+        self.path = path
+        # fingerprint -> relpath -> entry
+        self.entries = {}
+        # fingerprint -> time of its last run
+        self.used = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if 'pages' in data:
+                self.entries = data['pages']
+                self.used = data['used']
+            else:
+                # Written before the fingerprints were dated
+                self.entries = data
+                self.used = dict.fromkeys(data, 0)
+
+    @classmethod
+    def for_root(cls, root):
+        return cls(os.path.join(root, MANIFEST_NAME))
+
+    def is_fresh(self, root, relpath, fingerprint):
+        entry = self.entries.get(fingerprint, {}).get(relpath)
+        if entry is None:
+            return False
+        path = os.path.join(root, relpath)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        if st.st_size == entry['size'] and st.st_mtime_ns == entry['mtime']:
+            return True
+        # Touched but maybe not modified (checkout, copy...): compare contents
+        if st.st_size != entry['size'] or file_hash(path) != entry['hash']:
+            return False
+        entry['mtime'] = st.st_mtime_ns
+        return True
+
+    def record(self, root, relpath, fingerprint):
+        path = os.path.join(root, relpath)
+        st = os.stat(path)
+        self.entries.setdefault(fingerprint, {})[relpath] = {
+            'hash': file_hash(path),
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+        }
+
+    def prune(self, fingerprint, relpaths):
+        # Forgets the pages of fingerprint that the run did not find, and
+        # the fingerprints least recently run
+        relpaths = set(relpaths)
+        pages = self.entries.setdefault(fingerprint, {})
+        for relpath in [r for r in pages if r not in relpaths]:
+            del pages[relpath]
+        self.used[fingerprint] = time.time()
+        recent = sorted(self.entries, key=lambda f: self.used.get(f, 0), reverse=True)
+        for old in recent[MAX_FINGERPRINTS:]:
+            del self.entries[old]
+            self.used.pop(old, None)
+
+    def save(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pages': self.entries, 'used': self.used}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,228 @@
+import json
+import mmap
+import os
+import re
+import unicodedata
+
+# Byte-level prefilter for the rewrite engine.
+# Most rules can only change a page containing some literal: the old string
+# of a Replace, one of the patterns of a ReplaceTable, the fixed parts of a
+# regex, the anchors given to a function rule (Rule.anchors()). Before a
+# page is decoded and run through the rules, its file is memory-mapped and
+# searched for those literals as UTF-8 bytes; a page containing none of them
+# cannot change and is skipped without being read.
+#
+# What was found is cached per file and per literal in .prefilter-cache.json
+# with the size and mtime of the file, so a rerun only maps the files that
+# changed since, for the literals it has not looked for yet. Literals are
+# searched in turn and only until the answer is known.
+
+CACHE_NAME = '.prefilter-cache.json'
+
+# Fixed parts of a regex shorter than this are not worth a search
+MIN_LITERAL = 3
+# Literals remembered by the cache before it starts over
+MAX_LITERALS = 1024
+
+quantifier_chars = '*?{'
+special_chars = '.^$*+?{}[]|()\\'
+inline_flag_chars = 'aiLmsux-'
+# Escapes standing for a character: \x41, \u00e9, \U0001f600, \N{...}, \0, \101
+char_escape_regex = re.compile(r'x[0-9a-fA-F]{2}|u[0-9a-fA-F]{4}|U[0-9a-fA-F]{8}|N\{[^}]*\}|0[0-7]{0,2}|[0-7]{3}')
+# Other escapes of letters and digits: \s, \b, \A, backreferences (\1, \12)...
+class_escape_regex = re.compile(r'[1-9][0-9]?|[A-Za-z]')
+
+
+def escaped_char(escape):
+    # Character of an escape matched by char_escape_regex, or None
+    if escape[0] in 'xuU':
+        return chr(int(escape[1:], 16))
+    if escape[0] == 'N':
+        try:
+            return unicodedata.lookup(escape[2:-1])
+        except KeyError:
+            return None
+    return chr(int(escape, 8))
+
+
+def regex_literals(pattern, flags=0):
+    # Literal runs that every match of the pattern contains (outside groups,
+    # classes and optional parts), or None if the pattern has none or may
+    # match them in another case (flags or inline flags such as (?i))
+    if flags & (re.IGNORECASE | re.VERBOSE):
+        return None
+    literals = []
+    run = []
+    depth = 0
+    i = 0
+
+    def cut():
+        if len(run) >= MIN_LITERAL:
+            literals.append(''.join(run))
+        run.clear()
+
+    while i < len(pattern):
+        c = pattern[i]
+        if c == '\\':
+            escape = char_escape_regex.match(pattern, i + 1) or class_escape_regex.match(pattern, i + 1)
+            if escape:
+                i = escape.end()
+                char = escaped_char(escape.group()) if escape.re is char_escape_regex else None
+                if char is None:
+                    cut()
+                    continue
+            else:
+                char = pattern[i + 1:i + 2]
+                i += 2
+                if not char:
+                    break
+        elif c == '[':
+            cut()
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+            i += 1
+            continue
+        elif c in '()':
+            if pattern[i + 1:i + 2] == '?' and pattern[i + 2:i + 3] and pattern[i + 2] in inline_flag_chars:
+                # (?i), (?s:...): the flags may change what the literals match
+                return None
+            cut()
+            depth += 1 if c == '(' else -1
+            i += 1
+            continue
+        elif c == '|':
+            if depth == 0:
+                return None
+            i += 1
+            continue
+        elif c in special_chars:
+            cut()
+            if c == '{':
+                i = pattern.find('}', i) + 1 or len(pattern)
+            else:
+                i += 1
+            continue
+        else:
+            char = c
+            i += 1
+
+        if depth:
+            continue
+        if pattern[i:i + 1] and pattern[i] in quantifier_chars:
+            # The character is optional
+            cut()
+        elif pattern[i:i + 1] == '+':
+            run.append(char)
+            cut()
+        else:
+            run.append(char)
+    cut()
+    return literals or None
+
+
+def byte_pieces(strings):
+    # Pages are read with universal newlines: '\n' in a page may be '\r\n'
+    # in the file, so only the parts between newlines are searched
+    pieces = []
+    for string in strings:
+        pieces.extend(part.encode('utf-8') for part in string.replace('\r', '\n').split('\n') if part)
+    return pieces
+
+
+class Prefilter:
+    def __init__(self, path):
+        self.path = path
+        # Literals searched so far; a literal's position is its bit in the masks
+        self.literals = []
+        self.positions = {}
+        # relpath -> [size, mtime, mask of the literals searched, mask of those found]
+        self.entries = {}
+        self.compiled = {}
+        self.dirty = False
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = None
+        # A cache that grew too large (rules edited many times) starts over
+        if cache and len(cache['literals']) <= MAX_LITERALS:
+            for literal in cache['literals']:
+                self.bit(literal.encode('utf-8'))
+            self.entries = cache['files']
+            self.dirty = False
+
+    @classmethod
+    def for_root(cls, root):
+        return cls(os.path.join(root, CACHE_NAME))
+
+    def bit(self, piece):
+        position = self.positions.get(piece)
+        if position is None:
+            position = self.positions[piece] = len(self.literals)
+            self.literals.append(piece)
+            self.dirty = True
+        return position
+
+    def compile(self, anchors):
+        # [[literal bit, ...] per alternative], once per set of anchors
+        anchors = tuple(tuple(alternative) for alternative in anchors)
+        alternatives = self.compiled.get(anchors)
+        if alternatives is None:
+            alternatives = self.compiled[anchors] = [[self.bit(piece) for piece in byte_pieces(alternative)]
+                                                     for alternative in anchors]
+        return alternatives
+
+    def candidate(self, root, relpath, anchors):
+        # anchors: alternatives, each a tuple of strings that must all be in
+        # the page (see Rule.anchors()); None means every page is a candidate.
+        # Literals are only searched until the answer is known.
+        if anchors is None:
+            return True
+        alternatives = self.compile(anchors)
+        path = os.path.join(root, relpath)
+        st = os.stat(path)
+        entry = self.entries.get(relpath)
+        if entry is None or entry[0] != st.st_size or entry[1] != st.st_mtime_ns:
+            entry = self.entries[relpath] = [st.st_size, st.st_mtime_ns, 0, 0]
+            self.dirty = True
+        data = None
+        try:
+            for bits in alternatives:
+                for bit in bits:
+                    mask = 1 << bit
+                    if not entry[2] & mask:
+                        if data is None:
+                            data = self._map(path, st.st_size)
+                        entry[2] |= mask
+                        if data.find(self.literals[bit]) != -1:
+                            entry[3] |= mask
+                        self.dirty = True
+                    if not entry[3] & mask:
+                        break
+                else:
+                    return True
+            return False
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    def _map(self, path, size):
+        if not size:
+            return b''
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def save(self):
+        if not self.dirty:
+            return
+        cache = {'literals': [literal.decode('utf-8') for literal in self.literals], 'files': self.entries}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, separators=(',', ':'))
+        os.replace(tmp_path, self.path)
+        self.dirty = False
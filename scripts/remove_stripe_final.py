@@ -1,24 +1,17 @@
-import os
-
-directory = r"c:\Users\tmaut\Downloads\THE PHOENIX\NOVA V2"
+from rewrite_engine import FunctionRule, RuleSet, main
 
 search_pattern = 'logos:stripe'
 
-for root, dirs, files in os.walk(directory):
-    for file in files:
-        if file.endswith(".html"):
-            filepath = os.path.join(root, file)
-            try:
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-                
-                new_lines = [line for line in lines if search_pattern not in line]
-                
-                if len(new_lines) < len(lines):
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.writelines(new_lines)
-                    print(f"Removed Stripe from {filepath}")
-            except Exception as e:
-                print(f"Error processing {filepath}: {e}")
 
-print("Cleanup complete.")
+def remove_stripe_lines(content, page):
+    lines = content.splitlines(keepends=True)
+    new_lines = [line for line in lines if search_pattern not in line]
+    if len(new_lines) < len(lines):
+        return ''.join(new_lines)
+    return content
+
+
+RULES = RuleSet('remove_stripe', [FunctionRule(remove_stripe_lines, anchors=[search_pattern])], pages=['**/*.html'])
+
+if __name__ == '__main__':
+    main([RULES], 'Drop every line that references the Stripe logo.')
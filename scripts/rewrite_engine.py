@@ -0,0 +1,641 @@
+import argparse
+import fnmatch
+import hashlib
+import inspect
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from block_stream import splice_file
+from literal_matcher import ChainMatcher
+from page_manifest import PageManifest
+from prefilter import Prefilter, regex_literals
+
+# Shared rewrite engine for the site maintenance scripts.
+# Every script used to open each page itself, run its own chain of
+# str.replace / re.sub and write the file back. Scripts now only describe
+# their transforms as a RuleSet; the engine reads each page once, runs every
+# registered rule in order and writes the page only when something changed.
+#
+# With --profile every rule is timed and its matches and changed bytes are
+# recorded per page, to find the rules that never match and the slow ones.
+#
+# Rules can name the literals a page must contain for them to change it
+# (Rule.anchors()). A rule is skipped on a page without them, and a page
+# where no rule can match is ruled out from its raw bytes before it is even
+# decoded, see prefilter.py (--no-prefilter turns that off).
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SKIP_DIRS = ('node_modules', '.git')
+# Time over all pages from which --profile flags a rule as SLOW, whatever the
+# other rules took, and share of the time of all rules flagged as well
+SLOW_SECONDS = 0.05
+SLOW_SHARE = 0.2
+
+
+def page_matches(relpath, pattern):
+    # Same meaning as glob patterns: '*.html' only matches top-level pages,
+    # 'admin/*.html' only admin pages and '**/*.html' pages at any depth.
+    relpath = relpath.replace(os.sep, '/')
+    if pattern.startswith('**/'):
+        return fnmatch.fnmatch(relpath.rsplit('/', 1)[-1], pattern[3:])
+    parts = relpath.split('/')
+    pattern_parts = pattern.split('/')
+    if len(parts) != len(pattern_parts):
+        return False
+    return all(fnmatch.fnmatch(part, pat) for part, pat in zip(parts, pattern_parts))
+
+
+def source_hash(obj):
+    # Hash of the file an object is defined in: a function rule depends on
+    # the templates and helpers of its script, not only on its own code.
+    path = inspect.getsourcefile(obj)
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def describe_callable(func):
+    return [func.__module__, func.__qualname__, source_hash(func)]
+
+
+def find_pages(root, patterns):
+    pages = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for filename in sorted(filenames):
+            relpath = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, '/')
+            if any(page_matches(relpath, pattern) for pattern in patterns):
+                pages.append(relpath)
+    return pages
+
+
+class Page:
+    def __init__(self, root, relpath):
+        self.root = root
+        self.relpath = relpath
+        self.path = os.path.join(root, relpath)
+        self.name = os.path.basename(relpath)
+        self.warnings = []
+        self.hits = {}
+        # rule label -> [matches, seconds, bytes scanned, bytes changed], when profiling
+        self.profile = None
+        self.matches = None
+
+    def warn(self, message):
+        self.warnings.append(message)
+
+    def hit(self, label, count=1):
+        self.hits[label] = self.hits.get(label, 0) + count
+        self.matched(count)
+
+    def matched(self, count):
+        # Rules that know how many places they matched report it here
+        self.matches = (self.matches or 0) + count
+
+
+class Rule:
+    # pages=None means "whatever the owning RuleSet selects"
+    def __init__(self, name=None, pages=None):
+        self.name = name or self.__class__.__name__
+        self.pages = pages
+
+    def prepare(self, root):
+        pass
+
+    def inputs(self):
+        # Site files read by prepare() (patterns as in RuleSet pages): when
+        # one changes, the rule has to be prepared and applied again
+        return []
+
+    def anchors(self):
+        # Literals the page must contain for the rule to change it: a list of
+        # alternatives, each a tuple of strings that must all be present.
+        # None when the rule cannot tell (it may change any page).
+        return None
+
+    def may_match(self, content):
+        anchors = self.anchors()
+        return anchors is None or any(all(s in content for s in alternative) for alternative in anchors)
+
+    def applies_to(self, page):
+        return self.pages is None or any(page_matches(page.relpath, p) for p in self.pages)
+
+    def apply(self, content, page):
+        raise NotImplementedError
+
+    def describe(self):
+        # Everything the output depends on; used to fingerprint the rule set
+        return [self.__class__.__name__, self.pages, describe_callable(self.__class__.apply)]
+
+
+class Replace(Rule):
+    def __init__(self, old, new, name=None, pages=None):
+        super().__init__(name or old[:40], pages)
+        self.old = old
+        self.new = new
+
+    def anchors(self):
+        return [(self.old,)] if self.old else None
+
+    def apply(self, content, page):
+        if page.profile is not None:
+            page.matched(content.count(self.old))
+        return content.replace(self.old, self.new)
+
+    def describe(self):
+        return ['Replace', self.pages, self.old, self.new]
+
+
+class ReplaceTable(Rule):
+    # A whole (old, new) table applied in as few scans as its mode allows
+    # (sequential, simultaneous or fixpoint), see literal_matcher.py
+    def __init__(self, table, name='replacements', pages=None, mode='sequential'):
+        super().__init__(name, pages)
+        self.matcher = ChainMatcher(table, mode)
+
+    def anchors(self):
+        if not self.matcher.table or not all(old for old, _ in self.matcher.table):
+            return None
+        return [(old,) for old, _ in self.matcher.table]
+
+    def apply(self, content, page):
+        content, counts, _ = self.matcher.replace(content)
+        for index, count in enumerate(counts):
+            if count:
+                page.hit(f"{self.name}[{index}]", count)
+        return content
+
+    def describe(self):
+        return ['ReplaceTable', self.pages, self.matcher.mode, self.matcher.table]
+
+
+class RegexRule(Rule):
+    # anchors: as Rule.anchors(), by default the fixed parts of the pattern
+    def __init__(self, pattern, repl, flags=0, count=0, name=None, pages=None, anchors=None):
+        super().__init__(name or pattern[:40], pages)
+        self.regex = re.compile(pattern, flags)
+        self.repl = repl
+        self.count = count
+        if anchors is None:
+            literals = regex_literals(pattern, flags)
+            anchors = [tuple(literals)] if literals else None
+        self._anchors = anchors
+
+    def anchors(self):
+        return self._anchors
+
+    def apply(self, content, page):
+        content, count = self.regex.subn(self.repl, content, count=self.count)
+        page.matched(count)
+        return content
+
+    def describe(self):
+        repl = describe_callable(self.repl) if callable(self.repl) else self.repl
+        return ['RegexRule', self.pages, self.regex.pattern, self.regex.flags, repl, self.count]
+
+
+class BlockSwap(Rule):
+    # Replaces everything from `start` up to and including `end` with `replacement`.
+    # Block swaps can also run from disk in constant memory, see block_stream.py
+    def __init__(self, start, end, replacement='', count=0, name=None, pages=None):
+        super().__init__(name or start[:40], pages)
+        self.start = start
+        self.end = end
+        self.replacement = replacement
+        self.count = count
+
+    def anchors(self):
+        return [(self.start, self.end)]
+
+    def apply(self, content, page):
+        parts = []
+        pos = 0
+        swapped = 0
+        while not self.count or swapped < self.count:
+            start_idx = content.find(self.start, pos)
+            if start_idx == -1:
+                break
+            end_idx = content.find(self.end, start_idx + len(self.start))
+            if end_idx == -1:
+                break
+            parts.append(content[pos:start_idx])
+            parts.append(self.replacement)
+            pos = end_idx + len(self.end)
+            swapped += 1
+        page.matched(swapped)
+        if not swapped:
+            return content
+        parts.append(content[pos:])
+        return ''.join(parts)
+
+    def stream(self, page, dry_run=False):
+        return splice_file(page.path, self.start, self.end, self.replacement, self.count, dry_run)
+
+    def describe(self):
+        return ['BlockSwap', self.pages, self.start, self.end, self.replacement, self.count]
+
+
+class FunctionRule(Rule):
+    # For transforms that need the page (active links, per-file skips...).
+    # `func` must be a module-level function taking (content, page).
+    # anchors: strings of which at least one must be in a page for `func` to
+    # change it (or tuples of strings all required); by default every page
+    # goes through `func`, which also lets it warn about pages without a match.
+    def __init__(self, func, name=None, pages=None, anchors=None):
+        super().__init__(name or func.__name__, pages)
+        self.func = func
+        self._anchors = None if anchors is None else \
+            [a if isinstance(a, tuple) else (a,) for a in anchors]
+
+    def anchors(self):
+        return self._anchors
+
+    def apply(self, content, page):
+        return self.func(content, page)
+
+    def describe(self):
+        return ['FunctionRule', self.pages, describe_callable(self.func), self._anchors]
+
+
+class RuleSet:
+    def __init__(self, name, rules, pages=('*.html',), exclude=()):
+        self.name = name
+        self.rules = list(rules)
+        self.pages = tuple(pages)
+        self.exclude = tuple(exclude)
+
+    def selects(self, page):
+        if page.name in self.exclude:
+            return False
+        return any(page_matches(page.relpath, p) for p in self.pages)
+
+    def prepare(self, root):
+        for rule in self.rules:
+            rule.prepare(root)
+
+    def inputs(self):
+        return [pattern for rule in self.rules for pattern in rule.inputs()]
+
+    def anchors(self, page):
+        # Union of the anchors of the rules applying to the page, None if one
+        # of them may change any page
+        anchors = []
+        for rule in self.rules:
+            if rule.applies_to(page):
+                rule_anchors = rule.anchors()
+                if rule_anchors is None:
+                    return None
+                anchors.extend(rule_anchors)
+        return anchors
+
+    def apply(self, content, page):
+        for rule in self.rules:
+            if not rule.applies_to(page):
+                continue
+            if not rule.may_match(content):
+                if page.profile is not None:
+                    # Counted as a page the rule did not match
+                    page.profile.setdefault(f"{self.name}:{rule.name}", [0, 0.0, 0, 0])
+                continue
+            if page.profile is None:
+                content = rule.apply(content, page)
+            else:
+                content = self._profile(rule, content, page)
+        return content
+
+    def _profile(self, rule, content, page):
+        page.matches = None
+        start = time.perf_counter()
+        new_content = rule.apply(content, page)
+        seconds = time.perf_counter() - start
+        changed = changed_bytes(content, new_content)
+        # Rules that do not count matches (function rules...) count one per change
+        matches = page.matches if page.matches is not None else int(changed > 0)
+        stats = page.profile.setdefault(f"{self.name}:{rule.name}", [0, 0.0, 0, 0])
+        stats[0] += matches
+        stats[1] += seconds
+        stats[2] += len(content)
+        stats[3] += changed
+        return new_content
+
+    def labels(self):
+        return [f"{self.name}:{rule.name}" for rule in self.rules]
+
+    def describe(self):
+        return [self.name, self.pages, self.exclude, [rule.describe() for rule in self.rules]]
+
+
+def changed_bytes(old, new):
+    # Size of the span that differs between two versions of a page
+    if old is new or old == new:
+        return 0
+    low, high = 0, min(len(old), len(new))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[:mid] == new[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    low, high = 0, min(len(old), len(new)) - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return max(len(old), len(new)) - prefix - low
+
+
+class Pipeline:
+    def __init__(self, rulesets):
+        self.rulesets = list(rulesets)
+
+    def prepare(self, root):
+        for ruleset in self.rulesets:
+            ruleset.prepare(root)
+
+    def patterns(self):
+        patterns = []
+        for ruleset in self.rulesets:
+            for pattern in ruleset.pages:
+                if pattern not in patterns:
+                    patterns.append(pattern)
+        return patterns
+
+    def anchors(self, page):
+        anchors = []
+        for ruleset in self.rulesets:
+            if ruleset.selects(page):
+                ruleset_anchors = ruleset.anchors(page)
+                if ruleset_anchors is None:
+                    return None
+                anchors.extend(ruleset_anchors)
+        return anchors
+
+    def process(self, content, page):
+        for ruleset in self.rulesets:
+            if ruleset.selects(page):
+                content = ruleset.apply(content, page)
+        return content
+
+    def streamable(self):
+        return all(isinstance(rule, BlockSwap) for ruleset in self.rulesets for rule in ruleset.rules)
+
+    def stream(self, page, dry_run=False):
+        # Every block swap is its own streaming pass over the file
+        changed = False
+        for ruleset in self.rulesets:
+            if not ruleset.selects(page):
+                continue
+            for rule in ruleset.rules:
+                if rule.applies_to(page):
+                    swapped = rule.stream(page, dry_run)
+                    if swapped:
+                        page.hit(rule.name, swapped)
+                        changed = True
+        return changed
+
+    def labels(self):
+        return [label for ruleset in self.rulesets for label in ruleset.labels()]
+
+    def page_labels(self, page):
+        # Labels of the rules that would run on the page
+        return [f"{ruleset.name}:{rule.name}" for ruleset in self.rulesets if ruleset.selects(page)
+                for rule in ruleset.rules if rule.applies_to(page)]
+
+    def fingerprint(self):
+        # Only meaningful after prepare(), which may load data from the site
+        description = [source_hash(Pipeline), [ruleset.describe() for ruleset in self.rulesets]]
+        return hashlib.sha256(json.dumps(description).encode('utf-8')).hexdigest()
+
+
+class Report:
+    def __init__(self):
+        self.updated = []
+        self.unchanged = []
+        self.skipped = []
+        # Pages the prefilter ruled out without reading them
+        self.filtered = []
+        self.warnings = []
+        self.hits = {}
+        self.labels = []
+        # relpath -> rule label -> [matches, seconds, bytes scanned, bytes changed]
+        self.profile = None
+
+    def add(self, relpath, changed, warnings, hits, profile=None):
+        (self.updated if changed else self.unchanged).append(relpath)
+        self.warnings.extend(f"{relpath}: {w}" for w in warnings)
+        for label, count in hits.items():
+            self.hits[label] = self.hits.get(label, 0) + count
+        if profile is not None:
+            if self.profile is None:
+                self.profile = {}
+            self.profile[relpath] = profile
+
+    def add_filtered(self, relpath, profile=None):
+        # A page ruled out by the prefilter: when profiling, its rules count
+        # it as a page they did not match
+        self.filtered.append(relpath)
+        if profile is not None:
+            if self.profile is None:
+                self.profile = {}
+            self.profile[relpath] = profile
+
+    def rule_profile(self):
+        # rule label -> totals over the pages, including rules that never ran
+        totals = {label: {'pages': 0, 'pages_matched': 0, 'matches': 0, 'seconds': 0.0,
+                          'bytes_scanned': 0, 'bytes_changed': 0} for label in self.labels}
+        for relpath, rules in (self.profile or {}).items():
+            for label, (matches, seconds, scanned, changed) in rules.items():
+                total = totals.setdefault(label, {'pages': 0, 'pages_matched': 0, 'matches': 0, 'seconds': 0.0,
+                                                  'bytes_scanned': 0, 'bytes_changed': 0})
+                total['pages'] += 1
+                total['pages_matched'] += bool(matches)
+                total['matches'] += matches
+                total['seconds'] += seconds
+                total['bytes_scanned'] += scanned
+                total['bytes_changed'] += changed
+        return totals
+
+    def profile_json(self):
+        keys = ('matches', 'seconds', 'bytes_scanned', 'bytes_changed')
+        return {
+            'rules': self.rule_profile(),
+            'pages': {relpath: {label: dict(zip(keys, stats)) for label, stats in rules.items()}
+                      for relpath, rules in (self.profile or {}).items()},
+        }
+
+    def print_profile(self, slowest=5):
+        # Among the `slowest` first rules, only those taking SLOW_SECONDS, or
+        # SLOW_SHARE of a run of the rules that took that long, are flagged
+        totals = self.rule_profile()
+        ranked = sorted(totals, key=lambda label: totals[label]['seconds'], reverse=True)
+        total_seconds = sum(t['seconds'] for t in totals.values())
+        slow = {label for label in ranked[:slowest]
+                if totals[label]['seconds'] >= SLOW_SECONDS
+                or (total_seconds >= SLOW_SECONDS and totals[label]['seconds'] >= SLOW_SHARE * total_seconds)}
+        print(f"{'rule':<60} {'pages':>6} {'hit':>5} {'matches':>8} {'ms':>9} {'changed B':>10}")
+        for label in ranked:
+            t = totals[label]
+            flags = []
+            if not t['matches']:
+                flags.append('DEAD' if t['pages'] else 'DEAD (no page)')
+            if label in slow:
+                flags.append('SLOW')
+            shown = label.replace('\n', '\\n')[:60]
+            print(f"{shown:<60} {t['pages']:>6} {t['pages_matched']:>5} {t['matches']:>8} "
+                  f"{t['seconds'] * 1e3:>9.2f} {t['bytes_changed']:>10}  {' '.join(flags)}".rstrip())
+        dead = [label for label in ranked if not totals[label]['matches']]
+        print(f"{len(dead)} rule(s) without a single match.")
+
+    def print_summary(self):
+        for relpath in self.updated:
+            print(f"Updated {relpath}")
+        for warning in self.warnings:
+            print(f"Warning: {warning}")
+        for label, count in sorted(self.hits.items()):
+            print(f"  {label}: {count} match(es)")
+        summary = f"{len(self.updated)} updated, {len(self.unchanged)} unchanged"
+        if self.skipped:
+            summary += f", {len(self.skipped)} skipped (up to date)"
+        if self.filtered:
+            summary += f", {len(self.filtered)} ruled out by the prefilter"
+        print(summary + ".")
+        if self.profile is not None:
+            print()
+            self.print_profile()
+
+
+def process_page(pipeline, root, relpath, dry_run=False, stream=False, profile=False):
+    page = Page(root, relpath)
+    if stream:
+        changed = pipeline.stream(page, dry_run)
+        return relpath, changed, page.warnings, page.hits, None
+    if profile:
+        page.profile = {}
+
+    with open(page.path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    new_content = pipeline.process(content, page)
+    changed = new_content != content
+    if changed and not dry_run:
+        with open(page.path, 'w', encoding='utf-8') as f:
+            f.write(new_content)
+    return relpath, changed, page.warnings, page.hits, page.profile
+
+
+# Worker processes receive the prepared pipeline once, through the pool
+# initializer, instead of with every page.
+_worker = {}
+
+
+def _init_worker(pipeline, root, dry_run, stream, profile):
+    _worker.update(pipeline=pipeline, root=root, dry_run=dry_run, stream=stream, profile=profile)
+
+
+def _process_in_worker(relpath):
+    return process_page(_worker['pipeline'], _worker['root'], relpath, _worker['dry_run'], _worker['stream'],
+                        _worker['profile'])
+
+
+def _process_all(pipeline, root, relpaths, dry_run, jobs, stream, profile):
+    if jobs == 1 or len(relpaths) < 2:
+        for relpath in relpaths:
+            yield process_page(pipeline, root, relpath, dry_run, stream, profile)
+        return
+
+    # map() yields results in submission order, so the report is the same
+    # whatever the number of workers
+    chunksize = max(1, len(relpaths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(pipeline, root, dry_run, stream, profile)) as executor:
+        yield from executor.map(_process_in_worker, relpaths, chunksize=chunksize)
+
+
+def run(pipeline, root=ROOT, dry_run=False, jobs=1, incremental=False, stream=False, profile=False,
+        prefilter=True):
+    if stream and not pipeline.streamable():
+        raise SystemExit("Streaming mode only supports rule sets made of block swaps")
+    pipeline.prepare(root)
+    report = Report()
+    report.labels = pipeline.labels()
+    relpaths = find_pages(root, pipeline.patterns())
+    jobs = jobs or os.cpu_count() or 1
+
+    manifest = fingerprint = None
+    if incremental:
+        manifest = PageManifest.for_root(root)
+        fingerprint = pipeline.fingerprint()
+        fresh = {r for r in relpaths if manifest.is_fresh(root, r, fingerprint)}
+        report.skipped = [r for r in relpaths if r in fresh]
+        relpaths = [r for r in relpaths if r not in fresh]
+
+    if prefilter:
+        cache = Prefilter.for_root(root)
+        candidates = []
+        for relpath in relpaths:
+            page = Page(root, relpath)
+            if cache.candidate(root, relpath, pipeline.anchors(page)):
+                candidates.append(relpath)
+            elif profile and not stream:
+                report.add_filtered(relpath, {label: [0, 0.0, 0, 0] for label in pipeline.page_labels(page)})
+            else:
+                report.add_filtered(relpath)
+        relpaths = candidates
+        cache.save()
+
+    for result in _process_all(pipeline, root, relpaths, dry_run, jobs, stream, profile and not stream):
+        report.add(*result)
+        if manifest and not dry_run:
+            manifest.record(root, result[0], fingerprint)
+
+    if manifest and not dry_run:
+        manifest.prune(fingerprint, report.skipped + report.filtered + report.updated + report.unchanged)
+        manifest.save()
+    return report
+
+
+def build_parser(description):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--dry-run', action='store_true', help='report changes without writing files')
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help='process pages in N worker processes (0 = one per CPU)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='skip pages left unchanged since the last run of the same rules')
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help='read every page, even those containing none of the literals the rules look for')
+    parser.add_argument('--profile', action='store_true',
+                        help='time every rule and report its matches, flagging dead and slow rules')
+    parser.add_argument('--profile-json', metavar='FILE',
+                        help='write the per-page, per-rule profile to FILE as JSON (implies --profile)')
+    return parser
+
+
+def run_from_args(pipeline, args, stream=False):
+    # Runs a pipeline with the options of build_parser() and prints the report
+    profile = args.profile or bool(args.profile_json)
+    report = run(pipeline, args.root, args.dry_run, args.jobs, args.incremental, stream, profile,
+                 not args.no_prefilter)
+    report.print_summary()
+    if args.profile_json:
+        with open(args.profile_json, 'w', encoding='utf-8') as f:
+            json.dump(report.profile_json(), f, indent=1, sort_keys=True)
+    return report
+
+
+def main(rulesets, description=None, argv=None, stream_rulesets=None):
+    parser = build_parser(description)
+    if stream_rulesets:
+        parser.add_argument('--stream', action='store_true',
+                            help='splice marker-delimited blocks from disk in constant memory')
+    args = parser.parse_args(argv)
+    stream = getattr(args, 'stream', False)
+    if stream:
+        rulesets = stream_rulesets
+    return run_from_args(Pipeline(rulesets), args, stream)
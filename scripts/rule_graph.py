@@ -0,0 +1,276 @@
+import argparse
+import hashlib
+import re
+
+from literal_matcher import can_create, find_conflict
+from rewrite_engine import ROOT, Page, Pipeline, RegexRule, Replace, ReplaceTable, find_pages
+import site_fixes
+
+# Dependencies between the rewrite rules.
+# Scripts were written one after the other, each fixing what the previous
+# ones left: update_headers2.py chained h-24 -> h-20 after h-32 -> h-24,
+# fix_tables.py repairs what improve_tables_responsive.py broke, and
+# cleanup_admin_layout.py undoes part of update_admin_responsive.py. Whether
+# a run gives the final result, or only the next step of it, depended on
+# the order of the rules. This checks it two ways:
+#
+#   - statically, on the literal rules (Replace, ReplaceTable rows, regexes
+#     without metacharacters): a rule feeds another when its replacement
+#     can create the other's pattern (literal_matcher.can_create). A rule
+#     feeding an earlier one means the next run changes the pages again,
+#     and rules feeding each other in a cycle never settle. Tables are
+#     shown with the scans their mode needs (see literal_matcher.py).
+#   - on the pages, for every rule (function rules included): the selected
+#     rule sets are applied in memory again and again until a page stops
+#     changing. Pages still changing after --max-runs runs, or coming back
+#     to an earlier state (rule sets undoing each other), are reported.
+#
+# The exit status is 1 when rules or pages do not converge. Nothing is written.
+#
+#   python scripts/rule_graph.py
+#   python scripts/rule_graph.py --only remove_nav_fast improve_tables_responsive fix_tables
+
+MAX_RUNS = 8
+
+
+metacharacter_regex = re.compile(r'[.^$*+?{}\[\]|()\\]')
+
+
+def literal_regex(pattern, flags):
+    # The text a regex matches if it has no metacharacter, or None
+    if flags or metacharacter_regex.search(pattern):
+        return None
+    return pattern
+
+
+def literal_replacement(repl):
+    if callable(repl) or '\\' in repl:
+        return None
+    return repl
+
+
+def literal_pairs(rule):
+    # [(old, new)] a rule amounts to, or None when it is not a literal rewrite
+    if isinstance(rule, Replace):
+        return [(rule.old, rule.new)]
+    if isinstance(rule, ReplaceTable):
+        return list(rule.matcher.table)
+    if isinstance(rule, RegexRule) and not rule.count:
+        old = literal_regex(rule.regex.pattern, rule.regex.flags)
+        new = literal_replacement(rule.repl)
+        if old is not None and new is not None:
+            return [(old, new)]
+    return None
+
+
+def shorten(text, width=48):
+    text = text.replace('\n', '\\n')
+    return text if len(text) <= width else text[:width - 3] + '...'
+
+
+class Node:
+    def __init__(self, position, ruleset, rule, label, old, new):
+        self.position = position
+        self.ruleset = ruleset
+        self.rule = rule
+        self.label = label
+        self.old = old
+        self.new = new
+
+    @property
+    def shrinks(self):
+        return len(self.new) < len(self.old)
+
+    @property
+    def fixpoint(self):
+        return isinstance(self.rule, ReplaceTable) and self.rule.matcher.mode == 'fixpoint'
+
+    def __repr__(self):
+        return shorten(self.label, 60)
+
+
+class RuleGraph:
+    def __init__(self, rulesets, root=ROOT):
+        self.rulesets = list(rulesets)
+        self.nodes = []
+        self.opaque = []
+        # Rule sets only interact on the pages they both select
+        self.pages = {ruleset.name: set(relpath for relpath in find_pages(root, list(ruleset.pages))
+                                        if ruleset.selects(Page(root, relpath)))
+                      for ruleset in self.rulesets}
+        for ruleset in self.rulesets:
+            for rule in ruleset.rules:
+                pairs = literal_pairs(rule)
+                if pairs is None:
+                    self.opaque.append(shorten(f'{ruleset.name}:{rule.name}', 60))
+                    continue
+                for i, (old, new) in enumerate(pairs):
+                    label = f'{ruleset.name}:{rule.name}' + (f'[{i}]' if isinstance(rule, ReplaceTable) else '')
+                    self.nodes.append(Node(len(self.nodes), ruleset, rule, label, old, new))
+        # node position -> positions of the nodes it feeds
+        self.edges = {node.position: [other.position for other in self.nodes
+                                      if self.share_pages(node, other) and can_create(node.new, other.old)]
+                      for node in self.nodes}
+
+    def share_pages(self, a, b):
+        return a.ruleset is b.ruleset or bool(self.pages[a.ruleset.name] & self.pages[b.ruleset.name])
+
+    def chains(self):
+        # (a, b): a runs before b and can create its input, in the same run
+        return [(self.nodes[a], self.nodes[b]) for a, targets in self.edges.items() for b in targets if a < b]
+
+    def refeeds(self):
+        # (a, b): a runs after b and can create its input, for the next run
+        # (a fixpoint table rescans by itself)
+        pairs = [(self.nodes[a], self.nodes[b]) for a, targets in self.edges.items() for b in targets if a >= b]
+        return [(a, b) for a, b in pairs if not (a.rule is b.rule and a.fixpoint)]
+
+    def reachable(self, position):
+        seen = set()
+        pending = list(self.edges[position])
+        while pending:
+            current = pending.pop()
+            if current not in seen:
+                seen.add(current)
+                pending.extend(self.edges[current])
+        return seen
+
+    def undoes(self):
+        # (a, b): b turns back what a wrote
+        return [(a, b) for a in self.nodes for b in self.nodes
+                if a.position < b.position and a.old == b.new and a.new == b.old and self.share_pages(a, b)]
+
+    def cycles(self):
+        # Groups of rules feeding each other in a cycle where a rule does not
+        # shrink the text: rerunning them may never settle. Cycles of rules
+        # that all shrink it (duplicate removal...) end when nothing is left
+        # to remove.
+        reach = {node.position: self.reachable(node.position) for node in self.nodes}
+        groups = []
+        done = set()
+        for node in self.nodes:
+            if node.position in done or node.position not in reach[node.position]:
+                continue
+            group = [self.nodes[p] for p in sorted(reach[node.position]) if node.position in reach[p]]
+            done.update(member.position for member in group)
+            if not all(member.shrinks for member in group):
+                groups.append(group)
+        return groups
+
+    def tables(self):
+        # (label, mode, rules, scans per page)
+        for ruleset in self.rulesets:
+            for rule in ruleset.rules:
+                if isinstance(rule, ReplaceTable):
+                    matcher = rule.matcher
+                    per_pass = sum(literal.scans for _, literal in matcher.passes)
+                    scans = per_pass if matcher.mode != 'fixpoint' else \
+                        f'{per_pass} to {per_pass * (len(matcher.table) + 1)}'
+                    yield f'{ruleset.name}:{rule.name}', matcher.mode, len(matcher.table), scans
+
+
+def digest(content):
+    return hashlib.sha1(content.encode('utf-8')).digest()
+
+
+def converge(pipeline, root, relpath, max_runs=MAX_RUNS):
+    # (runs until the page stops changing or None, [(first, last) rule sets
+    # returning the page to an earlier state])
+    with open(f'{root}/{relpath}', 'r', encoding='utf-8') as f:
+        content = f.read()
+    seen = {digest(content)}
+    undone = []
+    for run in range(1, max_runs + 1):
+        page = Page(root, relpath)
+        start = content
+        # State after each rule set of the run
+        states = [(None, digest(content))]
+        for ruleset in pipeline.rulesets:
+            if ruleset.selects(page):
+                content = ruleset.apply(content, page)
+                states.append((ruleset.name, digest(content)))
+        for i in range(len(states)):
+            for j in range(i + 2, len(states)):
+                if states[j][1] == states[i][1] and states[i + 1][1] != states[i][1]:
+                    undone.append((states[i + 1][0], states[j][0]))
+        if content == start:
+            return run, undone
+        if digest(content) in seen:
+            # Back to the state of an earlier run: it oscillates
+            return None, undone
+        seen.add(digest(content))
+    return None, undone
+
+
+def group_pairs(pairs):
+    grouped = {}
+    for a, b in pairs:
+        grouped.setdefault(a, []).append(b)
+    return grouped.items()
+
+
+def print_static(graph):
+    print(f"{len(graph.nodes)} literal rule(s), {len(graph.opaque)} other rule(s) "
+          f"(only checked on the pages): {', '.join(graph.opaque) or '-'}")
+    for label, mode, count, scans in graph.tables():
+        print(f"  table {label}: {count} rule(s), {mode}, {scans} scan(s)")
+    for a, targets in group_pairs(graph.chains()):
+        print(f"  {a} feeds {', '.join(map(str, targets))}")
+    for a, targets in group_pairs(graph.refeeds()):
+        print(f"  Warning: {a} feeds {', '.join(map(str, targets))}, run before it: "
+              f"the next run may change the pages again")
+    for a, b in graph.undoes():
+        print(f"  Warning: {b} undoes {a}")
+    for ruleset in graph.rulesets:
+        for rule in ruleset.rules:
+            if isinstance(rule, ReplaceTable) and rule.matcher.mode == 'sequential':
+                reason = find_conflict(rule.matcher.table)
+                if reason:
+                    print(f"  {ruleset.name}:{rule.name}: {reason}, so only the sequential mode applies")
+
+
+def check(rulesets, root=ROOT, max_runs=MAX_RUNS):
+    # True if everything converges
+    graph = RuleGraph(rulesets, root)
+    print_static(graph)
+    ok = True
+    for group in graph.cycles():
+        ok = False
+        print(f"  Error: {', '.join(map(str, group))} feed each other and may never converge")
+
+    pipeline = Pipeline(rulesets)
+    pipeline.prepare(root)
+    runs = {}
+    undone = {}
+    for relpath in find_pages(root, pipeline.patterns()):
+        count, pairs = converge(pipeline, root, relpath, max_runs)
+        runs.setdefault(count, []).append(relpath)
+        for pair in pairs:
+            undone.setdefault(pair, set()).add(relpath)
+
+    print()
+    for count in sorted(key for key in runs if key is not None):
+        pages = runs[count]
+        what = 'already up to date' if count == 1 else f'stable after {count - 1} run(s)'
+        print(f"{len(pages)} page(s) {what}")
+    if None in runs:
+        ok = False
+        print(f"Error: {len(runs[None])} page(s) still changing after {max_runs} runs: "
+              f"{', '.join(sorted(runs[None])[:10])}")
+    for (first, last), pages in sorted(undone.items()):
+        which = first if first == last else f'{first} ... {last}'
+        print(f"Warning: {which} returns {len(pages)} page(s) to their state before {first} "
+              f"(e.g. {sorted(pages)[0]})")
+    return ok
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check how the rewrite rules feed each other and whether they converge.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help='rule sets to check, in registry order (default: the standard fixes)')
+    parser.add_argument('--max-runs', type=int, default=MAX_RUNS, metavar='N',
+                        help=f'runs after which a page that still changes is reported (default: {MAX_RUNS})')
+    args = parser.parse_args()
+
+    raise SystemExit(0 if check(site_fixes.select(args.only or site_fixes.DEFAULT), args.root, args.max_runs) else 1)
@@ -0,0 +1,82 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'admin'))
+
+import build_css
+import build_icons
+import bundle_js
+import build_partials
+import build_sw
+import cleanup_admin_layout
+import critical_css
+import fix_tables
+import improve_tables_responsive
+import optimize_images
+import remove_nav
+import remove_nav_fast
+import remove_stripe_final
+import unify_footers
+import update_admin_layout_v2
+import update_admin_responsive
+import update_headers
+import update_headers2
+import update_logo_and_favicon
+import update_sidebar
+from rewrite_engine import Pipeline, build_parser, run_from_args
+
+# Every rewrite script registers its RuleSet here. Running this file applies
+# the selected rule sets in the order below with a single read and at most a
+# single write per page, instead of one full read/rewrite per script.
+REGISTRY = [
+    update_headers.RULES,
+    update_headers2.RULES,
+    update_logo_and_favicon.RULES,
+    unify_footers.RULES,
+    remove_nav.RULES,
+    remove_stripe_final.RULES,
+    update_sidebar.RULES,
+    fix_tables.RULES,
+    # Not part of the default run: these rebuild or undo each other's layout
+    remove_nav_fast.RULES,
+    improve_tables_responsive.RULES,
+    update_admin_responsive.RULES,
+    update_admin_layout_v2.RULES,
+    cleanup_admin_layout.RULES,
+    build_partials.PAGES,
+    build_partials.LOADER,
+    optimize_images.RULES,
+    build_icons.RULES,
+    build_css.RULES,
+    critical_css.RULES,
+    bundle_js.RULES,
+    # Last: hashes the files left by the steps above
+    build_sw.RULES,
+]
+
+DEFAULT = [
+    'update_headers', 'update_headers2', 'update_logo_and_favicon', 'unify_footers',
+    'remove_nav', 'remove_stripe', 'update_sidebar', 'fix_tables',
+]
+
+
+def select(names):
+    by_name = {ruleset.name: ruleset for ruleset in REGISTRY}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown rule set(s): {', '.join(unknown)}")
+    return [ruleset for ruleset in REGISTRY if ruleset.name in names]
+
+
+if __name__ == '__main__':
+    parser = build_parser('Apply every registered site fix in one pass over the pages.')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='rule sets to run (default: the standard fixes)')
+    parser.add_argument('--list', action='store_true', help='list the registered rule sets and exit')
+    args = parser.parse_args()
+
+    if args.list:
+        for ruleset in REGISTRY:
+            print(f"{ruleset.name}{' (default)' if ruleset.name in DEFAULT else ''}")
+        raise SystemExit(0)
+
+    run_from_args(Pipeline(select(args.only or DEFAULT)), args)
@@ -0,0 +1,334 @@
+import bisect
+import html
+import json
+import os
+import posixpath
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import unquote, urlsplit
+
+from build_dist import PUBLISHED
+from html_index import HtmlIndex
+from rewrite_engine import find_pages
+
+# Dependency graph of the site files.
+# Every published file (see build_dist.PUBLISHED) plus the components is
+# parsed once for the files it refers to. The generated product pages and
+# sitemaps (build_dist.GENERATED) are left out: each product page only
+# repeats the links of product.html, which is in the graph, and at 100k
+# products they would outweigh the rest of the site.
+#   - pages: href / src / srcset / poster / action attributes, url() in
+#     styles, and file names in inline scripts and on* handlers
+#     (location.href = 'login.html', image: 'Images/flacon.png')
+#   - stylesheets: url() and @import
+#   - scripts: file names in string literals, resolved against the folder
+#     of each page that loads the script (like the browser does)
+#   - manifest.json: the icons and start_url
+#   - SVG files: only their ids, the fragments of the icon sprite
+# Each reference keeps its line and its URL; the graph answers what a file
+# uses, what uses it (directly or through other files) and what can be
+# reached from the home page. check_links.py reports broken references,
+# orphan files and unreachable pages from it; build steps can ask which
+# pages a change affects instead of redoing every page.
+
+GRAPH_FILES = PUBLISHED + ['components/*.html']
+ENTRY_POINTS = ['index.html', '404.html']
+
+URL_ATTRIBUTES = {'href', 'src', 'poster', 'action', 'data-src'}
+SRCSET_ATTRIBUTES = {'srcset', 'data-srcset'}
+# Extensions of the file names looked for in scripts
+FILE_EXTENSIONS = ('html', 'css', 'js', 'json', 'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico',
+                   'woff', 'woff2', 'ttf', 'mp4', 'webm', 'pdf')
+
+css_url_regex = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)|@import\s+(['"])([^'"]+)\3''')
+# A quoted file name, with a query string or fragment (even a template one)
+script_file_regex = re.compile(r'''(['"`])(/?[\w.%-][^'"`<>\n]*?\.(?:''' + '|'.join(FILE_EXTENSIONS)
+                               + r'''))((?:[?#][^\n]*?)?)\1''', re.IGNORECASE)
+concatenation_regex = re.compile(r'\+\s*$')
+svg_id_regex = re.compile(r'''\bid=(["'])([^"']+)\1''')
+
+
+def resolve(base_dir, url):
+    # (file relative to the root, fragment) of a link to a file of the site, or None
+    if not url:
+        return None
+    url = url.strip()
+    if url.startswith(('data:', 'mailto:', 'tel:', 'javascript:', 'blob:', '//', '#')):
+        return None
+    parts = urlsplit(url)
+    if parts.scheme or parts.netloc or '${' in parts.path:
+        return None
+    path = unquote(parts.path)
+    if not path:
+        return None
+    if path.startswith('/'):
+        relpath = posixpath.normpath(path.lstrip('/') or 'index.html')
+    else:
+        relpath = posixpath.normpath(posixpath.join(base_dir, path))
+    if relpath.startswith('..'):
+        return None
+    if path.endswith('/'):
+        relpath = posixpath.join(relpath, 'index.html') if relpath != '.' else 'index.html'
+    return relpath, parts.fragment
+
+
+class Reference:
+    def __init__(self, source, line, url, kind, candidates, fragment=''):
+        self.source = source
+        self.line = line
+        self.url = url
+        # link (to a page), asset, style (url()), script (name in a script)
+        self.kind = kind
+        # Files the URL may point to: one, or one per folder of the pages
+        # loading a script
+        self.candidates = candidates
+        self.fragment = fragment
+        self.target = candidates[0] if candidates else None
+
+    @property
+    def embeds(self):
+        # The source needs the target to render (a stylesheet, a script, an
+        # image, a component), as opposed to linking to another page
+        return self.kind != 'link' and (not self.target.endswith('.html') or self.target.startswith('components/'))
+
+    def __repr__(self):
+        return f'{self.source}:{self.line} -> {self.url}'
+
+
+class Lines:
+    def __init__(self, text):
+        self.starts = [m.end() for m in re.finditer('\n', text)]
+
+    def line(self, offset):
+        return bisect.bisect_right(self.starts, offset) + 1
+
+
+def _add(found, base_dir, line, url, kind):
+    resolved = resolve(base_dir, html.unescape(url or ''))
+    if resolved:
+        found.append((line, url, kind, resolved[0], resolved[1]))
+
+
+def script_names(text):
+    # (offset, url) of the file names in a script; the end of a URL built
+    # by concatenation ('/api/' + 'x.json') is not a file name of its own
+    for m in script_file_regex.finditer(text):
+        if not concatenation_regex.search(text, max(0, m.start() - 20), m.start()):
+            yield m.start(2), m.group(2) + m.group(3)
+
+
+def _script_names(found, base_dir, text, offset, lines):
+    for start, url in script_names(text):
+        _add(found, base_dir, lines.line(offset + start), url, 'script')
+
+
+def _css_urls(found, base_dir, text, offset, lines):
+    for m in css_url_regex.finditer(text):
+        url = m.group(2) or m.group(4)
+        _add(found, base_dir, lines.line(offset + m.start()), url, 'style')
+
+
+def parse_html(text, base_dir):
+    # ([(line, url, kind, file, fragment)], ids of the page, folder its links are relative to)
+    index = HtmlIndex(text)
+    lines = Lines(text)
+    found = []
+    # <base href="../../"> of the pages rendered in subdirectories
+    base = index.first('base')
+    resolved = base is not None and resolve(base_dir, base.attrs.get('href'))
+    if resolved:
+        base_dir = posixpath.dirname(resolved[0])
+    for elements in index.by_tag.values():
+        for element in elements:
+            line = lines.line(element.start)
+            for name, value in element.attrs.items():
+                if name in URL_ATTRIBUTES:
+                    kind = 'link' if element.tag in ('a', 'area', 'form', 'iframe') else 'asset'
+                    _add(found, base_dir, line, value, kind)
+                elif name in SRCSET_ATTRIBUTES:
+                    for candidate in value.split(','):
+                        _add(found, base_dir, line, candidate.strip().split(' ')[0], 'asset')
+                elif name == 'style':
+                    _css_urls(found, base_dir, value, element.spans[name][0], lines)
+                elif name.startswith('on'):
+                    _script_names(found, base_dir, value, element.spans[name][0], lines)
+            if element.tag == 'script' and 'src' not in element.attrs:
+                _script_names(found, base_dir, index.inner(element), element.open_end, lines)
+            elif element.tag == 'style':
+                _css_urls(found, base_dir, index.inner(element), element.open_end, lines)
+    found.sort()
+    return found, sorted(index.by_id), base_dir
+
+
+def parse_file(root, relpath):
+    # (relpath, references, ids, folder of its links); references of
+    # scripts are resolved later
+    path = os.path.join(root, relpath)
+    extension = os.path.splitext(relpath)[1].lower()
+    # Components are inserted into the pages at the root
+    base_dir = '' if relpath.startswith('components/') else posixpath.dirname(relpath)
+    if extension not in ('.html', '.css', '.js', '.svg') and relpath != 'manifest.json':
+        return relpath, [], [], base_dir
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    if extension == '.svg':
+        return relpath, [], sorted({m.group(2) for m in svg_id_regex.finditer(text)}), base_dir
+    if extension == '.html':
+        return (relpath,) + parse_html(text, base_dir)
+    found = []
+    lines = Lines(text)
+    if extension == '.css':
+        _css_urls(found, base_dir, text, 0, lines)
+    elif extension == '.js':
+        # Relative to the root for now
+        for start, url in script_names(text):
+            found.append((lines.line(start), url, 'script', None, None))
+    else:
+        try:
+            manifest = json.loads(text)
+        except ValueError:
+            manifest = {}
+        for icon in manifest.get('icons', []):
+            _add(found, base_dir, 1, icon.get('src'), 'asset')
+        _add(found, base_dir, 1, manifest.get('start_url'), 'link')
+    return relpath, found, [], base_dir
+
+
+def _parse_one(args):
+    return parse_file(*args)
+
+
+class SiteGraph:
+    def __init__(self, root):
+        self.root = root
+        self.files = set()
+        # file -> [Reference]
+        self.references = {}
+        # page -> ids of its elements
+        self.ids = {}
+        # page -> folder its links are relative to (its own, or its <base>)
+        self.bases = {}
+        self._raw = {}
+        self._users = None
+
+    @classmethod
+    def build(cls, root, jobs=1):
+        graph = cls(root)
+        graph.update(find_pages(root, GRAPH_FILES), jobs)
+        return graph
+
+    def update(self, relpaths, jobs=1):
+        # (Re)parse files that were added or changed; missing ones are dropped
+        present = []
+        for relpath in relpaths:
+            if os.path.isfile(os.path.join(self.root, relpath)):
+                self.files.add(relpath)
+                present.append(relpath)
+            else:
+                self.files.discard(relpath)
+                self._raw.pop(relpath, None)
+                self.ids.pop(relpath, None)
+                self.bases.pop(relpath, None)
+        tasks = [(self.root, relpath) for relpath in present]
+        if jobs == 1 or len(tasks) < 2:
+            results = [parse_file(*task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(executor.map(_parse_one, tasks, chunksize=max(1, len(tasks) // (jobs * 4))))
+        for relpath, found, ids, base_dir in results:
+            self._raw[relpath] = found
+            self.ids[relpath] = set(ids)
+            self.bases[relpath] = base_dir
+        self._link()
+
+    def _link(self):
+        self.references = {}
+        for relpath, found in self._raw.items():
+            if not relpath.endswith('.js'):
+                self.references[relpath] = [Reference(relpath, line, url, kind, [target], fragment)
+                                            for line, url, kind, target, fragment in found]
+        # A script's file names are relative to the page that runs it
+        loaders = {}
+        for relpath, references in self.references.items():
+            for reference in references:
+                if reference.target.endswith('.js'):
+                    loaders.setdefault(reference.target, set()).add(self.bases[relpath])
+        for relpath, found in self._raw.items():
+            if relpath.endswith('.js'):
+                references = []
+                for line, url, kind, _, _ in found:
+                    candidates = []
+                    for base_dir in sorted(loaders.get(relpath, {''})):
+                        resolved = resolve(base_dir, html.unescape(url))
+                        if resolved and resolved[0] not in candidates:
+                            candidates.append(resolved[0])
+                            fragment = resolved[1]
+                    if candidates:
+                        reference = Reference(relpath, line, url, kind, candidates, fragment)
+                        # Any folder where the file exists will do
+                        reference.target = next((c for c in candidates if self.exists(c)), candidates[0])
+                        references.append(reference)
+                self.references[relpath] = references
+        self._users = None
+
+    def exists(self, relpath):
+        return relpath in self.files or os.path.isfile(os.path.join(self.root, relpath))
+
+    def targets(self, relpath):
+        return {reference.target for reference in self.references.get(relpath, [])}
+
+    def users(self, relpath, embedding=False):
+        # Files referring to relpath (only those embedding it if `embedding`)
+        if self._users is None:
+            self._users = ({}, {})
+            for source, references in self.references.items():
+                for reference in references:
+                    self._users[0].setdefault(reference.target, set()).add(source)
+                    if reference.embeds:
+                        self._users[1].setdefault(reference.target, set()).add(source)
+        return self._users[embedding].get(relpath, set())
+
+    def affected(self, relpaths):
+        # The files embedding any of relpaths, directly or through other files
+        seen = set()
+        pending = list(relpaths)
+        while pending:
+            for user in self.users(pending.pop(), embedding=True):
+                if user not in seen:
+                    seen.add(user)
+                    pending.append(user)
+        return seen
+
+    def reachable(self, starts=ENTRY_POINTS):
+        seen = set()
+        pending = [start for start in starts if start in self.files]
+        while pending:
+            relpath = pending.pop()
+            if relpath in seen:
+                continue
+            seen.add(relpath)
+            pending.extend(self.targets(relpath) - seen)
+        return seen
+
+    def broken(self, threads=16):
+        # [Reference] whose file does not exist; the files are checked concurrently
+        targets = sorted({reference.target for references in self.references.values() for reference in references})
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            missing = {target for target, found in zip(targets, executor.map(self.exists, targets)) if not found}
+        return [reference for source in sorted(self.references) for reference in self.references[source]
+                if reference.target in missing]
+
+    def missing_anchors(self):
+        # [Reference] to page#id where the page has no such id (it may be added by a script)
+        return [reference for source in sorted(self.references) for reference in self.references[source]
+                if reference.fragment and reference.target in self.ids and self.exists(reference.target)
+                and reference.fragment not in self.ids[reference.target]]
+
+    def orphans(self, patterns):
+        # Files matching patterns that nothing refers to
+        candidates = find_pages(self.root, patterns)
+        return [relpath for relpath in candidates if not self.users(relpath)]
+
+    def unreachable(self, pages=('*.html', 'admin/*.html')):
+        reachable = self.reachable()
+        return [relpath for relpath in find_pages(self.root, list(pages)) if relpath not in reachable]
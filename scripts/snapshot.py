@@ -0,0 +1,132 @@
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from decimal import Decimal
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+except ImportError:
+    psycopg = None
+
+# Read-only access to a snapshot of the Supabase tables for the build steps.
+# A snapshot is one of:
+#   - a JSON export: a list of rows, or an object mapping table names to lists
+#   - a SQLite file with the tables of backup/schema.sql
+#   - a postgresql:// URL (needs psycopg: pip install psycopg)
+# Rows come back as dicts with the values the Supabase API would return
+# (timestamps as ISO text, numbers as int or float); database rows are
+# streamed so a table of any size can be walked with bounded memory.
+
+BATCH_SIZE = 1000
+
+
+def json_value(value):
+    # Values as PostgREST renders them in JSON
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        if '.' in text:
+            main, rest = text.split('.', 1)
+            digits = re.match(r'\d+', rest).group(0)
+            fraction = digits.rstrip('0')
+            text = main + ('.' + fraction if fraction else '') + rest[len(digits):]
+        return text
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+def _row(row, fields):
+    return {field: json_value(row.get(field)) for field in fields}
+
+
+def _query(table, fields, where, order_by, placeholder, since=None):
+    clauses = []
+    params = []
+    for column, values in (where or {}).items():
+        clauses.append(f"{column} IN ({', '.join([placeholder] * len(values))})")
+        params.extend(values)
+    if since:
+        column, value = since
+        clauses.append(f"{column} >= {placeholder}")
+        params.append(value)
+    sql_where = f"FROM {table}" + (f" WHERE {' AND '.join(clauses)}" if clauses else '')
+    order = ''
+    if order_by:
+        column, descending = order_by
+        order = f" ORDER BY {column} {'DESC' if descending else 'ASC'} NULLS LAST, id"
+    return f"SELECT COUNT(*) {sql_where}", f"SELECT {', '.join(fields)} {sql_where}{order}", params
+
+
+def _json_rows(path, table, fields, where, order_by, since=None):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    rows = data.get(table, []) if isinstance(data, dict) else data
+    rows = [_row(row, fields) for row in rows
+            if all(row.get(column) in values for column, values in (where or {}).items())]
+    if since:
+        # Compared as text, like the ISO timestamps of a SQLite file
+        column, value = since
+        rows = [row for row in rows if row[column] is not None and str(row[column]) >= str(value)]
+    if order_by:
+        column, descending = order_by
+        # Rows without a value last, like NULLS LAST
+        present = [row for row in rows if row[column] is not None]
+        # Ties by id, as in the SQL query (the sort is stable, even reversed)
+        present.sort(key=lambda row: str(row.get('id')))
+        present.sort(key=lambda row: row[column], reverse=descending)
+        rows = present + [row for row in rows if row[column] is None]
+    snapshot = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+    return len(rows), iter(rows), snapshot
+
+
+def _sqlite_rows(path, table, fields, where, order_by, since=None):
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    connection.row_factory = sqlite3.Row
+    count_sql, rows_sql, params = _query(table, fields, where, order_by, '?', since)
+    count = connection.execute(count_sql, params).fetchone()[0]
+    snapshot = datetime.now(timezone.utc)
+
+    def rows():
+        try:
+            for row in connection.execute(rows_sql, params):
+                yield _row(dict(row), fields)
+        finally:
+            connection.close()
+    return count, rows(), snapshot
+
+
+def _postgres_rows(dsn, table, fields, where, order_by, since=None):
+    if psycopg is None:
+        raise SystemExit("Reading from Postgres needs psycopg: pip install psycopg")
+    connection = psycopg.connect(dsn, row_factory=dict_row)
+    count_sql, rows_sql, params = _query(table, fields, where, order_by, '%s', since)
+    count = connection.execute(count_sql, params).fetchone()['count']
+    snapshot = datetime.now(timezone.utc)
+
+    def rows():
+        try:
+            # Named cursor: rows come from the server in batches
+            with connection.cursor(name=f'{table}_snapshot') as cursor:
+                cursor.itersize = BATCH_SIZE
+                cursor.execute(rows_sql, params)
+                for row in cursor:
+                    yield _row(row, fields)
+        finally:
+            connection.close()
+    return count, rows(), snapshot
+
+
+def open_table(source, table, fields, where=None, order_by=None, since=None):
+    # (row count, iterator of rows, snapshot time). `where` maps columns to
+    # the values they may take; `order_by` is (column, descending); `since`
+    # is (column, lowest value) and leaves out the rows below it or NULL.
+    if source.startswith(('postgres://', 'postgresql://')):
+        return _postgres_rows(source, table, fields, where, order_by, since)
+    if not os.path.isfile(source):
+        raise SystemExit(f"Snapshot not found: {source}")
+    if source.endswith('.json'):
+        return _json_rows(source, table, fields, where, order_by, since)
+    return _sqlite_rows(source, table, fields, where, order_by, since)
@@ -1,46 +1,92 @@
 import os
-import re
 
-directory = r"c:\Users\tmaut\Downloads\THE PHOENIX\NOVA V2"
-index_path = os.path.join(directory, 'index.html')
+from html_index import Comment, HtmlIndex, Splicer
+from rewrite_engine import BlockSwap, Rule, RuleSet, main
 
-with open(index_path, 'r', encoding='utf-8') as f:
-    index_content = f.read()
+footer_marker = '<!-- ========== FOOTER ========== -->'
 
-# Extract the footer from index.html
-# Find <!-- ========== FOOTER ========== --> up to </footer>
-footer_match = re.search(r'(?s)<!-- ========== FOOTER ========== -->\s*<footer.*?</footer>', index_content)
-if not footer_match:
-    print("Could not find footer in index.html")
-    exit(1)
 
-master_footer = footer_match.group(0)
+def find_footer(index):
+    # First <footer> element, together with the FOOTER comment right before it.
+    # Returns (first node, footer element, has marker).
+    footer = index.first('footer')
+    if footer is None:
+        return None, None, False
+    previous = index.previous_sibling(footer)
+    if isinstance(previous, Comment) and index.source(previous) == footer_marker:
+        return previous, footer, True
+    return footer, footer, False
 
-# Files to skip (Admin files have a different structure usually, but let's check root first)
-skip_files = ['index.html', '404.html', 'diagnostic_logo.html']
-
-for filename in os.listdir(directory):
-    if filename.endswith(".html") and filename not in skip_files:
-        filepath = os.path.join(directory, filename)
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Try to find existing footer in the file
+
+def load_master_footer(root, source):
+    # Extract the footer from index.html
+    # Find <!-- ========== FOOTER ========== --> up to </footer>
+    with open(os.path.join(root, source), 'r', encoding='utf-8') as f:
+        index = HtmlIndex(f.read())
+    first, footer, has_marker = find_footer(index)
+    if not has_marker:
+        print(f"Could not find footer in {source}")
+        return None
+    return index.text[first.start:footer.end]
+
+
+class FooterSwap(Rule):
+    def __init__(self, source='index.html'):
+        super().__init__('unify_footer')
+        self.source = source
+        self.master_footer = None
+
+    def prepare(self, root):
+        self.master_footer = load_master_footer(root, self.source)
+
+    def inputs(self):
+        return [self.source]
+
+    def apply(self, content, page):
+        if self.master_footer is None:
+            return content
         # It might have the exact comment or just <footer
-        file_footer_match = re.search(r'(?s)(?:<!-- ========== FOOTER ========== -->\s*)?<footer.*?</footer>', content)
-        
-        if file_footer_match:
-            existing_footer = file_footer_match.group(0)
-            if existing_footer != master_footer:
-                print(f"Updating footer in {filename}...")
-                new_content = content[:file_footer_match.start()] + master_footer + content[file_footer_match.end():]
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
-            else:
-                pass # Already identical
-        else:
-            print(f"Warning: No footer found in {filename}")
+        index = HtmlIndex(content)
+        first, footer, _ = find_footer(index)
+        if footer is None:
+            page.warn("No footer found")
+            return content
+        if content[first.start:footer.end] == self.master_footer:
+            return content # Already identical
+        splicer = Splicer(index)
+        splicer.replace_siblings(first, footer, self.master_footer)
+        return splicer.apply()
+
+    def describe(self):
+        return ['FooterSwap', self.source, self.master_footer]
+
+
+class FooterBlock(BlockSwap):
+    # Streaming variant: only footers that start with the FOOTER marker
+    def __init__(self, source='index.html'):
+        super().__init__(footer_marker, '</footer>', count=1, name='unify_footer')
+        self.source = source
+
+    def prepare(self, root):
+        self.replacement = load_master_footer(root, self.source)
+
+    def inputs(self):
+        return [self.source]
+
+    def stream(self, page, dry_run=False):
+        if self.replacement is None:
+            return 0
+        return super().stream(page, dry_run)
+
+
+# Files to skip (Admin files have a different structure usually, but let's check root first)
+RULES = RuleSet('unify_footers', [FooterSwap()],
+                exclude=['index.html', '404.html', 'diagnostic_logo.html'])
+
+STREAM_RULES = RuleSet('unify_footers', [FooterBlock()],
+                       exclude=['index.html', '404.html', 'diagnostic_logo.html'])
 
 # Note: For pages in ADMIN NOVA, they might not use this same footer or might use it. 
-# They have a different structure without a main footer usually. Let's list files updated.
-print("Finished checking and unifying footers in the root directory.")
+# They have a different structure without a main footer usually.
+if __name__ == '__main__':
+    main([RULES], 'Copy the footer of index.html into every root page.', stream_rulesets=[STREAM_RULES])
@@ -1,7 +1,4 @@
-import os
-import re
-
-directory = r"c:\Users\tmaut\Downloads\THE PHOENIX\NewKet"
+from rewrite_engine import RegexRule, Replace, ReplaceTable, RuleSet, main
 
 replacements = [
     # Top wrapper padding
@@ -26,32 +23,22 @@ replacements = [
      r'<div class="h-14 sm:h-24 lg:h-28"></div>')
 ]
 
-for filename in os.listdir(directory):
-    if filename.endswith(".html"):
-        filepath = os.path.join(directory, filename)
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        new_content = content
-        for old, new in replacements:
-            new_content = new_content.replace(old, new)
-            
-        # Regex for search input
-        new_content = re.sub(r'class="w-full py-3 px-3 bg-transparent text-sm outline-none placeholder-slate-400 font-medium([^"]*)"', 
-                             r'class="w-full py-2 px-3 bg-transparent text-sm outline-none placeholder-slate-400 font-medium\1"', new_content)
-                             
-        # Regex for search button
-        new_content = re.sub(r'class="bg-slate-900 text-white px-6 py-2\.5 m-1 rounded-xl text-sm font-bold hover:bg-slate-800 transition-all uppercase tracking-wider"',
-                             r'class="bg-slate-900 text-white px-5 py-2 m-1 rounded-xl text-sm font-bold hover:bg-slate-800 transition-all uppercase tracking-wider"', new_content)
-                             
-        # Category nav index
-        new_content = new_content.replace(r'<nav class="flex items-center gap-1 overflow-x-auto py-2 -mx-2" style="scrollbar-width:none;">',
-                                          r'<nav class="flex items-center gap-1 overflow-x-auto py-1 -mx-2" style="scrollbar-width:none;">')
-        # Category nav catalog
-        new_content = new_content.replace(r'<div class="flex items-center gap-8 overflow-x-auto no-scrollbar py-3">',
-                                          r'<div class="flex items-center gap-8 overflow-x-auto no-scrollbar py-2">')
+RULES = RuleSet('update_headers', [ReplaceTable(replacements)] + [
+    # Regex for search input
+    RegexRule(r'class="w-full py-3 px-3 bg-transparent text-sm outline-none placeholder-slate-400 font-medium([^"]*)"',
+              r'class="w-full py-2 px-3 bg-transparent text-sm outline-none placeholder-slate-400 font-medium\1"'),
+
+    # Regex for search button
+    RegexRule(r'class="bg-slate-900 text-white px-6 py-2\.5 m-1 rounded-xl text-sm font-bold hover:bg-slate-800 transition-all uppercase tracking-wider"',
+              r'class="bg-slate-900 text-white px-5 py-2 m-1 rounded-xl text-sm font-bold hover:bg-slate-800 transition-all uppercase tracking-wider"'),
+
+    # Category nav index
+    Replace(r'<nav class="flex items-center gap-1 overflow-x-auto py-2 -mx-2" style="scrollbar-width:none;">',
+            r'<nav class="flex items-center gap-1 overflow-x-auto py-1 -mx-2" style="scrollbar-width:none;">'),
+    # Category nav catalog
+    Replace(r'<div class="flex items-center gap-8 overflow-x-auto no-scrollbar py-3">',
+            r'<div class="flex items-center gap-8 overflow-x-auto no-scrollbar py-2">'),
+])
 
-        if content != new_content:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-            print(f"Updated {filename}")
+if __name__ == '__main__':
+    main([RULES], 'Tighten header paddings, logo and spacer sizes.')
@@ -1,7 +1,6 @@
-import os
 import re
 
-directory = r"c:\Users\tmaut\Downloads\THE PHOENIX\NewKet"
+from rewrite_engine import FunctionRule, RegexRule, Replace, RuleSet, main
 
 # New Logo Designs
 header_logo_replacement = '''<a href="index.html" class="flex-shrink-0 flex items-center gap-3">
@@ -36,53 +35,35 @@ admin_logo_replacement = '''<a href="dashboard.html" class="flex items-center ga
 # Favicon SVG base64 for a star
 favicon_tag = '<link rel="icon" type="image/svg+xml" href="data:image/svg+xml,<svg xmlns=\'http://www.w3.org/2000/svg\' viewBox=\'0 0 24 24\'><path fill=\'%23000\' d=\'m12 17.27l4.15 2.51c.76.46 1.69-.22 1.49-1.08l-1.1-4.72l3.67-3.18c.67-.58.31-1.68-.57-1.75l-4.83-.41l-1.89-4.46c-.34-.81-1.5-.81-1.84 0L9.19 8.63l-4.83.41c-.88.07-1.24 1.17-.57 1.75l3.67 3.18l-1.1 4.72c-.2.86.73 1.54 1.49 1.08l4.15-2.51Z\'/></svg>">'
 
-def process_file(filepath, is_admin=False):
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    new_content = content
-
+def add_favicon(content, page):
     # 1. Add Favicon if not present
-    if 'rel="icon"' not in new_content:
-        new_content = new_content.replace('</head>', f'    {favicon_tag}\n</head>')
+    if 'rel="icon"' not in content:
+        content = content.replace('</head>', f'    {favicon_tag}\n</head>')
+    return content
 
-    # 2. Replace Header Logo
-    # Match both standard and previously inverted/scaled images
-    header_regex = r'<a href="index\.html" class="flex-shrink-0 flex items-center gap-[^"]*">.*?<img src="(?:\.\./)?Images/LOGO NEWKET\.png"[^>]*>.*?</a>'
-    new_content = re.sub(header_regex, header_logo_replacement, new_content, flags=re.DOTALL)
 
-    # 3. Replace Footer Logo
-    footer_regex = r'<div class="flex items-center gap-3">\s*<img src="(?:\.\./)?Images/LOGO NEWKET\.png"[^>]*>\s*<span class="text-xl font-bold tracking-tight">NEWKET</span>\s*</div>'
-    new_content = re.sub(footer_regex, footer_logo_replacement, new_content, flags=re.DOTALL)
+# 2. Replace Header Logo
+# Match both standard and previously inverted/scaled images
+header_regex = r'<a href="index\.html" class="flex-shrink-0 flex items-center gap-[^"]*">.*?<img src="(?:\.\./)?Images/LOGO NEWKET\.png"[^>]*>.*?</a>'
 
-    # 4. Replace Mobile Menu Logo
-    mobile_regex = r'<img src="(?:\.\./)?Images/LOGO NEWKET\.png" alt="NewKet" class="h-8 w-auto invert">'
-    # If it's in the mobile menu div
-    new_content = new_content.replace(mobile_regex, mobile_menu_logo_replacement)
+# 3. Replace Footer Logo
+footer_regex = r'<div class="flex items-center gap-3">\s*<img src="(?:\.\./)?Images/LOGO NEWKET\.png"[^>]*>\s*<span class="text-xl font-bold tracking-tight">NEWKET</span>\s*</div>'
 
-    # 5. Admin Header Logo
-    if is_admin:
-        admin_header_regex = r'<a href="dashboard\.html" class="flex items-center gap-2">.*?<img src="\.\./Images/LOGO NEWKET\.png"[^>]*>.*?<span[^>]*>Admin</span>.*?</a>'
-        new_content = re.sub(admin_header_regex, admin_logo_replacement, new_content, flags=re.DOTALL | re.IGNORECASE)
+# 4. Replace Mobile Menu Logo
+mobile_regex = r'<img src="(?:\.\./)?Images/LOGO NEWKET\.png" alt="NewKet" class="h-8 w-auto invert">'
 
-    if content != new_content:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(new_content)
-        return True
-    return False
+# 5. Admin Header Logo
+admin_header_regex = r'<a href="dashboard\.html" class="flex items-center gap-2">.*?<img src="\.\./Images/LOGO NEWKET\.png"[^>]*>.*?<span[^>]*>Admin</span>.*?</a>'
 
-# Scan root directory
-for filename in os.listdir(directory):
-    if filename.endswith(".html"):
-        if process_file(os.path.join(directory, filename)):
-            print(f"Updated {filename}")
-
-    # Scan admin directory
-    admin_dir = os.path.join(directory, "admin")
-if os.path.exists(admin_dir):
-    for filename in os.listdir(admin_dir):
-        if filename.endswith(".html"):
-            if process_file(os.path.join(admin_dir, filename), is_admin=True):
-                print(f"Updated Admin {filename}")
+RULES = RuleSet('update_logo_and_favicon', [
+    FunctionRule(add_favicon, anchors=['</head>']),
+    RegexRule(header_regex, header_logo_replacement, flags=re.DOTALL, name='header_logo'),
+    RegexRule(footer_regex, footer_logo_replacement, flags=re.DOTALL, name='footer_logo'),
+    # If it's in the mobile menu div
+    Replace(mobile_regex, mobile_menu_logo_replacement, name='mobile_menu_logo'),
+    RegexRule(admin_header_regex, admin_logo_replacement, flags=re.DOTALL | re.IGNORECASE,
+              name='admin_logo', pages=['admin/*.html']),
+], pages=['*.html', 'admin/*.html'])
 
-print("Logo and Favicon update complete.")
+if __name__ == '__main__':
+    main([RULES], 'Replace the image logo with the star logo and add the favicon.')
@@ -0,0 +1,281 @@
+import argparse
+import importlib
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+from build_product_pages import PRODUCTS_DIR, SITEMAPS_DIR
+from rewrite_engine import ROOT, SKIP_DIRS, Page, Pipeline, RuleSet, find_pages, page_matches, process_page
+from site_graph import GRAPH_FILES, SiteGraph
+import site_fixes
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+# Watch mode for the rewrite rule sets.
+# Instead of rerunning the scripts by hand after each edit, this keeps the
+# prepared rule sets in memory and waits for changes (inotify through
+# watchdog when it is installed, pip install watchdog; polling otherwise).
+# Events are gathered until nothing has moved for DEBOUNCE seconds, then
+# only the affected work is redone:
+#   - an edited page goes through the rule sets that select it, and nothing
+#     else is touched;
+#   - a file a rule set reads in prepare() (Rule.inputs(): a component,
+#     index.html for the footer, css/*.css...) prepares that rule set again;
+#     if what it loaded changed, the rule set runs on its pages, limited to
+#     the pages that embed the file when the site graph knows them;
+#   - an edited script (admin/update_sidebar.py and its sidebar template,
+#     say) is reloaded and its rule set runs on all its pages.
+# Pages written by the watcher itself do not trigger another round.
+#
+#   python scripts/watch.py
+#   python scripts/watch.py --only build_partials build_partials_loader update_sidebar
+
+DEBOUNCE = 0.1
+POLL_INTERVAL = 0.2
+# The rule sets kept up to date by default: the build steps that rebuild
+# pages from a source (the components, the footer of index.html, the
+# sidebar template) and leave them as they are when run again. The one-off
+# migrations of site_fixes.DEFAULT (remove_nav, remove_stripe...) are not
+# rerun on every edit; --only can still name them.
+WATCH_DEFAULT = ['unify_footers', 'update_sidebar', 'build_partials', 'build_partials_loader']
+# Output of the build scripts: dist/, and the product pages and sitemaps of
+# build_product_pages.py, not walked when polling
+IGNORED_DIRS = ('dist', '__pycache__', PRODUCTS_DIR, SITEMAPS_DIR)
+
+
+def ruleset_sources(root):
+    # id(RuleSet) -> (module, attribute, file relative to the root) for the
+    # rule sets defined by the scripts of the site
+    sources = {}
+    for module in list(sys.modules.values()):
+        path = getattr(module, '__file__', None)
+        if not path:
+            continue
+        relpath = os.path.relpath(os.path.abspath(path), root).replace(os.sep, '/')
+        if relpath.startswith('..'):
+            continue
+        for attribute, value in list(vars(module).items()):
+            if isinstance(value, RuleSet):
+                sources[id(value)] = (module, attribute, relpath)
+    return sources
+
+
+def description(ruleset):
+    return json.dumps(ruleset.describe(), sort_keys=True, default=str)
+
+
+class Watcher:
+    def __init__(self, root, rulesets, dry_run=False):
+        self.root = root
+        self.dry_run = dry_run
+        self.rulesets = list(rulesets)
+        sources = ruleset_sources(root)
+        self.sources = [sources.get(id(ruleset)) for ruleset in self.rulesets]
+        for ruleset in self.rulesets:
+            ruleset.prepare(root)
+        self.descriptions = [description(ruleset) for ruleset in self.rulesets]
+        self.graph = SiteGraph.build(root)
+        # relpath -> (mtime, size) of the files this watcher wrote
+        self.written = {}
+
+    def patterns(self):
+        patterns = list(GRAPH_FILES)
+        for ruleset in self.rulesets:
+            patterns += list(ruleset.pages) + ruleset.inputs()
+        return list(dict.fromkeys(patterns))
+
+    def scripts(self):
+        return {source[2] for source in self.sources if source}
+
+    def watched(self, relpath):
+        if relpath.split('/', 1)[0] in IGNORED_DIRS:
+            return False
+        return relpath in self.scripts() or any(page_matches(relpath, p) for p in self.patterns())
+
+    def stat(self, relpath):
+        try:
+            st = os.stat(os.path.join(self.root, relpath))
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def own_write(self, relpath):
+        return relpath in self.written and self.written[relpath] == self.stat(relpath)
+
+    def plan(self, changed):
+        # {relpath: [rule set indexes]} to apply, and what caused each
+        work = {}
+        causes = []
+
+        def add(index, relpaths):
+            for relpath in relpaths:
+                work.setdefault(relpath, set()).add(index)
+
+        for i, ruleset in enumerate(self.rulesets):
+            source = self.sources[i]
+            if source and source[2] in changed:
+                module, attribute, relpath = source
+                try:
+                    module = importlib.reload(module)
+                except Exception as e:
+                    print(f"  {relpath}: not reloaded ({e.__class__.__name__}: {e})")
+                    continue
+                ruleset = self.rulesets[i] = getattr(module, attribute)
+                self.sources[i] = (module, attribute, relpath)
+                ruleset.prepare(self.root)
+                self.descriptions[i] = description(ruleset)
+                add(i, self.pages(ruleset))
+                causes.append(f'{relpath} reloaded')
+                continue
+
+            inputs = [relpath for relpath in changed if any(page_matches(relpath, p) for p in ruleset.inputs())]
+            if inputs:
+                ruleset.prepare(self.root)
+                new_description = description(ruleset)
+                if new_description != self.descriptions[i]:
+                    self.descriptions[i] = new_description
+                    pages = self.pages(ruleset)
+                    # Stylesheets and the like: only the pages using them
+                    users = set().union(*(self.graph.users(relpath, embedding=True) for relpath in inputs))
+                    if users & set(pages):
+                        embedding = self.graph.affected(inputs)
+                        pages = [relpath for relpath in pages if relpath in embedding]
+                    add(i, pages)
+                    causes.append(f"{ruleset.name} ({', '.join(inputs)})")
+
+            add(i, [relpath for relpath in changed if self.selects(ruleset, relpath)])
+        return work, causes
+
+    def pages(self, ruleset):
+        return [relpath for relpath in find_pages(self.root, list(ruleset.pages))
+                if self.selects(ruleset, relpath)]
+
+    def selects(self, ruleset, relpath):
+        if relpath.split('/', 1)[0] in IGNORED_DIRS or not os.path.isfile(os.path.join(self.root, relpath)):
+            return False
+        return ruleset.selects(Page(self.root, relpath))
+
+    def rebuild(self, changed):
+        started = time.perf_counter()
+        self.graph.update(sorted(relpath for relpath in changed if any(page_matches(relpath, p) for p in GRAPH_FILES)))
+        work, causes = self.plan(changed)
+        updated = []
+        warnings = []
+        # Pages needing the same rule sets share a pipeline
+        groups = {}
+        for relpath, indexes in sorted(work.items()):
+            groups.setdefault(tuple(sorted(indexes)), []).append(relpath)
+        for indexes, relpaths in groups.items():
+            pipeline = Pipeline([self.rulesets[i] for i in indexes])
+            for relpath in relpaths:
+                _, page_changed, page_warnings, _, _ = process_page(pipeline, self.root, relpath, self.dry_run)
+                warnings += [f'{relpath}: {warning}' for warning in page_warnings]
+                if page_changed:
+                    updated.append(relpath)
+                    if not self.dry_run:
+                        self.written[relpath] = self.stat(relpath)
+        if updated and not self.dry_run:
+            self.graph.update(updated)
+
+        stamp = time.strftime('%H:%M:%S')
+        print(f"[{stamp}] {', '.join(sorted(changed)[:5])}{' ...' if len(changed) > 5 else ''} changed")
+        for cause in causes:
+            print(f"  {cause}")
+        for warning in warnings:
+            print(f"  Warning: {warning}")
+        print(f"  {len(work)} page(s) processed, {len(updated)} updated in "
+              f"{(time.perf_counter() - started) * 1e3:.0f} ms")
+        return updated
+
+
+def snapshot(watcher):
+    state = {}
+    for dirpath, dirnames, filenames in os.walk(watcher.root):
+        top = dirpath == watcher.root
+        dirnames[:] = [d for d in dirnames if d not in SKIP_DIRS and not (top and d in IGNORED_DIRS)]
+        for filename in filenames:
+            relpath = os.path.relpath(os.path.join(dirpath, filename), watcher.root).replace(os.sep, '/')
+            if watcher.watched(relpath):
+                state[relpath] = watcher.stat(relpath)
+    return state
+
+
+def poll_changes(watcher, events, stop):
+    # Polling fallback: compares the (mtime, size) of the watched files
+    previous = snapshot(watcher)
+    while not stop.is_set():
+        time.sleep(POLL_INTERVAL)
+        current = snapshot(watcher)
+        for relpath in set(previous) | set(current):
+            if previous.get(relpath) != current.get(relpath):
+                events.put(relpath)
+        previous = current
+
+
+def observe_changes(watcher, events):
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            for path in (event.src_path, getattr(event, 'dest_path', None)):
+                if path:
+                    relpath = os.path.relpath(path, watcher.root).replace(os.sep, '/')
+                    if watcher.watched(relpath):
+                        events.put(relpath)
+
+    observer = Observer()
+    observer.schedule(Handler(), watcher.root, recursive=True)
+    observer.start()
+    return observer
+
+
+def watch(watcher, poll=False):
+    events = queue.Queue()
+    stop = threading.Event()
+    observer = None
+    if Observer is None or poll:
+        if not poll:
+            print("watchdog is not installed (pip install watchdog): polling for changes")
+        threading.Thread(target=poll_changes, args=(watcher, events, stop), daemon=True).start()
+    else:
+        observer = observe_changes(watcher, events)
+    print(f"Watching {len(watcher.rulesets)} rule set(s): {', '.join(r.name for r in watcher.rulesets)}. "
+          f"Ctrl+C to stop.")
+    try:
+        while True:
+            changed = {events.get()}
+            # Debounce: an editor saving several files, or one file in several writes
+            while True:
+                try:
+                    changed.add(events.get(timeout=DEBOUNCE))
+                except queue.Empty:
+                    break
+            changed = {relpath for relpath in changed if not watcher.own_write(relpath)}
+            if changed:
+                watcher.rebuild(changed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        if observer:
+            observer.stop()
+            observer.join()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Reapply the rewrite rule sets to the pages affected by each edit.')
+    parser.add_argument('--root', default=ROOT, help='site directory (default: repository root)')
+    parser.add_argument('--only', nargs='+', metavar='NAME',
+                        help=f"rule sets to keep up to date (default: {' '.join(WATCH_DEFAULT)})")
+    parser.add_argument('--dry-run', action='store_true', help='report the pages that would change without writing')
+    parser.add_argument('--poll', action='store_true', help='poll for changes even if watchdog is installed')
+    args = parser.parse_args()
+
+    watch(Watcher(args.root, site_fixes.select(args.only or WATCH_DEFAULT), args.dry_run), args.poll)
@@ -1,28 +1,81 @@
-const CACHE_NAME = 'newket-cache-v1';
-const ASSETS_TO_CACHE = [
-    '/',
-    '/index.html',
-    '/catalog.html',
-    '/product.html',
-    '/cart.html',
-    '/favorites.html',
-    '/shops.html',
-    '/shop.html',
-    '/css/style.css',
-    '/css/tailwind.css',
-    '/js/main.js',
-    '/js/supabase-client.js',
-    '/js/supabase-adapter.js',
-    '/manifest.json',
-    '/Images/Logo NewKet V2.jpeg'
+// <precache> Generated by scripts/build_sw.py from the offline pages and the
+// files they reference: do not edit by hand, rerun the script instead.
+const PRECACHE_VERSION = '2aa13d28c0';
+const PRECACHE_ENTRIES = [
+    ["/", "5a78de2f0a"],
+    ["/index.html", "5a78de2f0a"],
+    ["/catalog.html", "9bf8a7b51d"],
+    ["/product.html", "1ff04a5d72"],
+    ["/cart.html", "3c793eab6e"],
+    ["/favorites.html", "8ce35a6204"],
+    ["/shops.html", "8af3f1138f"],
+    ["/shop.html", "9aea53d828"],
+    ["/manifest.json", "c0d608d34a"],
+    ["/Images/Logo%20NewKet%20V2.jpeg", "73d33b4816"],
+    ["/css/style.css", "5abc4f7db6"],
+    ["/css/responsive.css", "0baf13c481"],
+    ["/js/supabase-client.js", "9fa691cca6"],
+    ["/js/supabase-adapter.js?v=2.1", "7653b7e403"],
+    ["/js/auth.js", "d66f06ae28"],
+    ["/js/cart.js", "cddb6bbc35"],
+    ["/js/favorites.js", "3f4605b4bd"],
+    ["/js/currency.js", "24fa0f154a"],
+    ["/js/products.js", "9acbf50db6"],
+    ["/js/orders.js", "96fe401668"],
+    ["/js/managers.js", "655ab23a23"],
+    ["/js/ui-helpers.js", "39ed4432a0"],
+    ["/js/ui.js", "9464fcc086"],
+    ["/js/search.js", "dec5e0c17b"],
+    ["/js/main.js", "f0f65d6fc7"],
+    ["/js/components-loader.js", "d0c180d72c"],
+    ["/js/supabase-adapter.js", "7653b7e403"],
+    ["/css/tailwind.css", "18dda469f0"],
+    ["/js/shops.js", "5fe77bd764"],
 ];
+// </precache>
+
+// One cache per precache version. Entries keep their revision in a header so
+// an install only downloads the files whose content changed and copies the
+// others from the previous version's cache.
+const CACHE_PREFIX = 'newket-precache-';
+const CACHE_NAME = CACHE_PREFIX + PRECACHE_VERSION;
+const RUNTIME_CACHE = 'newket-runtime';
+const REVISION_HEADER = 'X-Precache-Revision';
+const PRECACHED = new Set(PRECACHE_ENTRIES.map(([url]) => new URL(url, self.location).href));
+
+async function previousCopy(url, revision) {
+    const cacheNames = await caches.keys();
+    for (const name of cacheNames) {
+        if (!name.startsWith(CACHE_PREFIX) || name === CACHE_NAME) continue;
+        const response = await (await caches.open(name)).match(url);
+        if (response && response.headers.get(REVISION_HEADER) === revision) {
+            return response;
+        }
+    }
+    return null;
+}
+
+async function precache(cache, url, revision) {
+    const previous = await previousCopy(url, revision);
+    if (previous) {
+        return cache.put(url, previous);
+    }
+    const response = await fetch(url, { cache: 'reload' });
+    if (!response.ok) {
+        throw new Error(`[Service Worker] Could not precache ${url}: ${response.status}`);
+    }
+    const headers = new Headers(response.headers);
+    headers.set(REVISION_HEADER, revision);
+    const body = await response.blob();
+    return cache.put(url, new Response(body, { status: response.status, statusText: response.statusText, headers }));
+}
 
 // Install Event
 self.addEventListener('install', (event) => {
     event.waitUntil(
         caches.open(CACHE_NAME).then((cache) => {
-            console.log('[Service Worker] Caching all assets');
-            return cache.addAll(ASSETS_TO_CACHE);
+            console.log('[Service Worker] Precaching version', PRECACHE_VERSION);
+            return Promise.all(PRECACHE_ENTRIES.map(([url, revision]) => precache(cache, url, revision)));
         })
     );
 });
@@ -33,7 +86,7 @@ self.addEventListener('activate', (event) => {
         caches.keys().then((cacheNames) => {
             return Promise.all(
                 cacheNames.map((cache) => {
-                    if (cache !== CACHE_NAME) {
+                    if (cache !== CACHE_NAME && cache !== RUNTIME_CACHE) {
                         console.log('[Service Worker] Deleting old cache:', cache);
                         return caches.delete(cache);
                     }
@@ -43,17 +96,32 @@ self.addEventListener('activate', (event) => {
     );
 });
 
-// Fetch Event (Stale-while-revalidate strategy)
+// Fetch Event
 self.addEventListener('fetch', (event) => {
+    if (event.request.method !== 'GET') return;
     // Skip Supabase API calls or external resources if needed
     if (event.request.url.includes('supabase.co')) return;
 
+    // Precached files are served from the current version's cache: a new
+    // sw.js (new revisions) is what updates them
+    const url = new URL(event.request.url);
+    url.hash = '';
+    if (PRECACHED.has(url.href)) {
+        event.respondWith(
+            caches.open(CACHE_NAME)
+                .then((cache) => cache.match(url.href))
+                .then((cachedResponse) => cachedResponse || fetch(event.request))
+        );
+        return;
+    }
+
+    // Everything else: stale-while-revalidate
     event.respondWith(
         caches.match(event.request).then((cachedResponse) => {
             if (cachedResponse) {
                 // Return cached response then update in background
                 fetch(event.request).then((networkResponse) => {
-                    caches.open(CACHE_NAME).then((cache) => {
+                    caches.open(RUNTIME_CACHE).then((cache) => {
                         cache.put(event.request, networkResponse.clone());
                     });
                 });
@@ -61,7 +129,7 @@ self.addEventListener('fetch', (event) => {
             }
 
             return fetch(event.request).then((networkResponse) => {
-                return caches.open(CACHE_NAME).then((cache) => {
+                return caches.open(RUNTIME_CACHE).then((cache) => {
                     cache.put(event.request, networkResponse.clone());
                     return networkResponse;
                 });
@@ -1,9 +1,16 @@
 /** @type {import('tailwindcss').Config} */
 module.exports = {
-  content: ["./*.html", "./admin/*.html", "./js/**/*.js"],
+  content: ["./*.html", "./admin/*.html", "./components/*.html", "./js/**/*.js", "./scripts/*.py", "./admin/*.py"],
   theme: {
-    extend: {},
+    extend: {
+      colors: {
+        brand: {
+          50: '#f8fafc',
+          100: '#f1f5f9',
+          900: '#000000',
+        },
+      },
+    },
   },
   plugins: [],
 }
-
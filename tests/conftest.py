@@ -0,0 +1,54 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+
+# What a copy of the site leaves out: build output, data and the large
+# folders no rule set reads
+COPY_IGNORE = shutil.ignore_patterns('.git', 'node_modules', 'dist', 'products', 'sitemaps', 'Images', 'backup',
+                                     'supabase', '__pycache__', '.*.json', '.rollups.db')
+
+
+@pytest.fixture
+def make_site(tmp_path):
+    # make_site(name): a scratch copy of the site the tests may rewrite
+    def make(name='site'):
+        root = tmp_path / name
+        shutil.copytree(ROOT, root, ignore=COPY_IGNORE)
+        return str(root)
+    return make
+
+
+@pytest.fixture
+def site(make_site):
+    return make_site()
+
+
+@pytest.fixture
+def bottom_nav():
+    from remove_nav_fast import nav_marker, nav_sig
+    return f'{nav_marker}\n<nav {nav_sig}">\n  <a href="index.html">Accueil</a>\n</nav>\n'
+
+
+@pytest.fixture
+def add_legacy_pages(bottom_nav):
+    # add_legacy_pages(root, rulesets): writes pages holding the input of
+    # every literal rule, a bottom nav and a Stripe logo, at the root and in
+    # admin/: what the scripts found on the pages before they ran
+    from rule_graph import literal_pairs
+
+    def add(root, rulesets, count=3):
+        lines = ['<!DOCTYPE html>', '<html>', '<body>']
+        for ruleset in rulesets:
+            for rule in ruleset.rules:
+                lines += [old for old, _ in literal_pairs(rule) or []]
+        lines += [bottom_nav, '<span class="iconify" data-icon="logos:stripe"></span>', '</body>', '</html>', '']
+        for i in range(count):
+            for folder in ('', 'admin/'):
+                with open(os.path.join(root, f'{folder}legacy-{i}.html'), 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(lines))
+    return add
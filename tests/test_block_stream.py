@@ -0,0 +1,51 @@
+import io
+import os
+import random
+
+import pytest
+
+from block_stream import splice_file, splice_stream
+from rewrite_engine import BlockSwap, Page
+
+START = '<!-- begin -->'
+END = '</nav>'
+
+
+def in_memory(text, replacement, count):
+    rule = BlockSwap(START, END, replacement, count)
+    return rule.apply(text, Page('.', 'page.html'))
+
+
+@pytest.mark.parametrize('seed', range(60))
+def test_stream_matches_the_in_memory_swap(seed):
+    rng = random.Random(seed)
+    parts = [START, END, 'text ', '<nav>', '<!-- beg', '\n', 'é']
+    text = ''.join(rng.choice(parts) for _ in range(rng.randint(0, 60)))
+    replacement = rng.choice(['', '<nav></nav>', START])
+    count = rng.choice([0, 1, 2])
+    out = io.StringIO()
+    swapped, _ = splice_stream(io.StringIO(text), out, START, END, replacement, count,
+                               chunk_size=rng.randint(1, 20))
+    assert out.getvalue() == in_memory(text, replacement, count)
+    assert swapped <= count or not count
+
+
+def test_unterminated_block_is_kept():
+    text = f'a{START}b{END}c{START}never closed'
+    out = io.StringIO()
+    assert splice_stream(io.StringIO(text), out, START, END, 'X', chunk_size=3) == (1, 1)
+    assert out.getvalue() == f'aXc{START}never closed'
+
+
+def test_splice_file_only_writes_changes(tmp_path):
+    path = tmp_path / 'page.html'
+    path.write_text(f'<body>{START}<nav></nav>' + 'x' * 200000 + '</body>', encoding='utf-8')
+    mtime = os.stat(path).st_mtime_ns
+    # Same block in and out: nothing written
+    assert not splice_file(str(path), START, END, f'{START}<nav></nav>')
+    assert os.stat(path).st_mtime_ns == mtime
+    assert splice_file(str(path), START, END, '', dry_run=True)
+    assert path.read_text(encoding='utf-8').startswith(f'<body>{START}')
+    assert splice_file(str(path), START, END, '')
+    assert path.read_text(encoding='utf-8') == '<body>' + 'x' * 200000 + '</body>'
+    assert os.listdir(tmp_path) == ['page.html']
@@ -0,0 +1,92 @@
+import random
+import re
+
+import pytest
+
+from literal_matcher import AUTOMATON_MIN_RULES, SCAN_MIN_RULES, ChainMatcher, LiteralMatcher
+
+
+def chain(table, text):
+    for old, new in table:
+        text = text.replace(old, new)
+    return text
+
+
+def token_table(size, seed=0):
+    # Rules that never feed each other: one scan applies them
+    rng = random.Random(seed)
+    return [(f'<t{i:04d}>', f'[{rng.randrange(100)}]') for i in range(size)]
+
+
+def random_table(rng, size, alphabet='abc'):
+    # Short patterns over a small alphabet: overlaps and chains everywhere
+    def word():
+        return ''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 3)))
+    return [(word(), word() if rng.random() < 0.8 else '') for _ in range(size)]
+
+
+@pytest.mark.parametrize('size', [3, SCAN_MIN_RULES, AUTOMATON_MIN_RULES + 10])
+def test_token_tables_match_the_chain(size):
+    table = token_table(size)
+    rng = random.Random(size)
+    text = ''.join(rng.choice([old for old, _ in table] + ['<t', '>', 'abc ', '<t9999>']) for _ in range(2000))
+    matcher = LiteralMatcher(table)
+    assert matcher.reason is None
+    assert matcher.sequential == (size < SCAN_MIN_RULES)
+    assert matcher.automaton == (size >= AUTOMATON_MIN_RULES)
+    result, counts = matcher.replace(text)
+    assert result == chain(table, text)
+    assert counts == [text.count(old) for old, _ in table]
+
+
+@pytest.mark.parametrize('seed', range(40))
+@pytest.mark.parametrize('size', [2, 20, 150])
+def test_sequential_mode_matches_the_chain(seed, size):
+    rng = random.Random(seed)
+    table = random_table(rng, size)
+    text = ''.join(rng.choice('abcd') for _ in range(300))
+    result, counts, scans = ChainMatcher(table).replace(text)
+    assert result == chain(table, text)
+    assert scans <= len(table)
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_simultaneous_mode_replaces_the_original_text(seed):
+    rng = random.Random(seed)
+    table = token_table(rng.choice([5, 40, 200]), seed)
+    # Replacements that spell other patterns are not matched again
+    table = [(old, table[(i + 1) % len(table)][0]) for i, (old, _) in enumerate(table)]
+    text = ''.join(rng.choice([old for old, _ in table] + ['x', '<t0', '>']) for _ in range(500))
+    lookup = dict(table)
+    expected = re.sub('|'.join(re.escape(old) for old, _ in table), lambda match: lookup[match.group()], text)
+    result, _, scans = ChainMatcher(table, 'simultaneous').replace(text)
+    assert result == expected
+    # Rules feeding each other: even a small table needs the single scan
+    assert scans == 1
+
+
+def test_fixpoint_mode_settles():
+    table = [('h-32', 'h-24'), ('h-24', 'h-20'), ('h-20', 'h-16')]
+    matcher = ChainMatcher(table, 'fixpoint')
+    text = 'h-32 h-24 h-20 h-16 w-32'
+    result, counts, _ = matcher.replace(text)
+    assert result == 'h-16 h-16 h-16 h-16 w-32'
+    assert matcher.replace(result)[0] == result
+    assert counts == [1, 2, 3]
+
+
+@pytest.mark.parametrize('mode, table', [
+    ('fixpoint', [('a-1', 'a-2'), ('a-2', 'a-1')]),
+    ('simultaneous', [('abc', 'x'), ('bcd', 'y')]),
+    ('fixpoint', [('abc', 'x'), ('ab', 'y')]),
+])
+def test_refused_tables(mode, table):
+    with pytest.raises(ValueError):
+        ChainMatcher(table, mode)
+
+
+def test_conflicting_table_falls_back_to_the_chain():
+    table = token_table(AUTOMATON_MIN_RULES) + [('<t0001>', 'again')]
+    matcher = LiteralMatcher(table)
+    assert matcher.sequential and 'share the same pattern' in matcher.reason
+    assert matcher.replace('<t0001>')[0] == chain(table, '<t0001>')
@@ -0,0 +1,119 @@
+import glob
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import html_minify
+import js_minify
+from html_index import HtmlIndex, Splicer
+from rewrite_engine import ROOT
+
+PAGE = '''<!DOCTYPE html>
+<html><body>
+  <div id="main" class="card  wide">
+    <p>Hello   <b>world</b></p>
+    <img src=a.png alt="A">
+    <!-- note -->
+  </div>
+  <pre>  keep   this </pre>
+  <script>const s = `a   b`; // c
+  </script>
+  <div class="whitespace-pre">  x   y </div>
+  </span>
+  <ul><li>one<li>two</ul>
+</body></html>
+'''
+
+
+def site_files(pattern):
+    return sorted(glob.glob(os.path.join(ROOT, pattern)))
+
+
+def tags(index):
+    return [(node.tag, dict(node.attrs)) for node in index.find()]
+
+
+def test_index_lookups():
+    index = HtmlIndex(PAGE)
+    main = index.get('main')
+    assert main.tag == 'div' and main.classes == ['card', 'wide']
+    assert index.find(cls='wide') == [main]
+    assert index.first('img').attrs == {'src': 'a.png', 'alt': 'A'}
+    assert index.source(index.first('b')) == '<b>world</b>'
+    assert index.inner(index.first('pre')) == '  keep   this '
+    # The stray </span> is ignored, an unclosed <li> ends where its parent does
+    assert [index.inner(li) for li in index.find('li')] == ['one<li>two', 'two']
+
+
+def test_splicer_edits_whole_nodes():
+    index = HtmlIndex(PAGE)
+    splicer = Splicer(index)
+    img = index.first('img')
+    splicer.set_attr(img, 'src', 'b c.png')
+    splicer.set_attr(img, 'loading', 'lazy')
+    splicer.replace_inner(index.first('b'), 'there')
+    splicer.remove(index.first('pre'))
+    text = splicer.apply()
+    assert '<img loading="lazy" src="b c.png" alt="A">' in text
+    assert '<b>there</b>' in text
+    assert '<pre>' not in text and '\n\n' not in text
+
+    splicer = Splicer(index)
+    splicer.replace(index.get('main'), '')
+    splicer.replace(index.first('b'), '')
+    with pytest.raises(ValueError):
+        splicer.apply()
+
+
+def test_html_minify_keeps_what_renders():
+    text = html_minify.minify(PAGE)
+    assert '<p>Hello <b>world</b></p>' in text
+    assert '<!-- note -->' not in text
+    assert '<pre>  keep   this </pre>' in text
+    assert 'const s = `a   b`; // c\n  </script>' in text
+    assert '<div class="whitespace-pre">  x   y </div>' in text
+
+
+@pytest.mark.parametrize('path', site_files('*.html') + site_files('admin/*.html'),
+                         ids=lambda path: os.path.relpath(path, ROOT))
+def test_html_minify_on_the_site(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    minified = html_minify.minify(text)
+    assert len(minified) <= len(text)
+    assert html_minify.minify(minified) == minified
+    # Same elements with the same attributes; scripts and styles unchanged
+    index = HtmlIndex(text)
+    minified_index = HtmlIndex(minified)
+    assert tags(minified_index) == tags(index)
+    for tag in ('script', 'style', 'pre', 'textarea'):
+        assert [minified_index.inner(e) for e in minified_index.find(tag)] == \
+            [index.inner(e) for e in index.find(tag)]
+
+
+def test_js_minify_copies_literals():
+    source = ("var a = 1 / 2; // half\n"
+              "var r = /a  b\\//g;\n"
+              "  /* note */ var s = 'x  // y';\n"
+              "var t = `${a  + 1}  z`;\n")
+    assert js_minify.minify(source) == ("var a = 1 / 2;\n"
+                                        "var r = /a  b\\//g;\n"
+                                        "var s = 'x  // y';\n"
+                                        "var t = `${a + 1}  z`;\n")
+
+
+@pytest.mark.parametrize('path', site_files('js/*.js'), ids=os.path.basename)
+def test_js_minify_on_the_site(path, tmp_path):
+    with open(path, 'r', encoding='utf-8') as f:
+        source = f.read()
+    minified = js_minify.minify(source)
+    assert len(minified) <= len(source)
+    assert js_minify.minify(minified) == minified
+    if shutil.which('node') is None:
+        pytest.skip('node is not installed: the syntax of the output is not checked')
+    out = tmp_path / os.path.basename(path)
+    out.write_text(minified, encoding='utf-8')
+    result = subprocess.run(['node', '--check', str(out)], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
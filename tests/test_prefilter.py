@@ -0,0 +1,111 @@
+import os
+import random
+import re
+
+import pytest
+
+import site_fixes
+from prefilter import Prefilter, regex_literals
+from rewrite_engine import Page, Pipeline, RegexRule, find_pages
+
+
+@pytest.mark.parametrize('pattern, flags, literals', [
+    (r'<nav class="x">.*?</nav>', 0, ['<nav class="x">', '</nav>']),
+    (r'ab(cd)?efg', 0, ['efg']),
+    (r'foo\.bar+baz', 0, ['foo.bar', 'baz']),
+    (r'x[abc]yzw\d{2}qrs', 0, ['yzw', 'qrs']),
+    (r'\x41BCD', 0, ['ABCD']),
+    (r'abcd?e', 0, ['abc']),
+    (r'abc|def', 0, None),
+    (r'(?i)abcdef', 0, None),
+    (r'abcdef', re.IGNORECASE, None),
+    (r'a.b.c', 0, None),
+])
+def test_regex_literals(pattern, flags, literals):
+    assert regex_literals(pattern, flags) == literals
+
+
+# (pattern piece, a text it matches)
+PIECES = [
+    ('abc', lambda rng: 'abc'),
+    ('d', lambda rng: 'd'),
+    ('(ef)?', lambda rng: rng.choice(['', 'ef'])),
+    ('(g|hi)', lambda rng: rng.choice(['g', 'hi'])),
+    ('[xy]', lambda rng: rng.choice('xy')),
+    ('k+', lambda rng: 'k' * rng.randint(1, 3)),
+    ('l*', lambda rng: 'l' * rng.randint(0, 2)),
+    ('m?', lambda rng: rng.choice(['', 'm'])),
+    ('n{1,2}', lambda rng: 'n' * rng.randint(1, 2)),
+    (r'\.', lambda rng: '.'),
+    (r'\d', lambda rng: rng.choice('0123456789')),
+    ('.', lambda rng: rng.choice('abdz.')),
+    (r'\x6f', lambda rng: 'o'),
+]
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_every_match_contains_the_literals(seed):
+    rng = random.Random(seed)
+    pieces = [rng.choice(PIECES) for _ in range(rng.randint(1, 8))]
+    pattern = ''.join(piece for piece, _ in pieces)
+    literals = regex_literals(pattern) or []
+    noise = 'abcdefghiklmnoxyz.0 '
+    texts = [''.join(rng.choice(noise) for _ in range(40)) + ''.join(make(rng) for _, make in pieces)
+             + ''.join(rng.choice(noise) for _ in range(40)) for _ in range(5)]
+    regex = re.compile(pattern)
+    for text in texts:
+        matches = list(regex.finditer(text))
+        assert matches, (pattern, text)
+        for match in matches:
+            assert all(literal in match.group() for literal in literals), (pattern, match.group())
+
+
+def test_registered_regexes_only_match_around_their_literals(site):
+    pages = {}
+    for relpath in find_pages(site, ['**/*.html']):
+        with open(os.path.join(site, relpath), 'r', encoding='utf-8') as f:
+            pages[relpath] = f.read()
+    for ruleset in site_fixes.REGISTRY:
+        for rule in ruleset.rules:
+            if isinstance(rule, RegexRule) and rule.anchors():
+                for content in pages.values():
+                    for match in rule.regex.finditer(content):
+                        assert rule.may_match(match.group()), (ruleset.name, rule.name)
+
+
+def test_filtered_pages_are_left_unchanged(site, add_legacy_pages):
+    rulesets = site_fixes.select(site_fixes.DEFAULT + ['remove_nav_fast', 'fix_tables'])
+    add_legacy_pages(site, rulesets)
+    cache = Prefilter.for_root(site)
+    filtered = 0
+    for ruleset in rulesets:
+        pipeline = Pipeline([ruleset])
+        pipeline.prepare(site)
+        for relpath in find_pages(site, list(ruleset.pages)):
+            page = Page(site, relpath)
+            if cache.candidate(site, relpath, pipeline.anchors(page)):
+                continue
+            filtered += 1
+            with open(page.path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            assert pipeline.process(content, page) == content, (ruleset.name, relpath)
+    assert filtered
+
+
+def test_cache_follows_the_files(tmp_path):
+    root = str(tmp_path)
+    path = tmp_path / 'page.html'
+    path.write_bytes(b'<p>nothing here</p>\r\n<p>\xc3\xa9t\xc3\xa9</p>\r\n')
+    anchors = [('<p>été</p>\n<p>',), ('needle',)]
+    cache = Prefilter.for_root(root)
+    assert cache.candidate(root, 'page.html', anchors)
+    assert not cache.candidate(root, 'page.html', [('needle',)])
+    cache.save()
+
+    # Read back from .prefilter-cache.json, then after an edit
+    cache = Prefilter.for_root(root)
+    assert not cache.dirty
+    assert not cache.candidate(root, 'page.html', [('needle',)])
+    path.write_bytes(b'<p>a needle</p>')
+    assert cache.candidate(root, 'page.html', [('needle',)])
+    assert cache.candidate(root, 'page.html', None)
@@ -0,0 +1,125 @@
+import os
+import re
+
+import pytest
+
+import remove_nav_fast
+import site_fixes
+from rewrite_engine import BlockSwap, Page, Pipeline, RegexRule, Replace, ReplaceTable, find_pages, run
+
+PAGES = ('*.html', 'admin/*.html')
+
+
+def read_tree(root, patterns=PAGES):
+    tree = {}
+    for relpath in find_pages(root, list(patterns)):
+        with open(os.path.join(root, relpath), 'r', encoding='utf-8') as f:
+            tree[relpath] = f.read()
+    return tree
+
+
+def chain(table, content):
+    for old, new in table:
+        content = content.replace(old, new)
+    return content
+
+
+def baseline_rule(rule, content, page):
+    # What the original scripts did: one str.replace or re.sub after the
+    # other, on every page, without matcher or prefilter
+    if isinstance(rule, Replace):
+        return content.replace(rule.old, rule.new)
+    if isinstance(rule, ReplaceTable):
+        if rule.matcher.mode != 'fixpoint':
+            return chain(rule.matcher.table, content)
+        while True:
+            new_content = chain(rule.matcher.table, content)
+            if new_content == content:
+                return content
+            content = new_content
+    if isinstance(rule, RegexRule):
+        return rule.regex.sub(rule.repl, content, count=rule.count)
+    if isinstance(rule, BlockSwap):
+        block = re.compile(re.escape(rule.start) + '.*?' + re.escape(rule.end), re.DOTALL)
+        return block.sub(lambda _: rule.replacement, content, count=rule.count)
+    return rule.apply(content, page)
+
+
+def baseline(rulesets, root, relpath, content):
+    page = Page(root, relpath)
+    for ruleset in rulesets:
+        if ruleset.selects(page):
+            for rule in ruleset.rules:
+                if rule.applies_to(page):
+                    content = baseline_rule(rule, content, page)
+    return content
+
+
+@pytest.fixture
+def make_legacy_site(make_site, add_legacy_pages):
+    def make(name='site'):
+        root = make_site(name)
+        add_legacy_pages(root, site_fixes.select(site_fixes.DEFAULT))
+        return root
+    return make
+
+
+def test_engine_matches_the_script_chain(make_legacy_site):
+    root = make_legacy_site()
+    rulesets = site_fixes.select(site_fixes.DEFAULT)
+    pipeline = Pipeline(rulesets)
+    pipeline.prepare(root)
+    changed = 0
+    for relpath, content in read_tree(root).items():
+        expected = baseline(rulesets, root, relpath, content)
+        assert pipeline.process(content, Page(root, relpath)) == expected, relpath
+        changed += expected != content
+    assert changed >= 6
+
+
+@pytest.mark.parametrize('options', [
+    {'jobs': 2},
+    {'prefilter': True},
+    {'incremental': True},
+    {'jobs': 2, 'prefilter': True, 'incremental': True},
+], ids=lambda options: '-'.join(options))
+def test_run_modes_agree(make_legacy_site, options):
+    reference = make_legacy_site('reference')
+    root = make_legacy_site()
+    run(Pipeline(site_fixes.select(site_fixes.DEFAULT)), reference, jobs=1, prefilter=False)
+    expected = read_tree(reference)
+
+    report = run(Pipeline(site_fixes.select(site_fixes.DEFAULT)), root, **{'prefilter': False, **options})
+    assert read_tree(root) == expected
+    assert len(report.updated) >= 6
+
+    if options.get('incremental'):
+        # Nothing changed since: every page is skipped
+        report = run(Pipeline(site_fixes.select(site_fixes.DEFAULT)), root, **{'prefilter': False, **options})
+        assert report.updated == report.unchanged == []
+        assert read_tree(root) == expected
+
+
+def test_incremental_run_redoes_edited_pages(make_legacy_site):
+    root = make_legacy_site()
+    rulesets = site_fixes.select(site_fixes.DEFAULT)
+    with open(os.path.join(root, 'legacy-0.html'), 'r', encoding='utf-8') as f:
+        legacy = f.read()
+    run(Pipeline(rulesets), root, incremental=True)
+    with open(os.path.join(root, 'legacy-0.html'), 'a', encoding='utf-8') as f:
+        f.write(legacy)
+    report = run(Pipeline(rulesets), root, incremental=True)
+    assert report.updated == ['legacy-0.html']
+
+
+def test_stream_mode_matches_in_memory(make_site, bottom_nav):
+    roots = [make_site('memory'), make_site('stream')]
+    for root in roots:
+        for i in range(3):
+            with open(os.path.join(root, f'nav-{i}.html'), 'w', encoding='utf-8') as f:
+                f.write('<body>\n' + 'x' * (i * 70000) + bottom_nav * (i + 1) + '</body>\n')
+    memory = run(Pipeline([remove_nav_fast.STREAM_RULES]), roots[0])
+    stream = run(Pipeline([remove_nav_fast.STREAM_RULES]), roots[1], stream=True)
+    assert sorted(stream.updated) == sorted(memory.updated)
+    assert 'nav-2.html' in stream.updated
+    assert read_tree(roots[1], ['**/*.html']) == read_tree(roots[0], ['**/*.html'])
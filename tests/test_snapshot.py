@@ -0,0 +1,108 @@
+import itertools
+import json
+import os
+import sqlite3
+
+import pytest
+
+import build_search_index
+from snapshot import open_table
+
+FIELDS = ('id', 'name', 'category', 'price', 'image', 'created_at')
+PRODUCTS = [
+    {'id': 'p1', 'name': 'Crème brûlée', 'category': 'Desserts', 'price': 12, 'image': 'a.png, b.png',
+     'created_at': '2025-03-01T10:00:00+00:00'},
+    {'id': 'p2', 'name': 'Sœur Cœur', 'category': 'Livres', 'price': 9.5, 'image': None,
+     'created_at': '2025-03-02T10:00:00+00:00'},
+    {'id': 'p3', 'name': 'Crêpes', 'category': 'Desserts', 'price': 4, 'image': 'c.png',
+     'created_at': None},
+    {'id': 'p4', 'name': 'Café crème', 'category': 'Boissons', 'price': 3, 'image': '',
+     'created_at': '2025-03-02T10:00:00+00:00'},
+]
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def source(request, tmp_path):
+    if request.param == 'json':
+        path = tmp_path / 'products.json'
+        path.write_text(json.dumps({'products': PRODUCTS}), encoding='utf-8')
+        return str(path)
+    path = str(tmp_path / 'local.db')
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE products (id TEXT PRIMARY KEY, name TEXT, category TEXT, price NUMERIC, "
+                       "image TEXT, created_at TEXT)")
+    connection.executemany(f"INSERT INTO products VALUES ({', '.join('?' * len(FIELDS))})",
+                           [tuple(row[field] for field in FIELDS) for row in PRODUCTS])
+    connection.commit()
+    connection.close()
+    return path
+
+
+def ids(table):
+    return [row['id'] for row in table[1]]
+
+
+def test_open_table(source):
+    count, rows, _ = open_table(source, 'products', FIELDS)
+    assert count == 4
+    assert sorted(rows, key=lambda row: row['id']) == PRODUCTS
+    assert ids(open_table(source, 'products', ('id',), where={'category': ['Desserts', 'Livres']})) == \
+        ['p1', 'p2', 'p3']
+    # Newest first, ties by id, rows without a date last
+    assert ids(open_table(source, 'products', FIELDS, order_by=('created_at', True))) == ['p2', 'p4', 'p1', 'p3']
+    assert ids(open_table(source, 'products', FIELDS, order_by=('created_at', False))) == ['p1', 'p2', 'p4', 'p3']
+    since = open_table(source, 'products', FIELDS, order_by=('created_at', False),
+                       since=('created_at', '2025-03-02'))
+    assert since[0] == 2 and ids(since) == ['p2', 'p4']
+
+
+def test_missing_snapshot(tmp_path):
+    with pytest.raises(SystemExit):
+        open_table(str(tmp_path / 'none.json'), 'products', FIELDS)
+
+
+def load_index(root):
+    out_dir = os.path.join(root, build_search_index.INDEX_DIR)
+    with open(os.path.join(out_dir, build_search_index.META_NAME), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    docs = []
+    for filename in meta['docs']:
+        with open(os.path.join(out_dir, filename), 'r', encoding='utf-8') as f:
+            docs += json.load(f)
+    postings = {}
+    for filename in meta['shards'].values():
+        with open(os.path.join(out_dir, filename), 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        for term, deltas in zip(shard['terms'], shard['postings']):
+            postings[term] = list(itertools.accumulate(deltas))
+    return meta, docs, postings
+
+
+def search(docs, postings, query):
+    # What js/search.js does: every query word starts a word of the product
+    found = None
+    for word in build_search_index.words(query):
+        ordinals = {o for term, ordinal_list in postings.items() if term.startswith(word) for o in ordinal_list}
+        found = ordinals if found is None else found & ordinals
+    return [docs[ordinal][0] for ordinal in sorted(found or ())]
+
+
+def test_search_index(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(build_search_index, 'DOCS_PER_CHUNK', 3)
+    root = str(tmp_path / 'site')
+    meta = build_search_index.build_index(root, source)
+    assert meta['count'] == 4 and len(meta['docs']) == 2
+    _, docs, postings = load_index(root)
+    assert [doc[0] for doc in docs] == ['p2', 'p4', 'p1', 'p3']
+    assert docs[2] == ['p1', 'Crème brûlée', 'Desserts', 12, 'a.png']
+    assert search(docs, postings, 'CREME') == ['p4', 'p1']
+    assert search(docs, postings, 'cr des') == ['p1', 'p3']
+    assert search(docs, postings, 'soeur') == ['p2']
+    assert search(docs, postings, 'the') == []
+
+    # A rebuild with other chunks removes the files of the first one
+    monkeypatch.setattr(build_search_index, 'DOCS_PER_CHUNK', 10)
+    meta = build_search_index.build_index(root, source)
+    assert len(meta['docs']) == 1
+    assert sorted(os.listdir(os.path.join(root, build_search_index.INDEX_DIR))) == \
+        sorted(meta['docs'] + list(meta['shards'].values()) + [build_search_index.META_NAME])